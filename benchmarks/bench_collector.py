@@ -0,0 +1,147 @@
+"""Offline collector benchmark on synthetic projects.
+
+Synthetic payloads are fetched through a stubbed ovh.Client, then each
+compiled metric table of the collector and a whole scrape (collection and text
+serialization) are measured: best wall time over repetitions, memory
+retained by the produced metrics and peak traced memory. Results are printed as JSON so that they can
+be stored and compared between commits:
+
+    python benchmarks/bench_collector.py --instances 20000 > before.json
+    python benchmarks/bench_collector.py --instances 20000 --compare before.json
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from prometheus_client.exposition import generate_latest
+
+from ovh_exporter.collector import Metrics, OvhCollector
+from ovh_exporter.config import Service
+from ovh_exporter.ovh_client import fetch
+from ovh_exporter.refresher import Snapshot
+from ovh_exporter.synthetic import StaticSource, SyntheticClient
+
+
+# pylint: disable=too-few-public-methods
+class _Registry:
+    """Registry-like adapter around a collector."""
+
+    def __init__(self, collector):
+        self._collector = collector
+
+    def collect(self):
+        """Collect metrics."""
+        yield from self._collector.collect()
+
+
+def _measure(func, repeat: int):
+    """Best time over `repeat` runs, then memory of one traced run.
+
+    `retained_bytes` is the memory still held by the result (metrics),
+    `peak_bytes` the highest traced memory during the run."""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {
+        "seconds": min(timings),
+        "retained_bytes": retained,
+        "peak_bytes": peak,
+    }
+
+
+def run(args) -> dict:
+    """Run benchmark."""
+    client = SyntheticClient(
+        instances=args.instances,
+        volumes=args.volumes,
+        buckets=args.buckets,
+        regions=args.regions)
+    services = [
+        Service(f"{index:032x}", {"environment": "bench", "project": f"project{index}"})
+        for index in range(args.projects)
+    ]
+    responses = {service.id: fetch(client, service.id) for service in services}
+    collector = OvhCollector(StaticSource(Snapshot(1, time.time(), responses)), services)
+
+    results = {}
+    for table in collector._tables: # noqa: SLF001 # pylint: disable=protected-access
+        def collect_path(table=table):
+            metrics = Metrics(collector.labelnames, collector._specs) # noqa: SLF001 # pylint: disable=protected-access
+            for service in services:
+                table.collect({i: metrics.gauges[i].samples for i in table.names},
+                              {**service.labels, "service_id": service.id},
+                              getattr(responses[service.id], table.field))
+            return metrics
+        results[table.name] = _measure(collect_path, args.repeat)
+    results["collect"] = _measure(lambda: list(collector.collect()), args.repeat)
+    # without samples reused from previous collection
+    results["collect_uncached"] = _measure(
+        lambda: list(OvhCollector(collector.source, services).collect()), args.repeat)
+    results["scrape"] = _measure(lambda: generate_latest(_Registry(collector)), args.repeat)
+    return {
+        "revision": _revision(),
+        "python": sys.version.split()[0],
+        "parameters": {k: v for k, v in vars(args).items() if k != "compare"},
+        "results": results,
+    }
+
+
+def _revision() -> str|None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], # noqa: S607
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(current: dict, reference_path: str):
+    """Print relative change against a previous result file."""
+    with open(reference_path, encoding="utf-8") as fstream:
+        reference = json.load(fstream)
+    print(f"{'path':<32} {'seconds':>10} {'retained':>10} {'peak':>10}", file=sys.stderr) # noqa: T201
+    for name, result in current["results"].items():
+        previous = reference["results"].get(name, None)
+        if not previous:
+            continue
+        changes = [
+            f"{(result[key] - previous[key]) / previous[key] * 100:+9.1f}%" if previous[key] else f"{'n/a':>10}"
+            for key in ("seconds", "retained_bytes", "peak_bytes")
+        ]
+        print(f"{name:<32} {' '.join(changes)}", file=sys.stderr) # noqa: T201
+
+
+def main():
+    """Command line entry-point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--projects", type=int, default=1)
+    parser.add_argument("--instances", type=int, default=10000)
+    parser.add_argument("--volumes", type=int, default=10000)
+    parser.add_argument("--buckets", type=int, default=10000)
+    parser.add_argument("--regions", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--compare", help="previous JSON result to compare with")
+    args = parser.parse_args()
+    result = run(args)
+    print(json.dumps(result, indent=2)) # noqa: T201
+    if args.compare:
+        _compare(result, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Fetch benchmark against the local fake OVH API.
+
+A fake API server is started in-process with the requested latency, error
+and throttling rates, and uncached fetch passes are run over all projects
+for each concurrency level. Results are printed as JSON:
+
+    python benchmarks/bench_fetch.py --projects 50 --latency 0.1 --max-in-flight 1 4 16
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+
+from ovh_exporter import fake_api
+from ovh_exporter.config import OvhAccount, RateLimit
+from ovh_exporter.ovh_client import build_client, build_pool
+
+
+def run(args) -> dict:
+    """Run benchmark."""
+    options = fake_api.FakeApiOptions(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        projects=args.projects,
+        instances=args.instances,
+        volumes=args.volumes,
+        buckets=args.buckets)
+    server = fake_api.start(("127.0.0.1", 0), options)
+    try:
+        account = OvhAccount("ovh-eu", "fake", "fake", "fake", server.url,
+                             RateLimit(rate=args.rate, burst=args.burst, max_retries=args.max_retries))
+        service_ids = build_client(account).get("/cloud/project")
+        results = {}
+        for max_in_flight in args.max_in_flight:
+            passes = fake_api.load_test(build_pool(account, max_in_flight), service_ids,
+                                        args.passes, max_in_flight, args.timeout)
+            results[str(max_in_flight)] = {
+                "seconds": min(i["seconds"] for i in passes),
+                "incomplete": max(i["incomplete"] for i in passes),
+            }
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {
+        "python": sys.version.split()[0],
+        "parameters": vars(args),
+        "results": results,
+    }
+
+
+def main():
+    """Command line entry-point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--instances", type=int, default=100)
+    parser.add_argument("--volumes", type=int, default=100)
+    parser.add_argument("--buckets", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=None)
+    parser.add_argument("--rate", type=float, default=1000, help="client rate limit (calls/s)")
+    parser.add_argument("--burst", type=int, default=100)
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--passes", type=int, default=3)
+    parser.add_argument("--max-in-flight", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2)) # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
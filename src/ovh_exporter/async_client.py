@@ -0,0 +1,379 @@
+"""asyncio OVH API backend.
+
+Optional, requires aiohttp (`pip install ovh_exporter[asyncio]`). All API
+calls of a refresh run on one event loop thread, concurrency being bounded by
+a semaphore instead of a thread per call. Requests are signed the same way
+as ovh.Client; rate limit, retries, cache and circuit breakers are shared
+with the threaded backend."""
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+import typing
+
+import ovh
+
+from ovh_exporter import streaming
+from ovh_exporter.logger import log, log_payload
+from ovh_exporter.ovh_client import (
+    Endpoint,
+    build_response,
+    intern_strings,
+    limiter_for,
+    lookup,
+    record_results,
+    with_query,
+)
+from ovh_exporter.ratelimit import Backoff, retry_delay
+from ovh_exporter.refresher import Refresher
+from ovh_exporter.telemetry import API_REQUEST_DURATION, API_RESPONSE_SIZE, API_RETRIES
+
+try:
+    import aiohttp
+except ImportError: # pragma: no cover
+    aiohttp = None
+
+if typing.TYPE_CHECKING:
+    from ovh_exporter.breaker import CircuitBreaker, CircuitBreakers
+    from ovh_exporter.config import OvhAccount
+    from ovh_exporter.ovh_client import EndpointCache, OvhApiResponse
+
+AVAILABLE = aiohttp is not None
+
+_TRANSPORT_ERRORS: tuple[type[BaseException], ...] = (OSError, asyncio.TimeoutError)
+if aiohttp is not None:
+    _TRANSPORT_ERRORS += (aiohttp.ClientError,)
+
+# query parameters of endpoint calls (see ovh_client._storages)
+_PARAMS: dict[Endpoint, dict[str, typing.Any]] = {
+    Endpoint.STORAGE: {"includeType": True},
+}
+
+# same mapping as ovh.Client.call
+_ERRORS = {
+    400: ovh.exceptions.BadParametersError,
+    404: ovh.exceptions.ResourceNotFoundError,
+    409: ovh.exceptions.ResourceConflictError,
+    460: ovh.exceptions.ResourceExpiredError,
+}
+_FORBIDDEN_ERRORS = {
+    "NOT_GRANTED_CALL": ovh.exceptions.NotGrantedCall,
+    "NOT_CREDENTIAL": ovh.exceptions.NotCredential,
+    "INVALID_KEY": ovh.exceptions.InvalidKey,
+    "INVALID_CREDENTIAL": ovh.exceptions.InvalidCredential,
+    "FORBIDDEN": ovh.exceptions.Forbidden,
+}
+
+
+def _decode(status: int, body: bytes, label_keys: typing.AbstractSet[str]):
+    """Decode a successful response body, interning values of `label_keys`."""
+    if status == 204: # noqa: PLR2004
+        return None
+    try:
+        payload = json.loads(body)
+    except ValueError as error:
+        raise ovh.exceptions.InvalidResponse("Failed to decode API response", error) from error
+    return intern_strings(payload, label_keys)
+
+
+def _error(status: int, body: bytes) -> ovh.exceptions.APIError:
+    """API exception of an error response."""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = {}
+    if not isinstance(payload, dict):
+        payload = {}
+    message = payload.get("message", f"HTTP {status}")
+    if status == 403: # noqa: PLR2004
+        return _FORBIDDEN_ERRORS.get(str(payload.get("errorCode", "")), ovh.exceptions.APIError)(message)
+    return _ERRORS.get(status, ovh.exceptions.APIError)(message)
+
+
+class AsyncOvhClient:
+    """Async OVH API client.
+
+    Must be used from a single event loop, which owns its HTTP session (one
+    keep-alive connection pool sized to `max_in_flight`). Payloads of
+    endpoints in `fields` only keep these fields (bodies are not streamed).
+    Payload keys and values of `label_keys` are interned."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, config: OvhAccount, max_in_flight: int = 4, timeout: float = 180, session=None,
+                 fields: typing.Mapping[Endpoint, streaming.Fields]|None = None,
+                 label_keys: typing.AbstractSet[str] = frozenset()):
+        if session is None and not AVAILABLE:
+            raise RuntimeError("asyncio backend requires aiohttp (pip install 'ovh_exporter[asyncio]')")
+        self._application_key = config.application_key
+        self._application_secret = config.application_secret
+        self._consumer_key = config.consumer_key
+        self._endpoint = config.endpoint_url or ovh.client.ENDPOINTS[config.endpoint]
+        self.max_in_flight = max_in_flight
+        self._timeout = timeout
+        self._session = session
+        self._fields = {endpoint.name.lower(): tree for endpoint, tree in (fields or {}).items()}
+        self._label_keys = label_keys
+        self._semaphore: asyncio.Semaphore|None = None
+        self._time_lock: asyncio.Lock|None = None
+        self._time_delta: int|None = None
+        self.limiter = limiter_for(config)
+        rate_limit = config.rate_limit
+        self.backoff = Backoff(rate_limit.max_retries, rate_limit.backoff, rate_limit.max_backoff)
+
+    def _http(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_in_flight),
+                timeout=aiohttp.ClientTimeout(total=self._timeout))
+        return self._session
+
+    async def close(self):
+        """Close HTTP session."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def time_delta(self) -> int:
+        """Delta between API and local time, fetched once."""
+        if self._time_lock is None:
+            self._time_lock = asyncio.Lock()
+        async with self._time_lock:
+            if self._time_delta is None:
+                server_time = await self.get("/auth/time", _need_auth=False)
+                self._time_delta = server_time - int(time.time())
+        return self._time_delta
+
+    def sign(self, method: str, target: str, body: str, now: str) -> dict[str, str]:
+        """Authentication headers of a request, as computed by ovh.Client."""
+        # checked by _request
+        consumer_key = self._consumer_key or ""
+        signature = hashlib.sha1( # noqa: S324
+            f"{self._application_secret}+{consumer_key}+{method.upper()}+{target}+{body}+{now}".encode())
+        return {
+            "X-Ovh-Consumer": consumer_key,
+            "X-Ovh-Timestamp": now,
+            "X-Ovh-Signature": "$1$" + signature.hexdigest(),
+        }
+
+    async def get(self, path: str, _need_auth: bool = True, **kwargs): # noqa: FBT001,FBT002
+        """GET call; keyword arguments are sent as query string."""
+        path = with_query(path, kwargs)
+        payload = await self.call("GET", path, _need_auth)
+        endpoint = Endpoint.label(path)
+        if endpoint in self._fields:
+            return streaming.prune(payload, self._fields[endpoint])
+        return payload
+
+    async def call(self, method: str, path: str, need_auth: bool = True): # noqa: FBT001,FBT002
+        """Rate-limited call, with retries."""
+        attempt = 0
+        while True:
+            wait = self.limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                status, headers, body = await self._request(method, path, need_auth)
+            except _TRANSPORT_ERRORS as error:
+                retry = retry_delay(self.backoff, self.limiter, attempt, None)
+                if retry is None:
+                    raise ovh.exceptions.HTTPError("Low HTTP request failed error", error) from error
+            else:
+                if 100 <= status < 300: # noqa: PLR2004
+                    return _decode(status, body, self._label_keys)
+                retry = retry_delay(self.backoff, self.limiter, attempt, status,
+                                    headers.get("Retry-After", None))
+                if retry is None:
+                    raise _error(status, body)
+            reason, delay = retry
+            API_RETRIES.labels(Endpoint.label(path), reason).inc()
+            log.info("Retrying %s %s in %.2fs (%s)", method, path, delay, reason)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _request(self, method: str, path: str, need_auth: bool): # noqa: FBT001
+        """Send a request; return status, headers and body."""
+        target = self._endpoint + path
+        headers = {"X-Ovh-Application": self._application_key}
+        if need_auth:
+            if not self._application_secret:
+                raise ovh.exceptions.InvalidKey(f"Invalid ApplicationSecret '{self._application_secret}'")
+            if not self._consumer_key:
+                raise ovh.exceptions.InvalidKey(f"Invalid ConsumerKey '{self._consumer_key}'")
+            now = str(int(time.time()) + await self.time_delta())
+            headers.update(self.sign(method, target, "", now))
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        endpoint = Endpoint.label(path)
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                async with self._http().request(method, target, headers=headers) as response:
+                    body = await response.read()
+            except BaseException:
+                API_REQUEST_DURATION.labels(endpoint, "error").observe(time.monotonic() - started)
+                raise
+        API_REQUEST_DURATION.labels(endpoint, str(response.status)).observe(time.monotonic() - started)
+        API_RESPONSE_SIZE.labels(endpoint).observe(len(body))
+        return response.status, response.headers, body
+
+
+def _endpoints(endpoints: typing.Collection[Endpoint]|None) -> list[Endpoint]:
+    return [i for i in Endpoint if endpoints is None or i in endpoints]
+
+
+class AsyncSingleFlight:
+    """Coalesce concurrent coroutine calls with the same key, as
+    ovh_client.SingleFlight does for threads.
+
+    While a call is in flight on an event loop, other callers on this loop
+    with the same key await it instead of issuing their own call."""
+
+    def __init__(self):
+        self._flights: dict[typing.Hashable, asyncio.Future] = {}
+
+    async def do(self, key: typing.Hashable, func: typing.Callable[[], typing.Awaitable]):
+        """Await `func()`, or the in-flight call with the same key."""
+        # a forked process runs a new loop, calls of the parent one never complete
+        key = (asyncio.get_running_loop(), key)
+        flight = self._flights.get(key, None)
+        if flight is None:
+            flight = self._flights[key] = asyncio.ensure_future(func())
+            flight.add_done_callback(lambda _: self._flights.pop(key, None))
+        # a cancelled caller does not cancel the call of the others
+        return await asyncio.shield(flight)
+
+
+_FLIGHTS = AsyncSingleFlight()
+
+
+async def _get_endpoint(client: AsyncOvhClient, endpoint: Endpoint, service_id: str):
+    payload = await client.get(endpoint.url.format(service_id=service_id), **_PARAMS.get(endpoint, {}))
+    log_payload(endpoint.name.lower(), service_id, payload)
+    return payload
+
+
+async def _fetch_endpoint(client: AsyncOvhClient, account: str, endpoint: Endpoint, service_id: str):
+    """Fetch an endpoint of a service, sharing the call in flight for the same
+    account, endpoint and service (see ovh_client._fetch_endpoint)."""
+    return await _FLIGHTS.do(
+        (account, endpoint, service_id), functools.partial(_get_endpoint, client, endpoint, service_id))
+
+
+async def fetch(
+        client: AsyncOvhClient,
+        service_id: str,
+        endpoints: typing.Collection[Endpoint]|None = None) -> OvhApiResponse:
+    """Fetch endpoints of a service concurrently (all if `endpoints` is None)."""
+    selected = _endpoints(endpoints)
+    payloads = await asyncio.gather(*(_get_endpoint(client, i, service_id) for i in selected))
+    return build_response(dict(zip(selected, payloads)))
+
+
+# background revalidations, referenced until done
+_BACKGROUND: set[asyncio.Future] = set()
+
+
+# pylint: disable=too-many-arguments
+async def fetch_all(
+        client: AsyncOvhClient,
+        service_ids: list[str],
+        endpoints: typing.Collection[Endpoint]|None = None,
+        cache: EndpointCache|None = None,
+        account: str = "default",
+        timeout: float|None = None,
+        breakers: CircuitBreakers|None = None) -> tuple[dict[str, OvhApiResponse], set[str]]:
+    """Async counterpart of `ovh_client.fetch_all`, with the same semantics."""
+    def revalidate(endpoint: Endpoint, service_id: str, breaker: CircuitBreaker|None):
+        if cache is None:
+            return
+        entry = cache.claim(account, endpoint, service_id)
+        if entry is not None:
+            task = asyncio.ensure_future(
+                _revalidate(client, cache, account, endpoint, service_id, breaker, entry))
+            _BACKGROUND.add(task)
+            task.add_done_callback(_BACKGROUND.discard)
+
+    payloads, incomplete, calls = lookup(
+        service_ids, _endpoints(endpoints), cache, account, breakers, revalidate)
+    tasks = {
+        asyncio.ensure_future(_fetch_endpoint(client, account, endpoint, service_id)): (service_id, endpoint, breaker)
+        for service_id, endpoint, breaker in calls
+    }
+    done: set = set()
+    not_done: set = set()
+    if tasks:
+        done, not_done = await asyncio.wait(tasks, timeout=timeout)
+    record_results(tasks, done, not_done, payloads, incomplete, cache, account)
+    responses = {
+        service_id: build_response(service_payloads)
+        for service_id, service_payloads in payloads.items()
+    }
+    return responses, incomplete
+
+
+# pylint: disable=too-many-arguments
+async def _revalidate(client, cache, account, endpoint, service_id, breaker, entry):
+    """Refresh a stale cache entry."""
+    try:
+        payload = await _fetch_endpoint(client, account, endpoint, service_id)
+    except Exception: # noqa: BLE001
+        log.exception("Background refresh failed for service %s (%s)", service_id, endpoint.url)
+        entry.refreshing = False
+        if breaker is not None:
+            breaker.failure()
+        return
+    if breaker is not None:
+        breaker.success()
+    cache.store(account, endpoint, service_id, payload)
+    if cache.on_update is not None:
+        cache.on_update()
+
+
+class AsyncRefresher(Refresher):
+    """Refresher whose API calls run on an asyncio event loop thread.
+
+    The loop keeps running between refreshes so that background
+    revalidations and late calls complete, and keep-alive connections are
+    reused."""
+
+    def __init__(self, client: AsyncOvhClient, *args, **kwargs):
+        super().__init__(client, *args, **kwargs)
+        self._loop: asyncio.AbstractEventLoop|None = None
+        self._loop_pid: int|None = None
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop of current process, started on first use."""
+        with self._lock:
+            if self._loop is None or self._loop_pid != os.getpid():
+                self._loop_pid = os.getpid()
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(name="ovh-fetch-loop", target=self._loop.run_forever)
+                thread.daemon = True
+                thread.start()
+            return self._loop
+
+    def _list_projects(self) -> list[str]:
+        """List project ids of the account on the event loop."""
+        projects: list[str] = asyncio.run_coroutine_threadsafe(
+            self._client.get("/cloud/project"), self._event_loop()).result()
+        return projects
+
+    def _fetch_all(self, service_ids: list[str]):
+        """Fetch all services on the event loop."""
+        return asyncio.run_coroutine_threadsafe(
+            fetch_all(self._client, service_ids, self._endpoints, self._cache,
+                      self._account, self._timeout, self._breakers),
+            self._event_loop()).result()
+
+    def stop(self):
+        """Ask background thread and event loop to stop."""
+        super().stop()
+        loop = self._loop
+        if loop is not None and self._loop_pid == os.getpid():
+            asyncio.run_coroutine_threadsafe(self._client.close(), loop).add_done_callback(
+                lambda _future: loop.call_soon_threadsafe(loop.stop))
@@ -9,22 +9,27 @@ import threading
 
 import ovh
 
-from ovh_exporter.config import Config
+from ovh_exporter.config import Account, Config
 from ovh_exporter.logger import log
 
 
-def login(config: Config):
-    """Init an auth process. Consumer key is displayed in console and
-    `env_file` is updated if provided (replace any OVH_CONSUMER_KEY
-    declaration)."""
+def login(config: Config, account: Account):
+    """Init an auth process for `account`. Consumer key is displayed in
+    console and `env_file` is updated if provided (replace any
+    OVH_CONSUMER_KEY declaration, OVH_CONSUMER_KEY_<NAME> with accounts
+    configuration)."""
     client = ovh.Client(
-        endpoint=config.ovh.endpoint,
-        application_key=config.ovh.application_key,
-        application_secret=config.ovh.application_secret,
+        endpoint=account.ovh.endpoint,
+        application_key=account.ovh.application_key,
+        application_secret=account.ovh.application_secret,
     )
     req = ovh.ConsumerKeyRequest(client=client)
     req.add_rule("GET", "/me")
-    for service in config.services:
+    if account.discovery.enabled:
+        # any project of the account, including future ones
+        req.add_rule("GET", "/cloud/project")
+        req.add_rule("GET", "/cloud/project/*")
+    for service in account.services:
         req.add_rule("GET", f"/cloud/project/{service.id}")
         req.add_rule("GET", f"/cloud/project/{service.id}/quota")
         req.add_rule("GET", f"/cloud/project/{service.id}/instance")
@@ -62,18 +67,30 @@ def login(config: Config):
     consumer_key = pending_request["consumerKey"]
     print(f"Login success; consumerKey={consumer_key}") # noqa: T201
     if config.env_file:
-        update_env_file(config.env_file, consumer_key)
+        variable = consumer_key_variable(account) if config.multi_account else "OVH_CONSUMER_KEY"
+        update_env_file(config.env_file, consumer_key, variable)
 
 
-def update_env_file(env_file, consumer_key):
-    """Update environment file with updated OVH_CONSUMER_KEY.
+def consumer_key_variable(account: Account) -> str:
+    """Consumer key environment variable of a named account."""
+    return "OVH_CONSUMER_KEY_" + re.sub(r"[^A-Z0-9]", "_", account.name.upper())
+
+
+def update_env_file(env_file, consumer_key, variable="OVH_CONSUMER_KEY"):
+    """Update environment file with updated `variable` (OVH_CONSUMER_KEY).
 
     A new file is created if it does not exists."""
     # create an empty file if it does not exists
     if not os.path.exists(env_file):
         with open(env_file, mode="tw", encoding="UTF-8") as f:
-            f.write("OVH_CONSUMER_KEY=")
-    # update OVH_CONSUMER_KEY
+            f.write(f"{variable}=")
+    # add variable if missing
+    with open(env_file, encoding="UTF-8") as f:
+        declared = any(re.search(rf"\b{variable} *=", line) for line in f)
+    if not declared:
+        with open(env_file, mode="ta", encoding="UTF-8") as f:
+            f.write(f"\n{variable}=")
+    # update variable
     with fileinput.FileInput([env_file], inplace=True) as f:
         for line in f:
             # add an 'updated on' comment
@@ -83,9 +100,9 @@ def update_env_file(env_file, consumer_key):
             # ignore existing 'updated on' line
             if re.match(r"# updated on .*", line):
                 continue
-            # replace OVH_CONSUMER_KEY= definition, else keep entry
+            # replace variable definition, else keep entry
             overwrite_line = re.sub(
-                r"(OVH_CONSUMER_KEY *= *)(.*)", f"OVH_CONSUMER_KEY={consumer_key}", line
+                rf"\b({variable} *= *)(.*)", f"{variable}={consumer_key}", line
             )
             print(overwrite_line) # noqa: T201
     print("auth.env updated.") # noqa: T201
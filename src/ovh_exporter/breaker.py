@@ -0,0 +1,98 @@
+"""Circuit breakers for OVH API calls.
+
+A breaker opens after `failure_threshold` consecutive failures (errors or
+timeouts) of an endpoint of a service of an account; calls are then skipped and last good
+data is served. After `reset_timeout` seconds a single probe call is
+allowed: success closes the breaker, failure opens it again."""
+from __future__ import annotations
+
+import threading
+import time
+from enum import Enum
+
+from ovh_exporter.logger import log
+from ovh_exporter.telemetry import CIRCUIT_BREAKER_REJECTED, CIRCUIT_BREAKER_STATE
+
+
+class State(Enum):
+    """Breaker state; value is exposed by ovh_exporter_circuit_breaker_state."""
+
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+
+class CircuitBreaker:
+    """Breaker of one endpoint of one service of an account."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, account: str, service_id: str, endpoint: str, failure_threshold: int,
+                 reset_timeout: float, clock=time.monotonic):
+        self.account = account
+        self.service_id = service_id
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self.state = State.CLOSED
+        CIRCUIT_BREAKER_STATE.labels(account, service_id, endpoint).set(State.CLOSED.value)
+
+    def _set_state(self, state: State):
+        if state != self.state:
+            log.warning("Circuit breaker %s for service %s of account %s (%s)",
+                        state.name.lower(), self.service_id, self.account, self.endpoint)
+        self.state = state
+        CIRCUIT_BREAKER_STATE.labels(self.account, self.service_id, self.endpoint).set(state.value)
+
+    def allow(self) -> bool:
+        """Check if a call may be done now.
+
+        When open for more than `reset_timeout`, let one probe call through;
+        another one is let through if it does not complete in `reset_timeout`."""
+        with self._lock:
+            if self.state == State.CLOSED:
+                return True
+            now = self._clock()
+            if now - self._opened_at >= self.reset_timeout:
+                self._opened_at = now
+                self._set_state(State.HALF_OPEN)
+                return True
+        CIRCUIT_BREAKER_REJECTED.labels(self.endpoint).inc()
+        return False
+
+    def success(self):
+        """Record a successful call."""
+        with self._lock:
+            self._failures = 0
+            if self.state != State.CLOSED:
+                self._set_state(State.CLOSED)
+
+    def failure(self):
+        """Record a failed or timed out call."""
+        with self._lock:
+            self._failures += 1
+            if self.state == State.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                self._set_state(State.OPEN)
+
+
+class CircuitBreakers:
+    """Breakers by (account, service, endpoint), created on first use."""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 300):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._breakers: dict[tuple[str, str, str], CircuitBreaker] = {}
+
+    def get(self, account: str, service_id: str, endpoint: str) -> CircuitBreaker:
+        """Breaker of an endpoint of a service."""
+        key = (account, service_id, endpoint)
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(
+                    account, service_id, endpoint, self.failure_threshold, self.reset_timeout)
+            return self._breakers[key]
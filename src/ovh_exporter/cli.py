@@ -1,21 +1,39 @@
 """Command line entry-points."""
+from __future__ import annotations
+
+import atexit
+import concurrent.futures
+import json
 import logging
 import os
 import os.path
 import sys
+import threading
 
 import click
 import dotenv
 import yaml
-from prometheus_client import REGISTRY
-from prometheus_client.exposition import make_wsgi_app
+from prometheus_client import (
+    GC_COLLECTOR,
+    PLATFORM_COLLECTOR,
+    PROCESS_COLLECTOR,
+    REGISTRY,
+)
 
-from ovh_exporter import auth
-from ovh_exporter.collector import OvhCollector
-from ovh_exporter.config import Config, expandvars, validate
+from ovh_exporter import async_client, auth, fake_api, mapping, streaming
+from ovh_exporter.breaker import CircuitBreakers
+from ovh_exporter.collector import MetricFamily, OvhCollector, endpoints_for, specs_for
+from ovh_exporter.config import Account, Config, expandvars, validate
+from ovh_exporter.discovery import ProjectDiscovery
+from ovh_exporter.exposition import ExpositionCache
 from ovh_exporter.logger import init_logging, log
-from ovh_exporter.ovh_client import build_client, fetch
-from ovh_exporter.wsgi import BasicAuthMiddleware, run_server
+from ovh_exporter.ovh_client import Endpoint, build_client, build_pool, fetch, fetch_all
+from ovh_exporter.refresher import Refresher, SnapshotAggregator
+from ovh_exporter.replay import Archive, RecordingClient
+from ovh_exporter.store import FileSnapshotStore, default_path
+from ovh_exporter.supervisor import ProcessSupervisor, forget_children
+from ovh_exporter.telemetry import COLLECT_REGISTRY, SnapshotTelemetryCollector
+from ovh_exporter.wsgi import BasicAuthMiddleware, MetricsApplication, run_server
 
 VERBOSITY = {
     "info": logging.INFO,
@@ -23,6 +41,10 @@ VERBOSITY = {
     "warning": logging.WARNING,
     "error": logging.ERROR
 }
+# commands runnable without configuration file
+NO_CONFIG_COMMANDS = ("fake-api",)
+ACCOUNT_OPTION = click.option("-a", "--account", "account_name",
+                              help="Account name (accounts configuration). Default to first account.")
 
 @click.group("ovh_exporter")
 @click.option("-v", "--verbosity",
@@ -30,13 +52,21 @@ VERBOSITY = {
               default="warning",
               envvar="OVH_EXPORTER_VERBOSITY")
 @click.option("-c", "--config",
-              type=click.Path(exists=True, dir_okay=False),
+              type=click.Path(dir_okay=False),
               default="config.yaml",
               envvar="OVH_EXPORTER_CONFIG")
+@click.option("--dump-payloads", "payload_dir",
+              type=click.Path(file_okay=False),
+              envvar="OVH_EXPORTER_DUMP_PAYLOADS",
+              help="Write each fetched payload to this directory (one JSON file by service and endpoint).")
 @click.pass_context
-def main(ctx, config, verbosity):
+def main(ctx, config, verbosity, payload_dir):
     """Command line entry-point. Load configuration."""
-    init_logging(VERBOSITY[verbosity])
+    init_logging(VERBOSITY[verbosity], payload_dir)
+    if ctx.invoked_subcommand in NO_CONFIG_COMMANDS:
+        return
+    if not os.path.isfile(config):
+        raise click.BadParameter(f"File '{config}' does not exist.", ctx, param_hint="'-c' / '--config'")
     with open(config, encoding="utf-8") as fstream:
         # Load configuration
         config_dict = yaml.safe_load(fstream)
@@ -57,22 +87,59 @@ def main(ctx, config, verbosity):
 
 
 @main.command("ovh")
+@click.option("-r", "--record", type=click.Path(dir_okay=False),
+              help="Record all endpoint responses of all services to this archive (see `server --replay`).")
+@ACCOUNT_OPTION
 @click.pass_context
-def ovh(ctx):
+def ovh(ctx, record, account_name):
     """OVH client test."""
-    service_id = ctx.obj.services[0].id
-    client = build_client(ctx.obj.ovh)
-    fetch(client, service_id)
+    account = _account(ctx, account_name)
+    if not record:
+        client = build_client(account.ovh)
+        fetch(client, _service_ids(account, client)[0])
+        return
+    recorder = RecordingClient(build_pool(account.ovh, ctx.obj.refresh.max_in_flight))
+    with concurrent.futures.ThreadPoolExecutor(ctx.obj.refresh.max_in_flight) as executor:
+        _responses, incomplete = fetch_all(recorder, _service_ids(account, recorder), executor)
+    if incomplete:
+        log.warning("Incomplete record for services %s", ", ".join(sorted(incomplete)))
+    recorder.save(record)
 
 
 @main.command("server")
+@click.option("-f", "--family", "families",
+              type=click.Choice([i.key for i in MetricFamily]),
+              multiple=True,
+              help="Enabled metric family; repeat for each family. Override metrics.families configuration.")
+@click.option("--replay", type=click.Path(exists=True, dir_okay=False),
+              help="Expose responses recorded by `ovh --record` instead of calling OVH API.")
 @click.pass_context
-def server(ctx):
+def server(ctx, families, replay):
     """Exporter startup"""
-    # load client
-    client = build_client(ctx.obj.ovh)
-    # initialize registry
-    REGISTRY.register(OvhCollector(client, ctx.obj.services))
+    enabled_families = MetricFamily.load(families or ctx.obj.metrics.families)
+    if not replay and ctx.obj.refresh.backend == "asyncio" and not async_client.AVAILABLE:
+        print("refresh.backend asyncio requires aiohttp; install ovh_exporter[asyncio].", file=sys.stderr) # noqa: T201
+        ctx.exit(1)
+    for family, collector in (
+            (MetricFamily.PROCESS, PROCESS_COLLECTOR),
+            (MetricFamily.GC, GC_COLLECTOR),
+            (MetricFamily.PLATFORM, PLATFORM_COLLECTOR)):
+        if family not in enabled_families:
+            REGISTRY.unregister(collector)
+    store = None
+    if replay:
+        source = Archive.load(replay)
+    else:
+        # snapshots are written by a dedicated refresher process and read by
+        # all gunicorn workers
+        store = FileSnapshotStore(ctx.obj.refresh.snapshot_file or default_path())
+        source = store
+    # OVH metrics are rendered once per snapshot
+    cache = ExpositionCache(OvhCollector(source, ctx.obj.services, enabled_families, ctx.obj.labelnames(),
+                                         ctx.obj.metrics.extra))
+    # self-instrumentation
+    REGISTRY.register(COLLECT_REGISTRY)
+    REGISTRY.register(SnapshotTelemetryCollector(source))
     scheme = "http"
     tls = ctx.obj.server.tls
     cert_file = None
@@ -92,7 +159,7 @@ def server(ctx):
         cert_file = tls.cert_file
         key_file = tls.key_file
     basic_auth = ctx.obj.server.basic_auth
-    wsgi_app = make_wsgi_app(REGISTRY)
+    wsgi_app = MetricsApplication(cache, REGISTRY, ctx.obj.server.compression)
     if basic_auth.enabled:
         if not basic_auth.login or not basic_auth.password:
             print("Login and password for basic auth are missing.", file=sys.stderr) # noqa: T201
@@ -104,15 +171,171 @@ def server(ctx):
         )
     bind_addr = ctx.obj.server.bind_addr
     bind_port = ctx.obj.server.port
+    hooks = {}
+    if store is not None:
+        # started by gunicorn arbiter, restarted if it exits
+        refresher = ProcessSupervisor("ovh-refresher", _run_refresher, (ctx.obj, enabled_families, store.path))
+        hooks = {
+            "when_ready": lambda _arbiter: refresher.start(),
+            "post_fork": lambda _arbiter, _worker: forget_children(),
+            "on_exit": lambda _arbiter: refresher.stop(),
+        }
+        atexit.register(store.remove)
     print(f"Visit {scheme}://{bind_addr}:{bind_port}/metrics to view metrics.") # noqa: T201
     run_server(wsgi_app,
                bind_addr, bind_port,
-               cert_file, key_file)
+               cert_file, key_file,
+               ctx.obj.server.timeout,
+               hooks)
+
+
+def _account(ctx, name: str|None) -> Account:
+    """Account selected by --account option."""
+    config: Config = ctx.obj
+    account = config.account(name)
+    if account is None:
+        raise click.BadParameter(f"Unknown account '{name}'.", ctx, param_hint="'-a' / '--account'")
+    return account
+
+
+def _build_refresher(config: Config, account: Account, families, store=None) -> Refresher:
+    """Build a refresher of an account for enabled metric families.
+
+    Each account has its own client pool, rate limiter, cache and breakers."""
+    refresh = config.refresh
+    specs = specs_for(families, config.metrics.extra)
+    fields = {
+        endpoint: tree
+        for endpoint, tree in mapping.fields(specs).items()
+        if endpoint.name.lower() in refresh.streaming}
+    label_keys = mapping.label_keys(specs)
+    if fields and not streaming.AVAILABLE:
+        log.warning("ijson is not installed, %s payloads are pruned after decoding",
+                    ", ".join(refresh.streaming))
+    args = (account.services,
+            refresh.interval, refresh.max_in_flight,
+            endpoints_for(families, config.metrics.extra),
+            {Endpoint[k.upper()]: v for k, v in refresh.ttl.items()},
+            account.name,
+            store,
+            refresh.timeout,
+            CircuitBreakers(refresh.breaker_failures, refresh.breaker_reset),
+            _build_discovery(account))
+    if refresh.backend == "asyncio":
+        return async_client.AsyncRefresher(
+            async_client.AsyncOvhClient(account.ovh, refresh.max_in_flight, fields=fields, label_keys=label_keys),
+            *args)
+    return Refresher(build_pool(account.ovh, refresh.max_in_flight, fields, label_keys), *args)
+
+
+def _build_discovery(account: Account) -> ProjectDiscovery|None:
+    """Project discovery, if enabled."""
+    discovery = account.discovery
+    if not discovery.enabled:
+        return None
+    return ProjectDiscovery(discovery.interval, discovery.labels, account.services)
+
+
+def _service_ids(account: Account, client) -> list[str]:
+    """Configured service ids, and account projects if discovery is enabled."""
+    discovery = _build_discovery(account)
+    if discovery is None:
+        return [i.id for i in account.services]
+    return discovery.service_ids(lambda: client.get("/cloud/project"))
+
+
+def _run_refresher(config: Config, families, snapshot_path: str):
+    """Refresher process entry-point; accounts are refreshed concurrently."""
+    aggregator = SnapshotAggregator(
+        {i.name: i.services for i in config.accounts},
+        FileSnapshotStore(snapshot_path))
+    threads = [
+        threading.Thread(
+            name=f"ovh-refresher-{account.name}",
+            target=_build_refresher(config, account, families, aggregator.store(account.name)).run,
+            daemon=True)
+        for account in config.accounts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
 
 
 @main.command("login")
+@ACCOUNT_OPTION
 @click.pass_context
-def login(ctx):
+def login(ctx, account_name):
     """Perform login (retrieve consumerKey). Updated env_file if configured."""
-    auth.login(ctx.obj)
+    auth.login(ctx.obj, _account(ctx, account_name))
+
+
+
+def _fake_api_options(function):
+    """Fake API behaviour options."""
+    for option in reversed((
+            click.option("--latency", type=float, default=0.0, show_default=True,
+                         help="Response delay in seconds."),
+            click.option("--jitter", type=float, default=0.0, show_default=True,
+                         help="Random extra delay, up to this value in seconds."),
+            click.option("--error-rate", type=float, default=0.0, show_default=True,
+                         help="Ratio of HTTP 500 responses."),
+            click.option("--throttle-rate", type=float, default=0.0, show_default=True,
+                         help="Ratio of HTTP 429 responses."),
+            click.option("--projects", type=int, default=1, show_default=True,
+                         help="Projects listed by /cloud/project."),
+            click.option("--instances", type=int, default=10, show_default=True),
+            click.option("--volumes", type=int, default=10, show_default=True),
+            click.option("--buckets", type=int, default=10, show_default=True),
+            click.option("--regions", type=int, default=3, show_default=True))):
+        function = option(function)
+    return function
 
+
+@main.command("fake-api")
+@click.option("-b", "--bind", "bind_addr", default="127.0.0.1", show_default=True)
+@click.option("-p", "--port", type=int, default=8001, show_default=True)
+@_fake_api_options
+def fake_api_server(bind_addr, port, **options):
+    """Serve a fake OVH API with synthetic projects."""
+    server = fake_api.FakeApiServer((bind_addr, port), fake_api.FakeApiOptions(**options))
+    print(f"Fake OVH API listening on {server.url}; use it as ovh.endpoint_url.") # noqa: T201
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@main.command("load-test")
+@click.option("-n", "--passes", type=int, default=3, show_default=True,
+              help="Number of uncached fetch passes.")
+@click.option("-m", "--max-in-flight", type=int, default=None,
+              help="Concurrent API calls. Default to refresh.max_in_flight.")
+@click.option("--fake", is_flag=True,
+              help="Run against an in-process fake API instead of configured account.")
+@ACCOUNT_OPTION
+@_fake_api_options
+@click.pass_context
+def load_test(ctx, passes, max_in_flight, fake, account_name, **options):
+    """Fetch all services repeatedly and print timings as JSON."""
+    config = ctx.obj
+    account = _account(ctx, account_name)
+    server = None
+    if fake:
+        server = fake_api.start(("127.0.0.1", 0), fake_api.FakeApiOptions(**options))
+        account.ovh.endpoint_url = server.url
+        # fake API does not check credentials, but ovh client requires them
+        account.ovh.application_key = account.ovh.application_key or "fake"
+        account.ovh.application_secret = account.ovh.application_secret or "fake"
+        account.ovh.consumer_key = account.ovh.consumer_key or "fake"
+    try:
+        max_in_flight = max_in_flight or config.refresh.max_in_flight
+        client = build_pool(account.ovh, max_in_flight)
+        results = fake_api.load_test(client, _service_ids(account, client), passes,
+                                     max_in_flight, config.refresh.timeout)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    print(json.dumps(results, indent=2)) # noqa: T201
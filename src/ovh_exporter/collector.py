@@ -1,659 +1,363 @@
 """OVH Collector."""
 from __future__ import annotations
 
+import sys
 import typing
 from enum import Enum
 
 from prometheus_client.core import GaugeMetricFamily
 
-from ovh_exporter import ovh_client
+from ovh_exporter.config import MetricSpec
 from ovh_exporter.logger import log
+from ovh_exporter.mapping import compile_specs
+from ovh_exporter.ovh_client import Endpoint
+from ovh_exporter.telemetry import COLLECT_DURATION, COLLECT_SAMPLES, SNAPSHOT_TIMESTAMP
 
 if typing.TYPE_CHECKING:
-    import ovh
+    from prometheus_client.samples import Sample
 
     from ovh_exporter.config import Service
+    from ovh_exporter.mapping import Table
+    from ovh_exporter.refresher import Snapshot
 
-class Endpoint(Enum):
-    """API Enpoints."""
 
-    PROJECT = "/cloud/project/{service_id}"
-    QUOTA = "/cloud/project/{service_id}/quota"
-    INSTANCE = "/cloud/project/{service_id}/instance"
-    STORAGE = "/cloud/project/{service_id}/storage"
-    USAGE = "/cloud/project/{service_id}/usage/current"
-    VOLUME = "/cloud/project/{service_id}/volume"
+class SnapshotSource(typing.Protocol):
+    """Provider of the latest fetched data."""
 
-    def __init__(self, url):
-        self.url = url
+    def snapshot(self) -> Snapshot:
+        """Return latest snapshot."""
 
 
 class MetricFamily(Enum):
-    """Metric families selection."""
-
-    PROCESS: tuple[Endpoint] = []
-    GC: tuple[Endpoint] = []
-    PLATFORM: tuple[Endpoint] = []
-    USAGE_VOLUME = (Endpoint.USAGE,)
-    USAGE_STORAGE = (Endpoint.USAGE,)
-    USAGE_INSTANCE = (Endpoint.USAGE,)
-    QUOTA_VOLUME = (Endpoint.QUOTA,)
-    QUOTA_INSTANCE = (Endpoint.USAGE,)
-    QUOTA_NETWORK = (Endpoint.USAGE,)
-    QUOTA_LB = (Endpoint.USAGE,)
-    QUOTA_KEYMANAGER = (Endpoint.USAGE,)
-
-    def __init__(self, endpoints: tuple[Endpoint]):
+    """Metric families selection.
+
+    Each family lists the API endpoints it needs."""
+
+    PROCESS = ("process", ())
+    GC = ("gc", ())
+    PLATFORM = ("platform", ())
+    VOLUME = ("volume", (Endpoint.VOLUME,))
+    STORAGE = ("storage", (Endpoint.STORAGE,))
+    USAGE_VOLUME = ("usage_volume", (Endpoint.USAGE,))
+    USAGE_STORAGE = ("usage_storage", (Endpoint.USAGE,))
+    USAGE_INSTANCE = ("usage_instance", (Endpoint.USAGE,))
+    QUOTA_VOLUME = ("quota_volume", (Endpoint.QUOTA,))
+    QUOTA_INSTANCE = ("quota_instance", (Endpoint.QUOTA,))
+    QUOTA_NETWORK = ("quota_network", (Endpoint.QUOTA,))
+    QUOTA_LB = ("quota_lb", (Endpoint.QUOTA,))
+    QUOTA_KEYMANAGER = ("quota_keymanager", (Endpoint.QUOTA,))
+
+    def __init__(self, key: str, endpoints: tuple[Endpoint, ...]):
+        self.key = key
         self.endpoints = endpoints
 
+    @staticmethod
+    def load(keys: typing.Iterable[str]|None) -> frozenset[MetricFamily]:
+        """Families from configuration keys; all families if None."""
+        if keys is None:
+            return frozenset(MetricFamily)
+        by_key = {family.key: family for family in MetricFamily}
+        return frozenset(by_key[key] for key in keys)
+
+
+def endpoints_for(
+        families: typing.Iterable[MetricFamily],
+        extra: typing.Iterable[MetricSpec] = ()) -> frozenset[Endpoint]:
+    """Minimal set of endpoints needed by families and extra metrics."""
+    return frozenset(
+        endpoint
+        for family in families
+        for endpoint in family.endpoints) | {Endpoint[spec.endpoint.upper()] for spec in extra}
+
+
+def specs_for(
+        families: typing.Iterable[MetricFamily],
+        extra: typing.Iterable[MetricSpec] = ()) -> list[MetricSpec]:
+    """Specs of families then extra metrics."""
+    enabled = {family.key for family in families}
+    return [*(spec for spec in METRIC_SPECS if spec.family in enabled), *extra]
+
+
+def _quota(family: str, section: str, metrics: typing.Iterable[tuple[str, str, str]]) -> list[MetricSpec]:
+    """Specs of a quota section, by region."""
+    return [
+        MetricSpec(name, documentation, "quota", "*", {"region": "region"},
+                   f"{section}.{field}", family, when=section)
+        for name, documentation, field in metrics]
+
+
+def _usage_instance(period: str, hours: str) -> list[MetricSpec]:
+    """Specs of hourly or monthly instance usage, by instance of a flavor group."""
+    labels = {"region": "^region", "instance_id": "instanceId", "type": f"={period}", "flavor": "^reference"}
+    rows = f"{period}Usage.instance.*.details.*"
+    return [
+        MetricSpec("ovh_usage_instance_hours", "Instance usage in hours", "usage", rows, labels,
+                   hours, "usage_instance"),
+        MetricSpec("ovh_usage_instance_price", "Instance usage price", "usage", rows, labels,
+                   "totalPrice", "usage_instance"),
+    ]
+
+
+def _usage_storage(name: str, documentation: str, path: str, default: float|None = 0) -> MetricSpec:
+    """Spec of a storage usage; bandwidth sections may be missing."""
+    return MetricSpec(name, documentation, "usage", "hourlyUsage.storage.*",
+                      {"region": "region", "flavor": "type"}, path, "usage_storage",
+                      default=default, when="totalPrice")
+
+
+_STORAGE_LABELS = {
+    "region": "region", "storage_id": "id", "storage_name": "name", "storage_type": "containerType"}
+_VOLUME_USAGE_LABELS = {"region": "^region", "volume_id": "volumeId", "flavor": "^type"}
+
+# Built-in metrics, in exposition order; a service_id label is added first.
+METRIC_SPECS: tuple[MetricSpec, ...] = (
+    *_quota("quota_instance", "instance", (
+        ("ovh_quota_instance_count", "Instance count", "usedInstances"),
+        ("ovh_quota_instance_max_count", "Instance max count", "maxInstances"),
+        ("ovh_quota_cpu_count", "CPU count", "usedCores"),
+        ("ovh_quota_cpu_max_count", "CPU max count", "maxCores"),
+        ("ovh_quota_ram_gb", "RAM count", "usedRAM"),
+        ("ovh_quota_ram_max_gb", "RAM max count", "maxRam"))),
+    *_quota("quota_volume", "volume", (
+        ("ovh_quota_volume_gb", "Volume gigabytes", "usedGigabytes"),
+        ("ovh_quota_volume_max_gb", "Volume max gigabytes", "maxGigabytes"),
+        ("ovh_quota_volume_count", "Volume count", "volumeCount"),
+        ("ovh_quota_volume_max_count", "Volume max count", "maxVolumeCount"),
+        ("ovh_quota_volume_backup_gb", "Volume backup gigabytes", "usedBackupGigabytes"),
+        ("ovh_quota_volume_backup_max_gb", "Volume backup max gigabytes", "maxBackupGigabytes"),
+        ("ovh_quota_volume_backup_count", "Volume count", "volumeBackupCount"),
+        ("ovh_quota_volume_backup_max_count", "Volume max count", "maxVolumeBackupCount"))),
+    *_quota("quota_network", "network", (
+        ("ovh_quota_network_count", "Network count", "usedNetworks"),
+        ("ovh_quota_network_max_count", "Network max count", "maxNetworks"),
+        ("ovh_quota_network_subnet_count", "Network subnet count", "usedSubnets"),
+        ("ovh_quota_network_subnet_max_count", "Network subnet max count", "maxSubnets"),
+        ("ovh_quota_network_floating_ip_count", "Network floating IP count", "usedFloatingIPs"),
+        ("ovh_quota_network_floating_ip_max_count", "Network floating IP max count", "maxFloatingIPs"),
+        ("ovh_quota_network_gateway_count", "Network gateway count", "usedGateways"),
+        ("ovh_quota_network_gateway_max_count", "Network gateway max count", "maxGateways"))),
+    *_quota("quota_lb", "loadBalancer", (
+        ("ovh_quota_load_balancer_count", "Load balancer count", "usedLoadBalancers"),
+        ("ovh_quota_load_balancer_max_count", "Load balancer max count", "maxLoadBalancers"))),
+    *_quota("quota_keymanager", "keymanager", (
+        ("ovh_quota_keymanager_secret_count", "Key manager count", "usedSecrets"),
+        ("ovh_quota_keymanager_secret_max_count", "Key manager max count", "maxSecrets"))),
+    MetricSpec("ovh_volume_size_gb", "Volume size in Gb", "volume", "*",
+               {"volume_id": "id", "name": "name", "region": "region", "type": "type"},
+               "size", "volume", value_type="int"),
+    MetricSpec("ovh_storage_object_count", "Storage object count", "storage", "*",
+               _STORAGE_LABELS, "storedObjects", "storage"),
+    MetricSpec("ovh_storage_size_bytes", "Storage size in bytes", "storage", "*",
+               _STORAGE_LABELS, "storedBytes", "storage"),
+    *_usage_instance("hourly", "quantity.value"),
+    *_usage_instance("monthly", "=720"),
+    MetricSpec("ovh_usage_volume_gb_hours", "Volume usage in gb x hours", "usage",
+               "hourlyUsage.volume.*.details.*", _VOLUME_USAGE_LABELS, "quantity.value", "usage_volume"),
+    MetricSpec("ovh_usage_volume_price", "Volume usage price", "usage",
+               "hourlyUsage.volume.*.details.*", _VOLUME_USAGE_LABELS, "totalPrice", "usage_volume"),
+    _usage_storage("ovh_usage_storage_price", "Storage usage price", "stored.totalPrice", None),
+    _usage_storage("ovh_usage_storage_gb_hours", "Storage usage in gb x hours", "stored.quantity.value", None),
+    _usage_storage("ovh_usage_storage_bandwidth_internal_outgoing_price",
+                   "Storage usage external outgoing bandwidth price", "outgoingInternalBandwidth.totalPrice"),
+    _usage_storage("ovh_usage_storage_bandwidth_internal_outgoing_gb",
+                   "Storage usage external outgoing bandwidth in gb", "outgoingInternalBandwidth.quantity.value"),
+    _usage_storage("ovh_usage_storage_bandwidth_internal_incoming_price",
+                   "Storage usage external incoming bandwidth price", "incomingInternalBandwidth.totalPrice"),
+    _usage_storage("ovh_usage_storage_bandwidth_internal_incoming_gb",
+                   "Storage usage external incoming bandwidth in gb", "incomingInternalBandwidth.quantity.value"),
+    _usage_storage("ovh_usage_storage_bandwidth_external_outgoing_price",
+                   "Storage usage external outgoing bandwidth price", "outgoingBandwidth.totalPrice"),
+    _usage_storage("ovh_usage_storage_bandwidth_external_outgoing_gb",
+                   "Storage usage external outgoing bandwidth in gb", "outgoingBandwidth.quantity.value"),
+    _usage_storage("ovh_usage_storage_bandwidth_external_incoming_price",
+                   "Storage usage external incoming bandwidth price", "incomingBandwidth.totalPrice"),
+    _usage_storage("ovh_usage_storage_bandwidth_external_incoming_gb",
+                   "Storage usage external incoming bandwidth in gb", "incomingBandwidth.quantity.value"),
+)
 
-# pylint: disable=too-many-instance-attributes,too-few-public-methods
-class Metrics:
-    """Metrics wrapper."""
-
-    # pylint: disable=too-many-statements
-    def __init__(self, labelnames):
-        # Storage
-        storage_usage_labels = ["service_id", "region", "flavor"]
-        self.ovh_usage_storage_gb_hours = GaugeMetricFamily(
-            "ovh_usage_storage_gb_hours",
-            "Storage usage in gb x hours",
-            labels=labelnames + storage_usage_labels,
-        )
-        self.ovh_usage_storage_price = GaugeMetricFamily(
-            "ovh_usage_storage_price",
-            "Storage usage price",
-            labels=labelnames + storage_usage_labels,
-        )
-        self.ovh_usage_storage_bandwidth_external_outgoing_gb = GaugeMetricFamily(
-            "ovh_usage_storage_bandwidth_external_outgoing_gb",
-            "Storage usage external outgoing bandwidth in gb",
-            labels=labelnames + storage_usage_labels,
-        )
-        self.ovh_usage_storage_bandwidth_external_outgoing_price = GaugeMetricFamily(
-            "ovh_usage_storage_bandwidth_external_outgoing_price",
-            "Storage usage external outgoing bandwidth price",
-            labels=labelnames + storage_usage_labels,
-        )
-        self.ovh_usage_storage_bandwidth_internal_outgoing_gb = GaugeMetricFamily(
-            "ovh_usage_storage_bandwidth_internal_outgoing_gb",
-            "Storage usage external outgoing bandwidth in gb",
-            labels=labelnames + storage_usage_labels,
-        )
-        self.ovh_usage_storage_bandwidth_internal_outgoing_price = GaugeMetricFamily(
-            "ovh_usage_storage_bandwidth_internal_outgoing_price",
-            "Storage usage external outgoing bandwidth price",
-            labels=labelnames + storage_usage_labels,
-        )
-        self.ovh_usage_storage_bandwidth_external_incoming_gb = GaugeMetricFamily(
-            "ovh_usage_storage_bandwidth_external_incoming_gb",
-            "Storage usage external incoming bandwidth in gb",
-            labels=labelnames + storage_usage_labels,
-        )
-        self.ovh_usage_storage_bandwidth_external_incoming_price = GaugeMetricFamily(
-            "ovh_usage_storage_bandwidth_external_incoming_price",
-            "Storage usage external incoming bandwidth price",
-            labels=labelnames + storage_usage_labels,
-        )
-        self.ovh_usage_storage_bandwidth_internal_incoming_gb = GaugeMetricFamily(
-            "ovh_usage_storage_bandwidth_internal_incoming_gb",
-            "Storage usage external incoming bandwidth in gb",
-            labels=labelnames + storage_usage_labels,
-        )
-        self.ovh_usage_storage_bandwidth_internal_incoming_price = GaugeMetricFamily(
-            "ovh_usage_storage_bandwidth_internal_incoming_price",
-            "Storage usage external incoming bandwidth price",
-            labels=labelnames + storage_usage_labels,
-        )
-
-        # Volumes
-        volume_labels = ["service_id", "volume_id", "name", "region", "type"]
-        self.ovh_volume_size_gb = GaugeMetricFamily(
-            "ovh_volume_size_gb", "Volume size in Gb", labels=labelnames + volume_labels
-        )
-
-        # Volumes quota
-        volume_quota_labels = ["service_id", "region"]
-        self.ovh_quota_volume_gb = GaugeMetricFamily(
-            "ovh_quota_volume_gb", "Volume gigabytes", labels=labelnames + volume_quota_labels
-        )
-        self.ovh_quota_volume_max_gb = GaugeMetricFamily(
-            "ovh_quota_volume_max_gb",
-            "Volume max gigabytes",
-            labels=labelnames + volume_quota_labels,
-        )
-        self.ovh_quota_volume_backup_gb = GaugeMetricFamily(
-            "ovh_quota_volume_backup_gb",
-            "Volume backup gigabytes",
-            labels=labelnames + volume_quota_labels,
-        )
-        self.ovh_quota_volume_backup_max_gb = GaugeMetricFamily(
-            "ovh_quota_volume_backup_max_gb",
-            "Volume backup max gigabytes",
-            labels=labelnames + volume_quota_labels,
-        )
-        self.ovh_quota_volume_count = GaugeMetricFamily(
-            "ovh_quota_volume_count", "Volume count", labels=labelnames + volume_quota_labels
-        )
-        self.ovh_quota_volume_max_count = GaugeMetricFamily(
-            "ovh_quota_volume_max_count", "Volume max count", labels=labelnames + volume_quota_labels
-        )
-        self.ovh_quota_volume_backup_count = GaugeMetricFamily(
-            "ovh_quota_volume_backup_count", "Volume count", labels=labelnames + volume_quota_labels
-        )
-        self.ovh_quota_volume_backup_max_count = GaugeMetricFamily(
-            "ovh_quota_volume_backup_max_count",
-            "Volume max count",
-            labels=labelnames + volume_quota_labels,
-        )
-
-        # Instances
-        instance_labels = ["service_id", "region"]
-        self.ovh_quota_instance_count = GaugeMetricFamily(
-            "ovh_quota_instance_count", "Instance count", labels=labelnames + instance_labels
-        )
-        self.ovh_quota_instance_max_count = GaugeMetricFamily(
-            "ovh_quota_instance_max_count", "Instance max count", labels=labelnames + instance_labels
-        )
-        self.ovh_quota_cpu_count = GaugeMetricFamily(
-            "ovh_quota_cpu_count", "CPU count", labels=labelnames + instance_labels
-        )
-        self.ovh_quota_cpu_max_count = GaugeMetricFamily(
-            "ovh_quota_cpu_max_count", "CPU max count", labels=labelnames + instance_labels
-        )
-        self.ovh_quota_ram_gb = GaugeMetricFamily(
-            "ovh_quota_ram_gb", "RAM count", labels=labelnames + instance_labels
-        )
-        self.ovh_quota_ram_max_gb = GaugeMetricFamily(
-            "ovh_quota_ram_max_gb", "RAM max count", labels=labelnames + instance_labels
-        )
-
-        # Network quota
-        network_quota_labels = ["service_id", "region"]
-        self.ovh_quota_network_count = GaugeMetricFamily(
-            "ovh_quota_network_count", "Network count", labels=labelnames + network_quota_labels
-        )
-        self.ovh_quota_network_max_count = GaugeMetricFamily(
-            "ovh_quota_network_max_count",
-            "Network max count",
-            labels=labelnames + network_quota_labels,
-        )
-        self.ovh_quota_network_subnet_count = GaugeMetricFamily(
-            "ovh_quota_network_subnet_count",
-            "Network subnet count",
-            labels=labelnames + network_quota_labels,
-        )
-        self.ovh_quota_network_subnet_max_count = GaugeMetricFamily(
-            "ovh_quota_network_subnet_max_count",
-            "Network subnet max count",
-            labels=labelnames + network_quota_labels,
-        )
-        self.ovh_quota_network_floating_ip_count = GaugeMetricFamily(
-            "ovh_quota_network_floating_ip_count",
-            "Network floating IP count",
-            labels=labelnames + network_quota_labels,
-        )
-        self.ovh_quota_network_floating_ip_max_count = GaugeMetricFamily(
-            "ovh_quota_network_floating_ip_max_count",
-            "Network floating IP max count",
-            labels=labelnames + network_quota_labels,
-        )
-        self.ovh_quota_network_gateway_count = GaugeMetricFamily(
-            "ovh_quota_network_gateway_count",
-            "Network gateway count",
-            labels=labelnames + network_quota_labels,
-        )
-        self.ovh_quota_network_gateway_max_count = GaugeMetricFamily(
-            "ovh_quota_network_gateway_max_count",
-            "Network gateway max count",
-            labels=labelnames + network_quota_labels,
-        )
-
-        # load balancer quota
-        load_balancer_quota_labels = ["service_id", "region"]
-        self.ovh_quota_load_balancer_count = GaugeMetricFamily(
-            "ovh_quota_load_balancer_count",
-            "Load balancer count",
-            labels=labelnames + load_balancer_quota_labels,
-        )
-        self.ovh_quota_load_balancer_max_count = GaugeMetricFamily(
-            "ovh_quota_load_balancer_max_count",
-            "Load balancer max count",
-            labels=labelnames + load_balancer_quota_labels,
-        )
-
-        # keymanager quota
-        keymanager_labels = ["service_id", "region"]
-        self.ovh_quota_keymanager_secret_count = GaugeMetricFamily(
-            "ovh_quota_keymanager_secret_count",
-            "Key manager count",
-            labels=labelnames + keymanager_labels,
-        )
-        self.ovh_quota_keymanager_secret_max_count = GaugeMetricFamily(
-            "ovh_quota_keymanager_secret_max_count",
-            "Key manager max count",
-            labels=labelnames + keymanager_labels,
-        )
-
-        # storage
-        storage_labels = [
-            "service_id",
-            "region",
-            "storage_id",
-            "storage_name",
-            "storage_type",
-        ]
-        self.ovh_storage_size_bytes = GaugeMetricFamily(
-            "ovh_storage_size_bytes", "Storage size in bytes", labels=labelnames + storage_labels
-        )
-        self.ovh_storage_object_count = GaugeMetricFamily(
-            "ovh_storage_object_count", "Storage object count", labels=labelnames + storage_labels
-        )
 
-        # instance usage
-        instance_usage_labels = [
-            "service_id",
-            "region",
-            "instance_id",
-            "type",
-            "flavor",
-        ]
-        self.ovh_usage_instance_hours = GaugeMetricFamily(
-            "ovh_usage_instance_hours",
-            "Instance usage in hours",
-            labels=labelnames + instance_usage_labels,
-        )
-        self.ovh_usage_instance_price = GaugeMetricFamily(
-            "ovh_usage_instance_price",
-            "Instance usage price",
-            labels=labelnames + instance_usage_labels,
-        )
-
-        # volume usage
-        volume_usage_labels = ["service_id", "region", "volume_id", "flavor"]
-        self.ovh_usage_volume_gb_hours = GaugeMetricFamily(
-            "ovh_usage_volume_gb_hours",
-            "Volume usage in gb x hours",
-            labels=labelnames + volume_usage_labels,
-        )
-        self.ovh_usage_volume_price = GaugeMetricFamily(
-            "ovh_usage_volume_price",
-            "Volume usage price",
-            labels=labelnames + volume_usage_labels
-        )
+# pylint: disable=too-few-public-methods
+class Metrics:
+    """Metric families of one collection."""
+
+    def __init__(self, labelnames: list[str], specs: typing.Iterable[MetricSpec]):
+        # Exporter
+        self.ovh_exporter_service_stale = GaugeMetricFamily(
+            "ovh_exporter_service_stale",
+            "Whether service data is missing or not fully refreshed by the last API poll",
+            labels=labelnames + ["service_id"],
+        )
+        self.ovh_exporter_service_last_success_timestamp_seconds = GaugeMetricFamily(
+            "ovh_exporter_service_last_success_timestamp_seconds",
+            "Unix time of the last successful fetch of an endpoint",
+            labels=labelnames + ["service_id", "endpoint"],
+        )
+        self.gauges: dict[str, GaugeMetricFamily] = {}
+        # family key ("extra" for configured metrics) by metric name
+        self.families: dict[str, str] = {}
+        for spec in specs:
+            if spec.name in self.gauges:
+                # metric read from several tables
+                continue
+            self.gauges[spec.name] = GaugeMetricFamily(
+                spec.name, spec.documentation, labels=labelnames + ["service_id", *spec.labels])
+            self.families[spec.name] = spec.family or "extra"
+
+    def samples_by_family(self) -> dict[str, int]:
+        """Number of samples by family key."""
+        samples: dict[str, int] = {}
+        for name, gauge in self.gauges.items():
+            family = self.families[name]
+            samples[family] = samples.get(family, 0) + len(gauge.samples)
+        return samples
 
-    # pylint: disable=too-many-statements
     def do_yield(self):
-        """Perform all yields."""
-        yield self.ovh_quota_instance_count
-        yield self.ovh_quota_instance_max_count
-        yield self.ovh_quota_cpu_count
-        yield self.ovh_quota_cpu_max_count
-        yield self.ovh_quota_ram_gb
-        yield self.ovh_quota_ram_max_gb
-
-        yield self.ovh_quota_volume_gb
-        yield self.ovh_quota_volume_max_gb
-        yield self.ovh_quota_volume_count
-        yield self.ovh_quota_volume_max_count
-        yield self.ovh_quota_volume_backup_gb
-        yield self.ovh_quota_volume_backup_max_gb
-        yield self.ovh_quota_volume_backup_count
-        yield self.ovh_quota_volume_backup_max_count
-
-        yield self.ovh_quota_network_count
-        yield self.ovh_quota_network_max_count
-        yield self.ovh_quota_network_subnet_count
-        yield self.ovh_quota_network_subnet_max_count
-        yield self.ovh_quota_network_floating_ip_count
-        yield self.ovh_quota_network_floating_ip_max_count
-        yield self.ovh_quota_network_gateway_count
-        yield self.ovh_quota_network_gateway_max_count
-
-        yield self.ovh_quota_load_balancer_count
-        yield self.ovh_quota_load_balancer_max_count
-
-        yield self.ovh_quota_keymanager_secret_count
-        yield self.ovh_quota_keymanager_secret_max_count
-
-        yield self.ovh_storage_object_count
-        yield self.ovh_storage_size_bytes
-
-        yield self.ovh_usage_instance_hours
-        yield self.ovh_usage_instance_price
-
-        yield self.ovh_usage_volume_gb_hours
-        yield self.ovh_usage_volume_price
-
-        yield self.ovh_usage_storage_price
-        yield self.ovh_usage_storage_gb_hours
-        yield self.ovh_usage_storage_bandwidth_internal_outgoing_price
-        yield self.ovh_usage_storage_bandwidth_internal_outgoing_gb
-        yield self.ovh_usage_storage_bandwidth_internal_incoming_price
-        yield self.ovh_usage_storage_bandwidth_internal_incoming_gb
-        yield self.ovh_usage_storage_bandwidth_external_outgoing_price
-        yield self.ovh_usage_storage_bandwidth_external_outgoing_gb
-        yield self.ovh_usage_storage_bandwidth_external_incoming_price
-        yield self.ovh_usage_storage_bandwidth_external_incoming_gb
+        """Perform yields of all metrics."""
+        yield from self.gauges.values()
+        yield self.ovh_exporter_service_stale
+        yield self.ovh_exporter_service_last_success_timestamp_seconds
 
 
 # pylint: disable=too-few-public-methods
 class OvhCollector:
-    """OVH collector."""
-
-    def __init__(self, client: ovh.Client, services: list[Service]):
-        self._client: ovh.Client = client
+    """OVH collector.
+
+    Metrics are built from the latest snapshot of `source`; no API call is
+    performed during collection."""
+
+    def __init__(
+            self,
+            source: SnapshotSource,
+            services: list[Service],
+            families: frozenset[MetricFamily]|None = None,
+            labelnames: list[str]|None = None,
+            extra: typing.Sequence[MetricSpec] = ()):
+        self._source: SnapshotSource = source
         self._services: list[Service] = services
-        self.labels: typing.Mapping[str, typing.Sequence[str]] = {}
-        self.labelnames = []
-        if services:
-            labelset = set(services[0].labels.keys())
+        self._families: frozenset[MetricFamily] = (
+            families if families is not None else frozenset(MetricFamily))
+        self._specs: list[MetricSpec] = specs_for(self._families, extra)
+        self._tables = compile_specs(self._specs)
+        # samples of the last collection by service and table, with payload marker
+        self._derived: dict[tuple[str, str], tuple[tuple, dict[str, list[Sample]]]] = {}
+        # label values of configured services, in labelnames order
+        self.labels: dict[str, tuple[str, ...]] = {}
+        self.labelnames = list(labelnames) if labelnames is not None else []
+        if services and labelnames is None:
             self.labelnames = list(services[0].labels.keys())
-            for service in services:
-                service_labelset = set(service.labels.keys())
-                if labelset != service_labelset:
-                    raise Exception("Service label names must be the same for all services")
-                self.labels[service.id] = [service.labels[name] for name in self.labelnames]
-
-    def _labels(self, service, labels):
-        value = []
-        value.extend(self.labels[service.id])
-        value.extend(labels)
-        return value
+        self._prefix_names = (*self.labelnames, "service_id")
+        labelset = set(self.labelnames)
+        for service in services:
+            service_labelset = set(service.labels.keys())
+            if labelset != service_labelset:
+                raise Exception("Service label names must be the same for all services")
+            self.labels[service.id] = tuple(sys.intern(service.labels[name]) for name in self.labelnames)
+        builtin = {spec.name for spec in METRIC_SPECS}
+        for spec in extra:
+            if spec.name in builtin:
+                raise ValueError(f"Extra metric {spec.name} is a built-in metric")
+            if labelset.intersection(spec.labels) or "service_id" in spec.labels:
+                raise ValueError(f"Extra metric {spec.name} labels must differ from service labels")
+
+    # pylint: disable=too-many-arguments
+    def _derive(
+            self,
+            snapshot: Snapshot,
+            service_id: str,
+            prefix: tuple[str, ...],
+            labels: dict[str, str],
+            table: Table,
+            payload,
+            derived: dict) -> dict[str, list[Sample]]:
+        """Samples of a table for a payload, by metric name.
+
+        Samples of the previous collection are reused while the payload
+        marker (content hash, else usage lastUpdate) and service labels are
+        unchanged; they are recorded in `derived`."""
+        marker = snapshot.digests.get(service_id, {}).get(table.endpoint.name.lower(), None)
+        if marker is None and isinstance(payload, dict):
+            marker = payload.get("lastUpdate", None)
+        key = (service_id, table.name)
+        cached = self._derived.get(key, None)
+        if marker is not None and cached is not None and cached[0] == (marker, prefix):
+            samples = cached[1]
+        else:
+            samples = {name: [] for name in table.names}
+            table.collect(samples, labels, payload)
+        if marker is not None:
+            derived[key] = ((marker, prefix), samples)
+        return samples
+
+    def _prefix(self, service: Service) -> tuple[str, ...]:
+        """Service labels then service_id values."""
+        labels = self.labels.get(service.id, None)
+        if labels is None:
+            # discovered service
+            labels = tuple(sys.intern(service.labels.get(name, "")) for name in self.labelnames)
+        return (*labels, sys.intern(service.id))
 
     def describe(self):
         """Describe metrics."""
-        metrics = Metrics(self.labelnames)
-        yield from metrics.do_yield()
+        yield from Metrics(self.labelnames, self._specs).do_yield()
+
+    @property
+    def source(self) -> SnapshotSource:
+        """Snapshot provider."""
+        return self._source
 
     def collect(self):
         """Collect metrics."""
-        metrics = Metrics(self.labelnames)
-        for service in self._services:
-            response = ovh_client.fetch(self._client, service.id)
-            self._collect_volumes(metrics, service, response.volumes)
-            self._collect_volume_quota(metrics, service, response.quotas)
-            self._collect_instance_quota(metrics, service, response.quotas)
-            self._collect_network_quota(metrics, service, response.quotas)
-            self._collect_load_balancer_quota(metrics, service, response.quotas)
-            self._collect_keymanager_quota(metrics, service, response.quotas)
-            self._collect_storages(metrics, service, response.storages)
-            self._collect_instance_usage(metrics, service, response.usage)
-            self._collect_volume_usage(metrics, service, response.usage)
-            self._collect_storage_usage(metrics, service, response.usage)
-        yield from metrics.do_yield()
-
-    def _collect_volumes(self, metrics: Metrics, service, volumes):
-        """Collect volume information."""
-        for volume in volumes:
-            try:
-                gauge_value = int(volume["size"])
-                metrics.ovh_volume_size_gb.add_metric(
-                    self._labels(service, [
-                        service.id,
-                        volume["id"],
-                        volume["name"],
-                        volume["region"],
-                        volume["type"],
-                    ]),
-                    gauge_value,
-                )
-            except (TypeError, ValueError):
-                log.warning("Volume %s ignored as size is missing", volume["id"])
-
-    def _collect_instance_quota(self, metrics: Metrics, service, quotas):
-        """Collect instance quota information."""
-        for quota in quotas:
-            if "instance" not in quota:
-                return
-            metrics.ovh_quota_instance_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["instance"]["usedInstances"]
-            )
-            metrics.ovh_quota_instance_max_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["instance"]["maxInstances"]
-            )
-            metrics.ovh_quota_cpu_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["instance"]["usedCores"]
-            )
-            metrics.ovh_quota_cpu_max_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["instance"]["maxCores"]
-            )
-            metrics.ovh_quota_ram_gb.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["instance"]["usedRAM"]
-            )
-            metrics.ovh_quota_ram_max_gb.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["instance"]["maxRam"]
-            )
-
-    def _collect_volume_quota(self, metrics: Metrics, service, quotas):
-        """Collect volume quota information."""
-        for quota in quotas:
-            if "volume" not in quota:
-                return
-            metrics.ovh_quota_volume_gb.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["volume"]["usedGigabytes"]
-            )
-            metrics.ovh_quota_volume_max_gb.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["volume"]["maxGigabytes"]
-            )
-            metrics.ovh_quota_volume_backup_gb.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["volume"]["usedBackupGigabytes"]
-            )
-            metrics.ovh_quota_volume_backup_max_gb.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["volume"]["maxBackupGigabytes"]
-            )
-            metrics.ovh_quota_volume_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["volume"]["volumeCount"]
-            )
-            metrics.ovh_quota_volume_max_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["volume"]["maxVolumeCount"]
-            )
-            metrics.ovh_quota_volume_backup_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["volume"]["volumeBackupCount"]
-            )
-            metrics.ovh_quota_volume_backup_max_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]),
-                quota["volume"]["maxVolumeBackupCount"],
-            )
-
-    def _collect_network_quota(self, metrics: Metrics, service, quotas):
-        """Collect network quota information."""
-        for quota in quotas:
-            if "network" not in quota:
-                return
-            metrics.ovh_quota_network_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["network"]["usedNetworks"]
-            )
-            metrics.ovh_quota_network_max_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["network"]["maxNetworks"]
-            )
-            metrics.ovh_quota_network_subnet_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["network"]["usedSubnets"]
-            )
-            metrics.ovh_quota_network_subnet_max_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["network"]["maxSubnets"]
-            )
-            metrics.ovh_quota_network_floating_ip_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["network"]["usedFloatingIPs"]
-            )
-            metrics.ovh_quota_network_floating_ip_max_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["network"]["maxFloatingIPs"]
-            )
-            metrics.ovh_quota_network_gateway_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["network"]["usedGateways"]
-            )
-            metrics.ovh_quota_network_gateway_max_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["network"]["maxGateways"]
-            )
-
-    def _collect_load_balancer_quota(self, metrics: Metrics, service, quotas):
-        """Collect load balancer quota information."""
-        for quota in quotas:
-            if "loadBalancer" not in quota:
-                return
-            metrics.ovh_quota_load_balancer_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]),
-                quota["loadBalancer"]["usedLoadBalancers"],
-            )
-            metrics.ovh_quota_load_balancer_max_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]),
-                quota["loadBalancer"]["maxLoadBalancers"],
-            )
-
-    def _collect_keymanager_quota(self, metrics: Metrics, service, quotas):
-        """Collect key manager quota information."""
-        for quota in quotas:
-            if "keymanager" not in quota:
-                return
-            metrics.ovh_quota_keymanager_secret_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["keymanager"]["usedSecrets"]
-            )
-            metrics.ovh_quota_keymanager_secret_max_count.add_metric(
-                self._labels(service, [service.id, quota["region"]]), quota["keymanager"]["maxSecrets"]
-            )
-
-    def _collect_storages(self, metrics: Metrics, service, storages):
-        """Collect storage usage information."""
-        for storage in storages:
-            metrics.ovh_storage_size_bytes.add_metric(
-                self._labels(service, [
-                    service.id,
-                    storage["region"],
-                    storage["id"],
-                    storage["name"],
-                    storage["containerType"],
-                ]),
-                storage["storedBytes"],
-            )
-            metrics.ovh_storage_object_count.add_metric(
-                self._labels(service, [
-                    service.id,
-                    storage["region"],
-                    storage["id"],
-                    storage["name"],
-                    storage["containerType"],
-                ]),
-                storage["storedObjects"],
-            )
-
-    def _collect_instance_usage(self, metrics: Metrics, service, usages):
-        if "hourlyUsage" in usages:
-            for group in usages["hourlyUsage"]["instance"]:
-                flavor = group["reference"]
-                region = group["region"]
-                for instance in group["details"]:
-                    hours = instance["quantity"]["value"]
-                    price = instance["totalPrice"]
-                    instance_id = instance["instanceId"]
-                    metrics.ovh_usage_instance_hours.add_metric(
-                        self._labels(service, [service.id, region, instance_id, "hourly", flavor]), hours
-                    )
-                    metrics.ovh_usage_instance_price.add_metric(
-                        self._labels(service, [service.id, region, instance_id, "hourly", flavor]), price
-                    )
-        if "monthlyUsage" in usages:
-            for group in usages["monthlyUsage"]["instance"]:
-                flavor = group["reference"]
-                region = group["region"]
-                for instance in group["details"]:
-                    hours = 720
-                    price = instance["totalPrice"]
-                    instance_id = instance["instanceId"]
-                    metrics.ovh_usage_instance_hours.add_metric(
-                        self._labels(service, [service.id, region, instance_id, "monthly", flavor]), hours
-                    )
-                    metrics.ovh_usage_instance_price.add_metric(
-                        self._labels(service, [service.id, region, instance_id, "monthly", flavor]), price
-                    )
-
-    def _collect_volume_usage(self, metrics: Metrics, service, usages):
-        """Collect volume usage information."""
-        if "hourlyUsage" in usages:
-            for group in usages["hourlyUsage"]["volume"]:
-                flavor = group["type"]
-                region = group["region"]
-                for volume in group["details"]:
-                    hours = volume["quantity"]["value"]
-                    price = volume["totalPrice"]
-                    instance_id = volume["volumeId"]
-                    metrics.ovh_usage_volume_gb_hours.add_metric(
-                        self._labels(service, [service.id, region, instance_id, flavor]), hours
-                    )
-                    metrics.ovh_usage_volume_price.add_metric(
-                        self._labels(service, [service.id, region, instance_id, flavor]), price
-                    )
-
-    # pylint: disable=too-many-locals,too-many-statements
-    def _collect_storage_usage(self, metrics: Metrics, service, usages):
-        """Collect storage usage information."""
-        if "hourlyUsage" not in usages:
-            return
-        for storage in usages["hourlyUsage"]["storage"]:
-            if not storage["totalPrice"]:
+        yield from self.collect_snapshot(self._source.snapshot())
+
+    def has_service(self, service_id: str) -> bool:
+        """Check if service is configured or discovered."""
+        return any(service.id == service_id for service in self._snapshot_services(self._source.snapshot()))
+
+    def _snapshot_services(self, snapshot: Snapshot) -> list[Service]:
+        """Services of a snapshot: discovered ones if any, else configured ones."""
+        return snapshot.services if snapshot.services is not None else self._services
+
+    def collect_snapshot(self, snapshot: Snapshot, service_ids: typing.Container[str]|None = None):
+        """Collect metrics from a given snapshot; only `service_ids` if provided."""
+        metrics = Metrics(self.labelnames, self._specs)
+        derived: dict[tuple[str, str], tuple[tuple, dict[str, list[Sample]]]] = {}
+        for service in self._snapshot_services(snapshot):
+            if service_ids is not None and service.id not in service_ids:
+                continue
+            response = snapshot.responses.get(service.id, None)
+            prefix = self._prefix(service)
+            metrics.ovh_exporter_service_stale.add_metric(
+                prefix, 1 if response is None or service.id in snapshot.stale else 0)
+            # unlike an age, it keeps its meaning if snapshots stop being published
+            for endpoint, age in snapshot.ages.get(service.id, {}).items():
+                metrics.ovh_exporter_service_last_success_timestamp_seconds.add_metric(
+                    (*prefix, endpoint), snapshot.timestamp - age)
+            if response is None:
+                log.debug("No data yet for service %s", service.id)
                 continue
-            flavor = storage["type"]
-            region = storage["region"]
-            hours = storage["stored"]["quantity"]["value"]
-            price = storage["stored"]["totalPrice"]
-            if storage.get("incomingBandwidth", None):
-                external_incoming_gb = storage["incomingBandwidth"]["quantity"]["value"]
-                external_incoming_price = storage["incomingBandwidth"]["totalPrice"]
-            else:
-                external_incoming_gb = 0
-                external_incoming_price = 0
-            if storage.get("outgoingBandwidth", None):
-                external_outgoing_gb = storage["outgoingBandwidth"]["quantity"]["value"]
-                external_outgoing_price = storage["outgoingBandwidth"]["totalPrice"]
-            else:
-                external_outgoing_gb = 0
-                external_outgoing_price = 0
-            if storage.get("incomingInternalBandwidth", None):
-                internal_incoming_gb = storage["incomingInternalBandwidth"]["quantity"][
-                    "value"
-                ]
-                internal_incoming_price = storage["incomingInternalBandwidth"][
-                    "totalPrice"
-                ]
-            else:
-                internal_incoming_gb = 0
-                internal_incoming_price = 0
-            if storage.get("outgoingInternalBandwidth", None):
-                internal_outgoing_gb = storage["outgoingInternalBandwidth"]["quantity"][
-                    "value"
-                ]
-                internal_outgoing_price = storage["outgoingInternalBandwidth"][
-                    "totalPrice"
-                ]
-            else:
-                internal_outgoing_gb = 0
-                internal_outgoing_price = 0
-            metrics.ovh_usage_storage_gb_hours.add_metric(
-                self._labels(service, [service.id, region, flavor]), hours
-            )
-            metrics.ovh_usage_storage_price.add_metric(
-                self._labels(service, [service.id, region, flavor]), price
-            )
-            metrics.ovh_usage_storage_bandwidth_external_incoming_gb.add_metric(
-                self._labels(service, [service.id, region, flavor]), external_incoming_gb
-            )
-            metrics.ovh_usage_storage_bandwidth_external_incoming_price.add_metric(
-                self._labels(service, [service.id, region, flavor]), external_incoming_price
-            )
-            metrics.ovh_usage_storage_bandwidth_external_outgoing_gb.add_metric(
-                self._labels(service, [service.id, region, flavor]), external_outgoing_gb
-            )
-            metrics.ovh_usage_storage_bandwidth_external_outgoing_price.add_metric(
-                self._labels(service, [service.id, region, flavor]), external_outgoing_price
-            )
-            metrics.ovh_usage_storage_bandwidth_internal_incoming_gb.add_metric(
-                self._labels(service, [service.id, region, flavor]), internal_incoming_gb
-            )
-            metrics.ovh_usage_storage_bandwidth_internal_incoming_price.add_metric(
-                self._labels(service, [service.id, region, flavor]), internal_incoming_price
-            )
-            metrics.ovh_usage_storage_bandwidth_internal_outgoing_gb.add_metric(
-                self._labels(service, [service.id, region, flavor]), internal_outgoing_gb
-            )
-            metrics.ovh_usage_storage_bandwidth_internal_outgoing_price.add_metric(
-                self._labels(service, [service.id, region, flavor]), internal_outgoing_price
-            )
+            labels = dict(zip(self._prefix_names, prefix))
+            for table in self._tables:
+                payload = getattr(response, table.field)
+                if payload is None:
+                    continue
+                # an unexpected payload must not drop other services metrics
+                try:
+                    with COLLECT_DURATION.labels(table.endpoint.name.lower()).time():
+                        samples = self._derive(snapshot, service.id, prefix, labels, table, payload, derived)
+                except Exception: # noqa: BLE001
+                    log.exception("Collection of %s failed for service %s",
+                                  table.endpoint.name.lower(), service.id)
+                    continue
+                for name, table_samples in samples.items():
+                    metrics.gauges[name].samples.extend(table_samples)
+        if service_ids is None:
+            # drop samples of removed services
+            self._derived = derived
+        else:
+            self._derived.update(derived)
+        if service_ids is None:
+            # probes only collect some services
+            for family, count in metrics.samples_by_family().items():
+                COLLECT_SAMPLES.labels(family).set(count)
+        SNAPSHOT_TIMESTAMP.set(snapshot.timestamp)
+        yield from metrics.do_yield()
@@ -18,6 +18,13 @@ properties:
     description: OVH account credentials
     type: object
     $ref: urn:OvhAccount
+  accounts:
+    description: OVH accounts, each with its own services (instead of ovh and services)
+    type: array
+    minItems: 1
+    items:
+      type: object
+      $ref: urn:Account
   env_file:
     description: Environment variables file path
     type: string
@@ -27,9 +34,92 @@ properties:
     items:
       type: object
       $ref: urn:Service
+  refresh:
+    description: Background refresh setting
+    type: object
+    $ref: urn:Refresh
+  metrics:
+    description: Metric families selection
+    type: object
+    $ref: urn:MetricFamilies
+  discovery:
+    description: Automatic project discovery (default of all accounts)
+    type: object
+    $ref: urn:Discovery
+oneOf:
+  - required:
+      - ovh
+  - required:
+      - accounts
+if:
+  required:
+    - ovh
+  not:
+    properties:
+      discovery:
+        properties:
+          enabled:
+            const: true
+        required:
+          - enabled
+    required:
+      - discovery
+then:
+  required:
+    - services
+"""
+ACCOUNT_SCHEMA = """
+$schema: https://json-schema.org/draft/2020-12/schema
+title: Named OVH account and its services
+type: object
+$ref: urn:OvhAccount
+properties:
+  name:
+    description: Account name, exported as `account` label
+    type: string
+    minLength: 1
+  services:
+    description: OVH project/service to check
+    type: array
+    items:
+      type: object
+      $ref: urn:Service
+      properties:
+        labels:
+          not:
+            required:
+              - account
+  discovery:
+    description: Automatic project discovery (override top-level discovery)
+    type: object
+    $ref: urn:Discovery
 required:
-  - ovh
-  - services
+  - name
+"""
+DISCOVERY_SCHEMA = """
+$schema: https://json-schema.org/draft/2020-12/schema
+title: Automatic project discovery
+type: object
+properties:
+  enabled:
+    type: boolean
+    description: List account projects (/cloud/project) in addition to configured services
+    default: false
+  interval:
+    type: number
+    description: Delay in seconds between two project listings
+    exclusiveMinimum: 0
+    default: 3600
+  labels:
+    description: >-
+      Label templates of discovered projects, rendered with project details
+      (ex. "{projectName}", "{description}"); a value without field is a default.
+      Configured services must define the same labels.
+    type: object
+    patternProperties:
+      "^[a-zA-Z0-9_:]+$":
+        type: string
+    additionalProperties: false
 """
 SERVICE_SCHEMA = """
 $schema: https://json-schema.org/draft/2020-12/schema
@@ -66,6 +156,9 @@ properties:
       - soyoustart-ca
       - kimsufi-eu
       - kimsufi-ca
+  endpoint_url:
+    description: Override API URL (ex. http://localhost:8001/1.0 for `ovh_exporter fake-api`)
+    type: string
   application_key:
     description: Application key
     type: string
@@ -75,11 +168,46 @@ properties:
   consumer_key:
     description: Consumer key; use ${ENV_VAR} to reference an environment variable
     type: string
+  rate_limit:
+    description: API calls rate limit and retries
+    type: object
+    $ref: urn:RateLimit
 required:
   - endpoint
   - application_key
   - application_secret
 """
+RATE_LIMIT_SCHEMA = """
+$schema: https://json-schema.org/draft/2020-12/schema
+title: API calls rate limit and retries
+type: object
+properties:
+  rate:
+    type: number
+    description: Maximum sustained API calls per second, shared by all calls of the account
+    exclusiveMinimum: 0
+    default: 10
+  burst:
+    type: integer
+    description: Calls allowed at once before rate applies
+    minimum: 1
+    default: 20
+  max_retries:
+    type: integer
+    description: Retries of throttled (429), server error (5xx) or network failed calls
+    minimum: 0
+    default: 3
+  backoff:
+    type: number
+    description: Base retry delay in seconds, doubled at each retry and randomized (full jitter)
+    minimum: 0
+    default: 1
+  max_backoff:
+    type: number
+    description: Maximum retry delay in seconds; calls asked to Retry-After longer are not retried
+    minimum: 0
+    default: 30
+"""
 SERVER_SCHEMA = """
 $schema: https://json-schema.org/draft/2020-12/schema
 title: HTTP server setting
@@ -88,6 +216,14 @@ properties:
   port:
     type: integer
     description: Listen port for server
+  timeout:
+    type: integer
+    description: HTTP worker timeout in seconds
+    default: 180
+  compression:
+    type: boolean
+    description: Allow gzip-encoded responses when requested by client
+    default: true
   tls:
     description: TLS setting
     type: object
@@ -116,29 +252,238 @@ properties:
         type: string
         description: Basic authentication password
 """
+REFRESH_SCHEMA = """
+$schema: https://json-schema.org/draft/2020-12/schema
+title: Background refresh setting
+type: object
+properties:
+  interval:
+    type: number
+    description: Delay in seconds between two snapshot refreshes; API calls are governed by ttl
+    exclusiveMinimum: 0
+    default: 60
+  backend:
+    type: string
+    description: API calls engine; asyncio runs all calls on one thread and requires aiohttp (ovh_exporter[asyncio])
+    enum:
+      - threads
+      - asyncio
+    default: threads
+  streaming:
+    type: array
+    description: Endpoints whose payloads only keep fields used by metrics; responses are decoded while downloaded if ijson is installed (ovh_exporter[streaming])
+    items:
+      type: string
+      enum:
+        - usage
+        - volume
+        - quota
+    uniqueItems: true
+    default: []
+  max_in_flight:
+    type: integer
+    description: Maximum number of concurrent OVH API calls
+    minimum: 1
+    default: 4
+  snapshot_file:
+    type: string
+    description: File where the refresher process publishes snapshots for HTTP workers; default to a file in /dev/shm (or temporary directory)
+  timeout:
+    type: number
+    description: Delay in seconds after which unfinished API calls are not waited; previous data is kept and flagged as stale
+    exclusiveMinimum: 0
+    default: 60
+  circuit_breaker:
+    description: Skip calls of an endpoint of a service after repeated failures; last good data is served meanwhile
+    type: object
+    properties:
+      failure_threshold:
+        type: integer
+        description: Consecutive failures or timeouts that open the breaker
+        minimum: 1
+        default: 3
+      reset_timeout:
+        type: number
+        description: Delay in seconds before a probe call is allowed on an open breaker
+        minimum: 0
+        default: 300
+    additionalProperties: false
+  ttl:
+    description: Cache time-to-live in seconds by endpoint; expired data is served while refreshed
+    type: object
+    properties:
+      project:
+        type: number
+        default: 3600
+      quota:
+        type: number
+        default: 3600
+      instance:
+        type: number
+        default: 300
+      storage:
+        type: number
+        default: 300
+      usage:
+        type: number
+        default: 1800
+      volume:
+        type: number
+        default: 300
+    additionalProperties: false
+"""
+METRIC_FAMILIES_SCHEMA = """
+$schema: https://json-schema.org/draft/2020-12/schema
+title: Metric families selection
+type: object
+properties:
+  families:
+    description: Enabled metric families (all if omitted); only needed API endpoints are fetched
+    type: array
+    items:
+      type: string
+      enum:
+        - process
+        - gc
+        - platform
+        - volume
+        - storage
+        - usage_volume
+        - usage_storage
+        - usage_instance
+        - quota_volume
+        - quota_instance
+        - quota_network
+        - quota_lb
+        - quota_keymanager
+  extra:
+    description: Additional metrics declared by paths in an endpoint payload (always enabled)
+    type: array
+    items:
+      type: object
+      $ref: urn:MetricSpec
+"""
+METRIC_SPEC_SCHEMA = """
+$schema: https://json-schema.org/draft/2020-12/schema
+title: Metric declared by paths in an endpoint payload
+type: object
+properties:
+  name:
+    description: Metric name
+    type: string
+    pattern: ^[a-zA-Z_:][a-zA-Z0-9_:]*$
+  documentation:
+    description: Metric help
+    type: string
+  endpoint:
+    description: API endpoint of the payload
+    type: string
+    enum:
+      - project
+      - quota
+      - instance
+      - storage
+      - usage
+      - volume
+  rows:
+    description: >-
+      Dotted path of the rows in the payload, `*` iterating over a list
+      (ex. "*", "hourlyUsage.instance.*.details.*"); empty for the payload itself
+    type: string
+    default: "*"
+  labels:
+    description: >-
+      Label name to dotted path in the row; `^` prefix reads the enclosing row,
+      `=` prefix is a constant. service_id label is always added first.
+    type: object
+    patternProperties:
+      "^[a-zA-Z_][a-zA-Z0-9_]*$":
+        type: string
+    additionalProperties: false
+  value:
+    description: Dotted path of the sample value in the row, or `=` prefixed constant
+    type: string
+  default:
+    description: Value used when the value path is missing (else sample is ignored)
+    type: number
+  type:
+    description: Value conversion
+    type: string
+    enum:
+      - int
+      - float
+  when:
+    description: Dotted path of a value that must be truthy for the row to be used
+    type: string
+required:
+  - name
+  - endpoint
+  - value
+"""
 
 REGISTRY: Registry = Registry().with_contents([
     ("urn:Config", yaml.safe_load(CONFIG_SCHEMA)),
     ("urn:OvhAccount", yaml.safe_load(OVH_ACCOUNT_SCHEMA)),
+    ("urn:Account", yaml.safe_load(ACCOUNT_SCHEMA)),
+    ("urn:RateLimit", yaml.safe_load(RATE_LIMIT_SCHEMA)),
     ("urn:Service", yaml.safe_load(SERVICE_SCHEMA)),
-    ("urn:Server", yaml.safe_load(SERVER_SCHEMA))
+    ("urn:Server", yaml.safe_load(SERVER_SCHEMA)),
+    ("urn:Refresh", yaml.safe_load(REFRESH_SCHEMA)),
+    ("urn:MetricFamilies", yaml.safe_load(METRIC_FAMILIES_SCHEMA)),
+    ("urn:MetricSpec", yaml.safe_load(METRIC_SPEC_SCHEMA)),
+    ("urn:Discovery", yaml.safe_load(DISCOVERY_SCHEMA))
 ])
 
 
 # pylint: disable=too-few-public-methods
+class RateLimit:
+    """API calls rate limit and retries."""
+    # pylint: disable=too-many-arguments
+    def __init__(
+            self,
+            rate: float = 10,
+            burst: int = 20,
+            max_retries: int = 3,
+            backoff: float = 1,
+            max_backoff: float = 30):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    @staticmethod
+    def load(config_dict):
+        """Load rate limit configuration."""
+        return RateLimit(
+            config_dict.get("rate", 10),
+            config_dict.get("burst", 20),
+            config_dict.get("max_retries", 3),
+            config_dict.get("backoff", 1),
+            config_dict.get("max_backoff", 30)
+        )
+
+
 class OvhAccount:
     """OVH account configuration."""
+    # pylint: disable=too-many-arguments
     def __init__(
         self,
         endpoint: str,
         application_key: str,
         application_secret: str,
         consumer_key: str|None,
+        endpoint_url: str|None = None,
+        rate_limit: RateLimit|None = None,
+        name: str|None = None,
     ):
+        self.name = name or endpoint
         self.endpoint = endpoint
         self.application_key = application_key
         self.application_secret = application_secret
         self.consumer_key = consumer_key
+        self.endpoint_url = endpoint_url
+        self.rate_limit = rate_limit or RateLimit()
 
     @staticmethod
     def load(config_dict):
@@ -153,6 +498,9 @@ class OvhAccount:
             config_dict["application_key"],
             config_dict["application_secret"],
             config_dict.get("consumer_key", None),
+            config_dict.get("endpoint_url", None),
+            RateLimit.load(config_dict.get("rate_limit", {})),
+            config_dict.get("name", None),
         )
 
 
@@ -207,11 +555,15 @@ class Server:
             bind_addr: str,
             port: int,
             tls: Tls,
-            basic_auth: BasicAuth):
+            basic_auth: BasicAuth,
+            compression: bool = True, # noqa: FBT001,FBT002
+            timeout: int = 180):
         self.port = port
         self.bind_addr = bind_addr
         self.tls = tls
         self.basic_auth = basic_auth
+        self.compression = compression
+        self.timeout = timeout
 
     @staticmethod
     def load(config_dict):
@@ -220,7 +572,130 @@ class Server:
         port = config_dict.get("port", 9100)
         basic_auth = BasicAuth.load(config_dict.get("basic_auth", {}))
         tls = Tls.load(config_dict.get("tls", {}))
-        return Server(bind_addr, port, tls, basic_auth)
+        compression = config_dict.get("compression", True)
+        timeout = config_dict.get("timeout", 180)
+        return Server(bind_addr, port, tls, basic_auth, compression, timeout)
+
+
+class Refresh:
+    """Background refresh configuration."""
+    def __init__(
+            self,
+            interval: float,
+            max_in_flight: int,
+            ttl: typing.Mapping[str, float],
+            snapshot_file: str|None,
+            timeout: float,
+            breaker_failures: int = 3,
+            breaker_reset: float = 300,
+            backend: str = "threads",
+            streaming: typing.Sequence[str] = ()):
+        self.interval = interval
+        self.max_in_flight = max_in_flight
+        self.ttl = ttl
+        self.snapshot_file = snapshot_file
+        self.timeout = timeout
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self.backend = backend
+        self.streaming = streaming
+
+    @staticmethod
+    def load(config_dict):
+        """Load refresh configuration."""
+        circuit_breaker = config_dict.get("circuit_breaker", {})
+        return Refresh(
+            config_dict.get("interval", 60),
+            config_dict.get("max_in_flight", 4),
+            config_dict.get("ttl", {}),
+            config_dict.get("snapshot_file", None),
+            config_dict.get("timeout", 60),
+            circuit_breaker.get("failure_threshold", 3),
+            circuit_breaker.get("reset_timeout", 300),
+            config_dict.get("backend", "threads"),
+            config_dict.get("streaming", [])
+        )
+
+
+class MetricSpec:
+    """Metric declared by paths in an endpoint payload (see ovh_exporter.mapping)."""
+    # pylint: disable=too-many-arguments
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            endpoint: str,
+            rows: str,
+            labels: typing.Mapping[str, str],
+            value: str,
+            family: str|None = None,
+            default: float|None = None,
+            value_type: str|None = None,
+            when: str|None = None):
+        self.name = name
+        self.documentation = documentation
+        self.endpoint = endpoint
+        self.rows = rows
+        self.labels = labels
+        self.value = value
+        self.family = family
+        self.default = default
+        self.value_type = value_type
+        self.when = when
+
+    @staticmethod
+    def load(config_dict):
+        """Load metric spec."""
+        return MetricSpec(
+            config_dict["name"],
+            config_dict.get("documentation", config_dict["name"]),
+            config_dict["endpoint"],
+            config_dict.get("rows", "*"),
+            config_dict.get("labels", {}),
+            config_dict["value"],
+            None,
+            config_dict.get("default", None),
+            config_dict.get("type", None),
+            config_dict.get("when", None)
+        )
+
+
+class MetricFamilies:
+    """Metric families selection."""
+    def __init__(
+            self,
+            families: list[str]|None,
+            extra: list[MetricSpec]|None = None):
+        self.families = families
+        self.extra = extra or []
+
+    @staticmethod
+    def load(config_dict):
+        """Load metric families selection."""
+        return MetricFamilies(
+            config_dict.get("families", None),
+            [MetricSpec.load(i) for i in config_dict.get("extra", [])])
+
+
+class Discovery:
+    """Automatic project discovery configuration."""
+    def __init__(
+            self,
+            enabled: bool, # noqa: FBT001
+            interval: float,
+            labels: typing.Mapping[str, str]):
+        self.enabled = enabled
+        self.interval = interval
+        self.labels = labels
+
+    @staticmethod
+    def load(config_dict):
+        """Load discovery configuration."""
+        return Discovery(
+            config_dict.get("enabled", False),
+            config_dict.get("interval", 3600),
+            config_dict.get("labels", {})
+        )
 
 
 class Service:
@@ -238,18 +713,84 @@ class Service:
         return Service(config_dict["id"], config_dict.get("labels", {}))
 
 
-class Config:
-    """Configuration."""
+ACCOUNT_LABEL = "account"
+
+
+class Account:
+    """OVH account and its services."""
     def __init__(
             self,
+            name: str,
             ovh: OvhAccount,
+            services: list[Service],
+            discovery: Discovery):
+        self.name = name
+        self.ovh = ovh
+        self.services = services
+        self.discovery = discovery
+
+    @staticmethod
+    def load(config_dict, discovery: Discovery):
+        """Load an `accounts` entry; `discovery` is used if not overridden.
+
+        Services and discovered projects get an `account` label."""
+        name = config_dict["name"]
+        if "discovery" in config_dict:
+            discovery = Discovery.load(config_dict["discovery"])
+        account_label = {ACCOUNT_LABEL: name}
+        return Account(
+            name,
+            OvhAccount.load(config_dict),
+            [
+                Service(i["id"], {**account_label, **i.get("labels", {})})
+                for i in config_dict.get("services", [])],
+            Discovery(discovery.enabled, discovery.interval, {**account_label, **discovery.labels})
+        )
+
+
+class Config:
+    """Configuration.
+
+    `accounts` holds all OVH accounts; with the single account form (`ovh`
+    and `services`), it holds one account and `ovh` is set. `services` holds
+    configured services of all accounts."""
+    # pylint: disable=too-many-arguments
+    def __init__(
+            self,
+            ovh: OvhAccount|None,
             server: Server,
             env_file: str,
-            services: list[Service]):
+            services: list[Service],
+            refresh: Refresh,
+            metrics: MetricFamilies,
+            discovery: Discovery|None = None,
+            accounts: list[Account]|None = None):
         self.ovh = ovh
         self.server = server
         self.env_file = env_file
-        self.services = services
+        self.refresh = refresh
+        self.metrics = metrics
+        self.discovery = discovery or Discovery(False, 3600, {}) # noqa: FBT003
+        self.multi_account = accounts is not None
+        if accounts is None:
+            if ovh is None:
+                raise ValueError("ovh or accounts configuration is required")
+            accounts = [Account(ovh.name, ovh, services, self.discovery)]
+        self.accounts = accounts
+        self.services = [service for account in accounts for service in account.services]
+
+    def account(self, name: str|None = None) -> Account|None:
+        """Account by name, first one if `name` is None."""
+        if name is None:
+            return self.accounts[0]
+        return next((i for i in self.accounts if i.name == name), None)
+
+    def labelnames(self) -> list[str]|None:
+        """Service label names if some projects are discovered (None: from configured services)."""
+        for account in self.accounts:
+            if account.discovery.enabled:
+                return list(account.discovery.labels)
+        return None
 
     @staticmethod
     def load(config_dict):
@@ -259,15 +800,33 @@ class Config:
             registry=REGISTRY
         )
         validator.validate(config_dict)
-        ovh = OvhAccount.load(config_dict.get("ovh"))
         server = Server.load(config_dict.get("server", {}))
-        services = [
-            Service.load(i)
-            for i in config_dict.get("services", [])]
-        return Config(ovh,
+        refresh = Refresh.load(config_dict.get("refresh", {}))
+        metrics = MetricFamilies.load(config_dict.get("metrics", {}))
+        discovery = Discovery.load(config_dict.get("discovery", {}))
+        if "accounts" not in config_dict:
+            return Config(OvhAccount.load(config_dict["ovh"]),
+                          server,
+                          config_dict.get("env_file", None),
+                          [Service.load(i) for i in config_dict.get("services", [])],
+                          refresh,
+                          metrics,
+                          discovery)
+        accounts = [Account.load(i, discovery) for i in config_dict["accounts"]]
+        names = [i.name for i in accounts]
+        if len(set(names)) != len(names):
+            raise ValueError("Account names must be unique")
+        service_ids = [i.id for account in accounts for i in account.services]
+        if len(set(service_ids)) != len(service_ids):
+            raise ValueError("A service can only be configured in one account")
+        return Config(None,
                       server,
                       config_dict.get("env_file", None),
-                      services)
+                      [],
+                      refresh,
+                      metrics,
+                      discovery,
+                      accounts)
 
 
 def validate(config_dict):
@@ -280,9 +839,10 @@ def validate(config_dict):
 
 
 def expandvars(dictionary):
-    """Expand environment variable in dictionary."""
-    for k, v in dictionary.items():
-        if isinstance(v, dict):
+    """Expand environment variable in dictionary (and nested lists)."""
+    items = dictionary.items() if isinstance(dictionary, dict) else enumerate(dictionary)
+    for k, v in items:
+        if isinstance(v, (dict, list)):
             expandvars(v)
         elif isinstance(v, str):
             dictionary[k] = string.Template(v).substitute(os.environ)
@@ -0,0 +1,70 @@
+"""Automatic discovery of OVH cloud projects.
+
+Projects of the account are listed at most once per `interval` by the
+refresher; labels of discovered projects are rendered from label templates
+and project details (`/cloud/project/{service_id}`). Configured services are
+always kept, with their own labels."""
+from __future__ import annotations
+
+import string
+import time
+import typing
+
+from ovh_exporter.config import Service
+from ovh_exporter.logger import log
+
+if typing.TYPE_CHECKING:
+    from ovh_exporter.ovh_client import OvhApiResponse
+
+
+class _Fields(dict):
+    """Template fields; unknown fields render as empty strings."""
+
+    def __missing__(self, key):
+        return ""
+
+
+def render_labels(templates: typing.Mapping[str, str], project) -> dict[str, str]:
+    """Render label templates ("{projectName}", "prod", ...) with project details."""
+    fields = _Fields(project if isinstance(project, dict) else {})
+    formatter = string.Formatter()
+    return {name: formatter.vformat(template, (), fields) for name, template in templates.items()}
+
+
+class ProjectDiscovery:
+    """Service list made of configured and discovered projects."""
+
+    def __init__(
+            self,
+            interval: float,
+            templates: typing.Mapping[str, str],
+            services: list[Service],
+            clock=time.monotonic):
+        self.interval = interval
+        self.templates = templates
+        self._configured = {i.id: i for i in services}
+        self._clock = clock
+        self._discovered: list[str] = []
+        self._listed_at: float|None = None
+
+    def service_ids(self, list_projects: typing.Callable[[], list[str]]) -> list[str]:
+        """Configured then discovered service ids; list projects if interval is elapsed.
+
+        If listing fails, previously discovered projects are kept."""
+        now = self._clock()
+        if self._listed_at is None or now - self._listed_at >= self.interval:
+            try:
+                self._discovered = list(list_projects())
+                self._listed_at = now
+                log.info("%d projects discovered", len(self._discovered))
+            except Exception: # noqa: BLE001
+                log.exception("Project discovery failed, previous list kept")
+        return list(self._configured) + [i for i in self._discovered if i not in self._configured]
+
+    def services(self, responses: typing.Mapping[str, OvhApiResponse]) -> list[Service]:
+        """Services of fetched responses, discovered ones labelled from templates."""
+        return [
+            self._configured.get(service_id, None)
+            or Service(service_id, render_labels(self.templates, response.projects))
+            for service_id, response in responses.items()
+        ]
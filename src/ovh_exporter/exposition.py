@@ -0,0 +1,177 @@
+"""Pre-rendered exposition of OVH metrics.
+
+OVH metrics only change when a new snapshot is published: they are
+serialized (and compressed) once per snapshot generation and format, and
+only the small live part (process, gc, platform metrics) is rendered per
+request."""
+from __future__ import annotations
+
+import threading
+import time
+import typing
+import zlib
+from enum import Enum
+
+from prometheus_client import exposition
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.openmetrics import exposition as openmetrics
+
+from ovh_exporter.logger import log
+
+if typing.TYPE_CHECKING:
+    from prometheus_client.registry import CollectorRegistry
+
+    from ovh_exporter.collector import OvhCollector
+    from ovh_exporter.refresher import Snapshot
+
+# gzip container, see zlib.compressobj documentation
+GZIP_WBITS = 31
+OPENMETRICS_EOF = b"# EOF\n"
+# seconds between two checks while waiting for the first snapshot
+FIRST_SNAPSHOT_POLL = 0.1
+
+
+class Format(Enum):
+    """Exposition formats."""
+
+    TEXT = ("text", exposition.CONTENT_TYPE_LATEST, exposition.generate_latest)
+    OPENMETRICS = ("openmetrics", openmetrics.CONTENT_TYPE_LATEST, openmetrics.generate_latest)
+
+    def __init__(self, key: str, content_type: str, encoder):
+        self.key = key
+        self.content_type = content_type
+        self.encoder = encoder
+
+    @staticmethod
+    def negotiate(accept_header: str|None) -> Format:
+        """Choose format from an Accept header."""
+        for accepted in (accept_header or "").split(","):
+            if accepted.split(";")[0].strip() == "application/openmetrics-text":
+                return Format.OPENMETRICS
+        return Format.TEXT
+
+    @property
+    def eof(self) -> bytes:
+        """End of exposition marker."""
+        return OPENMETRICS_EOF if self is Format.OPENMETRICS else b""
+
+    def render(self, registry) -> bytes:
+        """Render registry, without OpenMetrics EOF marker."""
+        output: bytes = self.encoder(registry)
+        if self is Format.OPENMETRICS and output.endswith(OPENMETRICS_EOF):
+            output = output[:-len(OPENMETRICS_EOF)]
+        return output
+
+
+# pylint: disable=too-few-public-methods
+class _SnapshotRegistry:
+    """Registry-like adapter collecting a fixed snapshot.
+
+    If `target` is set, only this service is collected and a
+    `ovh_exporter_probe_success` metric is added."""
+
+    def __init__(self, collector: OvhCollector, snapshot: Snapshot, target: str|None = None):
+        self._collector = collector
+        self._snapshot = snapshot
+        self._target = target
+
+    def collect(self):
+        """Collect snapshot metrics."""
+        if self._target is None:
+            yield from self._collector.collect_snapshot(self._snapshot)
+            return
+        yield from self._collector.collect_snapshot(self._snapshot, (self._target,))
+        yield GaugeMetricFamily(
+            "ovh_exporter_probe_success",
+            "Whether data is available for probed service",
+            value=1 if self._target in self._snapshot.responses else 0)
+
+
+class Rendered:
+    """Serialized metrics of a snapshot generation.
+
+    `gzip_prefix` is the compressed body flushed on a block boundary;
+    `_compressor` holds the compression state at that point so that a live
+    suffix can be appended without compressing the body again."""
+
+    def __init__(self, snapshot: Snapshot, fmt: Format, body: bytes, target: str|None = None):
+        self.generation = snapshot.generation
+        self.timestamp = snapshot.timestamp
+        self.format = fmt
+        self.body = body
+        # timestamp distinguishes generations of restarted refreshers
+        tag = f"{fmt.key}-{snapshot.generation}-{int(snapshot.timestamp * 1000)}"
+        if target is not None:
+            tag = f"{tag}-{target}"
+        self.etag = f'W/"{tag}"'
+        self._compressor = zlib.compressobj(wbits=GZIP_WBITS)
+        self.gzip_prefix = (
+            self._compressor.compress(body)
+            + self._compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    def matches(self, snapshot: Snapshot) -> bool:
+        """Check if rendered from `snapshot`; a restarted refresher starts
+        generations again, with later timestamps."""
+        return self.generation == snapshot.generation and self.timestamp == snapshot.timestamp
+
+    def text(self, suffix: bytes = b"") -> bytes:
+        """Plain body followed by suffix."""
+        return self.body + suffix
+
+    def gzip(self, suffix: bytes = b"") -> bytes:
+        """Gzip body followed by suffix; only suffix is compressed."""
+        compressor = self._compressor.copy()
+        return self.gzip_prefix + compressor.compress(suffix) + compressor.flush()
+
+
+class ExpositionCache:
+    """Serialized OVH metrics, rebuilt when snapshot generation changes.
+
+    Renderings are kept by format and probe target (None for all services)."""
+
+    def __init__(self, collector: OvhCollector):
+        self.collector = collector
+        self._lock = threading.Lock()
+        self._rendered: dict[tuple[Format, str|None], Rendered] = {}
+
+    def get(
+            self,
+            fmt: Format = Format.TEXT,
+            target: str|None = None,
+            timeout: float|None = None) -> Rendered:
+        """Rendered metrics of the latest snapshot.
+
+        If no snapshot is published yet, wait for it up to `timeout`
+        seconds, then render the empty one."""
+        snapshot = self._snapshot(timeout)
+        key = (fmt, target)
+        rendered = self._rendered.get(key, None)
+        if rendered is not None and rendered.matches(snapshot):
+            return rendered
+        with self._lock:
+            # another thread may have rendered it meanwhile
+            rendered = self._rendered.get(key, None)
+            if rendered is None or not rendered.matches(snapshot):
+                registry = _SnapshotRegistry(self.collector, snapshot, target)
+                rendered = Rendered(snapshot, fmt, fmt.render(registry), target)
+                self._rendered[key] = rendered
+                log.debug("Exposition (%s, %s) rendered for snapshot %d",
+                          fmt.key, target or "all", snapshot.generation)
+            return rendered
+
+    def _snapshot(self, timeout: float|None) -> Snapshot:
+        """Latest snapshot, waiting up to `timeout` for the first one."""
+        snapshot = self.collector.source.snapshot()
+        if snapshot.generation != 0 or not timeout:
+            return snapshot
+        deadline = time.monotonic() + timeout
+        while snapshot.generation == 0 and time.monotonic() < deadline:
+            time.sleep(min(FIRST_SNAPSHOT_POLL, max(0.0, deadline - time.monotonic())))
+            snapshot = self.collector.source.snapshot()
+        return snapshot
+
+
+def render_live(registry: CollectorRegistry, fmt: Format = Format.TEXT) -> bytes:
+    """Render per-request metrics, including OpenMetrics EOF marker."""
+    output: bytes = fmt.encoder(registry)
+    return output
@@ -0,0 +1,165 @@
+"""Local OVH API stand-in for load and latency testing.
+
+Serve synthetic payloads for each `Endpoint` plus `/auth/time` and
+`/cloud/project`, with configurable latency, error rate, HTTP 429
+throttling and payload sizes. Point an account `endpoint_url` to
+`http://<host>:<port>/1.0` to use it instead of OVH API."""
+from __future__ import annotations
+
+import concurrent.futures
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+from ovh_exporter.logger import log
+from ovh_exporter.ovh_client import Endpoint, fetch_all
+from ovh_exporter.synthetic import SyntheticProject
+
+API_PREFIX = "/1.0"
+
+
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
+class FakeApiOptions:
+    """Fake API behaviour."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+            self,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            error_rate: float = 0.0,
+            throttle_rate: float = 0.0,
+            retry_after: int = 1,
+            projects: int = 1,
+            instances: int = 10,
+            volumes: int = 10,
+            buckets: int = 10,
+            regions: int = 3,
+            seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.project_ids = [f"{index:032x}" for index in range(projects)]
+        self.project_options = {
+            "instances": instances,
+            "volumes": volumes,
+            "buckets": buckets,
+            "regions": regions,
+            "seed": seed,
+        }
+
+
+class FakeApiServer(http.server.ThreadingHTTPServer):
+    """Threaded fake OVH API server."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], options: FakeApiOptions):
+        super().__init__(address, FakeApiRequestHandler)
+        self.options = options
+        self._lock = threading.Lock()
+        self._payloads: dict[tuple[str, Endpoint], bytes] = {}
+        self._rng = random.Random(options.project_options["seed"]) # noqa: S311
+
+    @property
+    def url(self) -> str:
+        """API base URL, to be used as account `endpoint_url`."""
+        host, port = self.server_address[:2]
+        if isinstance(host, bytes):
+            host = host.decode()
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def payload(self, service_id: str, endpoint: Endpoint) -> bytes:
+        """JSON payload of a service endpoint (built once)."""
+        with self._lock:
+            if (service_id, endpoint) not in self._payloads:
+                project = SyntheticProject(service_id, **self.options.project_options)
+                for i in Endpoint:
+                    self._payloads[(service_id, i)] = json.dumps(project.payload(i)).encode()
+            return self._payloads[(service_id, endpoint)]
+
+    def draw(self) -> float:
+        """Random number in [0, 1)."""
+        with self._lock:
+            return self._rng.random()
+
+
+class FakeApiRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Fake OVH API request handler."""
+
+    server: FakeApiServer
+
+    # pylint: disable=invalid-name
+    def do_GET(self): # noqa: N802
+        """Answer an API call."""
+        path = urllib.parse.urlsplit(self.path).path
+        if path.startswith(API_PREFIX):
+            path = path[len(API_PREFIX):]
+        if path == "/auth/time":
+            self._send(200, str(int(time.time())).encode())
+            return
+        options = self.server.options
+        delay = options.latency + options.jitter * self.server.draw()
+        if delay:
+            time.sleep(delay)
+        draw = self.server.draw()
+        if draw < options.throttle_rate:
+            self._send(429, b'{"message": "Too many requests"}',
+                       [("Retry-After", str(options.retry_after))])
+            return
+        if draw < options.throttle_rate + options.error_rate:
+            self._send(500, b'{"message": "Internal server error"}')
+            return
+        if path == "/cloud/project":
+            self._send(200, json.dumps(options.project_ids).encode())
+            return
+        label = Endpoint.label(path)
+        if label == "other":
+            self._send(404, json.dumps({"message": f"Got an invalid (or empty) URL {path}"}).encode())
+            return
+        service_id = path.split("/")[3]
+        self._send(200, self.server.payload(service_id, Endpoint[label.upper()]))
+
+    def _send(self, status: int, body: bytes, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args): # noqa: A002 # pylint: disable=redefined-builtin
+        """Route access log to debug logging."""
+        log.debug("fake API: " + format, *args) # noqa: G003
+
+
+def start(address: tuple[str, int], options: FakeApiOptions) -> FakeApiServer:
+    """Start a fake API server in a background thread."""
+    server = FakeApiServer(address, options)
+    thread = threading.Thread(name="fake-api", target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def load_test(client, service_ids: list[str], passes: int, max_in_flight: int,
+              timeout: float|None = None) -> list[dict]:
+    """Run uncached fetch passes over services; return per-pass statistics."""
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_in_flight) as executor:
+        for index in range(passes):
+            start_time = time.perf_counter()
+            _responses, incomplete = fetch_all(client, service_ids, executor, timeout=timeout)
+            results.append({
+                "pass": index,
+                "seconds": time.perf_counter() - start_time,
+                "services": len(service_ids),
+                "incomplete": len(incomplete),
+            })
+    return results
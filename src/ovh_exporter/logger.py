@@ -1,10 +1,77 @@
 """Logger configuration."""
+from __future__ import annotations
+
+import json
 import logging
+import os
+import reprlib
 
 log = logging.getLogger("ovh_exporter")
 
+# fetched payloads, written to files by PayloadFileHandler if enabled
+payload_log = logging.getLogger("ovh_exporter.payloads")
+payload_log.propagate = False
+payload_log.setLevel(logging.CRITICAL)
+
+
+def _summary_repr() -> reprlib.Repr:
+    """Size-capped repr of payloads."""
+    summary = reprlib.Repr()
+    summary.maxlevel = 3
+    summary.maxdict = 8
+    summary.maxlist = 4
+    summary.maxstring = 60
+    summary.maxother = 60
+    return summary
+
+
+_SUMMARY = _summary_repr()
+
+
+# pylint: disable=too-few-public-methods
+class _Summary:
+    """Payload formatted only if the log record is emitted."""
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __str__(self):
+        return _SUMMARY.repr(self.payload)
+
+
+class PayloadFileHandler(logging.Handler):
+    """Write the payload of each record to `directory`, one JSON file by
+    service and endpoint (last payload only)."""
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def emit(self, record: logging.LogRecord):
+        # attributes set by log_payload `extra`
+        extra = vars(record)
+        path = os.path.join(self.directory, f"{extra['service_id']}-{extra['endpoint']}.json")
+        try:
+            with open(f"{path}.tmp", "w", encoding="utf-8") as fstream:
+                json.dump(extra['payload'], fstream, indent=2, default=str)
+            os.replace(f"{path}.tmp", path)
+        except Exception: # noqa: BLE001
+            self.handleError(record)
+
+
+def log_payload(endpoint: str, service_id: str, payload):
+    """Log a fetched payload, size-capped, at debug level; dump it if enabled."""
+    log.debug("%s payload of %s: %s", endpoint, service_id, _Summary(payload))
+    if payload_log.isEnabledFor(logging.DEBUG):
+        payload_log.debug("%s payload of %s", endpoint, service_id,
+                          extra={"endpoint": endpoint, "service_id": service_id, "payload": payload})
+
 
-def init_logging(level: int = logging.WARN):
-    """Init logging configuration."""
+def init_logging(level: int = logging.WARN, payload_dir: str|None = None):
+    """Init logging configuration; fetched payloads are dumped to `payload_dir` if set."""
     logging.basicConfig()
     log.setLevel(level)
+    if payload_dir:
+        payload_log.addHandler(PayloadFileHandler(payload_dir))
+        payload_log.setLevel(logging.DEBUG)
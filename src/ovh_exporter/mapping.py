@@ -0,0 +1,249 @@
+"""Declarative mapping of API payloads to metric samples.
+
+A MetricSpec declares a metric by paths into an endpoint payload:
+
+- `rows`: dotted path of the rows, `*` iterating over a list (ex.
+  `hourlyUsage.instance.*.details.*`); empty for the payload itself;
+- `labels`: label name to path in the row; each `^` prefix reads the path in
+  an enclosing row instead (ex. `^region` for the group of a usage detail);
+- `value`: path of the sample value in the row;
+- `when`: path of a value that must be truthy for the row to be used.
+
+A path starting with `=` is a constant (ex. `=hourly`). Specs are compiled
+once into tables of accessor functions; specs that share endpoint, rows and
+labels are in the same table, so label values are read once per row and the
+label dict is shared by all samples of the row."""
+from __future__ import annotations
+
+import typing
+
+from prometheus_client.samples import Sample
+
+from ovh_exporter.logger import log
+from ovh_exporter.ovh_client import RESPONSE_FIELDS, Endpoint
+
+if typing.TYPE_CHECKING:
+    from ovh_exporter.config import MetricSpec
+
+# sample value conversions
+_TYPES: dict[str|None, typing.Callable|None] = {None: None, "int": int, "float": float}
+# errors of a path that does not match the payload
+_MISSING = (KeyError, IndexError, TypeError)
+
+Frame = typing.Tuple[typing.Any, ...]
+Getter = typing.Callable[[Frame], typing.Any]
+
+
+def _constant(value: str):
+    """Constant of a `=` path: int, float or string."""
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _keys(path: str) -> tuple[str|int, ...]:
+    """Keys of a dotted path; digits are list indexes."""
+    return tuple(int(i) if i.isdigit() else i for i in path.split(".") if i)
+
+
+def getter(path: str) -> Getter:
+    """Compile a value path into a function reading it from a row frame.
+
+    A frame holds the enclosing rows then the row itself. Missing keys raise
+    KeyError, IndexError or TypeError."""
+    if path.startswith("="):
+        constant = _constant(path[1:])
+        return lambda _frame: constant
+    depth = len(path) - len(path.lstrip("^"))
+    index = -1 - depth
+    keys = _keys(path[depth:])
+    if not keys:
+        return lambda frame: frame[index]
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda frame: frame[index][key]
+
+    def get(frame: Frame):
+        value = frame[index]
+        for key in keys:
+            value = value[key]
+        return value
+    return get
+
+
+def rows(path: str) -> typing.Callable[[typing.Any], typing.Iterator[Frame]]:
+    """Compile a rows path into a function yielding row frames of a payload.
+
+    Missing keys and non-list values at `*` yield no rows."""
+    steps = tuple(i for i in path.split(".") if i)
+    if steps == ("*",):
+        # most payloads are lists of rows
+        def iterate_list(payload):
+            if isinstance(payload, list):
+                for item in payload:
+                    yield (item,)
+        return iterate_list
+    ends_with_list = bool(steps) and steps[-1] == "*"
+
+    def iterate(payload):
+        # (enclosing rows, value) pairs, one level at a time
+        frames: list[tuple[Frame, typing.Any]] = [((), payload)]
+        for step in steps:
+            if step == "*":
+                frames = [
+                    ((*frame, item), item)
+                    for frame, value in frames if isinstance(value, list)
+                    for item in value]
+            else:
+                frames = [
+                    (frame, value[step])
+                    for frame, value in frames if isinstance(value, dict) and step in value]
+        return [frame if ends_with_list else (*frame, value) for frame, value in frames]
+    return iterate
+
+
+# pylint: disable=too-few-public-methods
+class _Sample:
+    """Compiled value of a spec."""
+
+    def __init__(self, spec: MetricSpec):
+        self.name = spec.name
+        self.value = getter(spec.value)
+        self.default = spec.default
+        self.convert = _TYPES[spec.value_type]
+
+    def finish(self, value):
+        """Default or converted value of a row; None if it must be skipped."""
+        if value is None:
+            if self.default is None:
+                log.warning("%s sample ignored as value is missing", self.name)
+            return self.default
+        if self.convert is not None:
+            try:
+                return self.convert(value)
+            except (TypeError, ValueError):
+                log.warning("%s sample ignored as value %r is invalid", self.name, value)
+                return None
+        return value
+
+
+class Table:
+    """Compiled specs sharing endpoint, rows and labels."""
+
+    def __init__(self, endpoint: Endpoint, rows_path: str, labels: typing.Mapping[str, str]):
+        self.name = f"{endpoint.name.lower()}:{rows_path}"
+        self.endpoint = endpoint
+        self.field = RESPONSE_FIELDS[endpoint]
+        self.labelnames = list(labels)
+        self._rows = rows(rows_path)
+        self._labels = [getter(i) for i in labels.values()]
+        # samples grouped by `when` path
+        self._groups: dict[str|None, tuple[Getter|None, list[_Sample]]] = {}
+
+    @property
+    def names(self) -> list[str]:
+        """Metric names of the table."""
+        return list(dict.fromkeys(i.name for _, samples in self._groups.values() for i in samples))
+
+    def add(self, spec: MetricSpec):
+        """Add a spec to the table."""
+        if spec.when not in self._groups:
+            self._groups[spec.when] = (getter(spec.when) if spec.when else None, [])
+        self._groups[spec.when][1].append(_Sample(spec))
+
+    def collect(self, samples_by_name: typing.Mapping[str, list[Sample]], prefix: dict[str, str], payload):
+        """Append samples of a payload to lists by metric name; `prefix` holds leading labels."""
+        labelnames = self.labelnames
+        getters = self._labels
+        groups = [
+            (when, [(samples_by_name[i.name].append, i.name, i.value, i.convert is None, i) for i in samples])
+            for when, samples in self._groups.values()]
+        for frame in self._rows(payload):
+            labels = prefix.copy()
+            labels.update(zip(labelnames, [get(frame) for get in getters]))
+            for when, samples in groups:
+                if when is not None:
+                    try:
+                        if not when(frame):
+                            continue
+                    except _MISSING:
+                        continue
+                for append, name, read, raw, sample in samples:
+                    try:
+                        value = read(frame)
+                    except _MISSING:
+                        value = None
+                    if value is None or not raw:
+                        value = sample.finish(value)
+                        if value is None:
+                            continue
+                    append(Sample(name, labels, value))
+
+
+def _add_field(tree: dict, keys: typing.Sequence[str], *, whole: bool = True):
+    """Add the path of a needed value to a field tree; only its path is kept
+    unless `whole`."""
+    for index, key in enumerate(keys):
+        if key in tree and tree[key] is None:
+            # whole value already kept
+            return
+        if whole and index == len(keys) - 1:
+            tree[key] = None
+        else:
+            tree = tree.setdefault(key, {})
+
+
+def fields(specs: typing.Iterable[MetricSpec]) -> dict[Endpoint, dict|None]:
+    """Field trees (see ovh_exporter.streaming) of the payload values read by specs.
+
+    Usage `lastUpdate` is always kept, as collector uses it to detect
+    unchanged payloads."""
+    trees: dict[Endpoint, dict] = {}
+    whole: set[Endpoint] = set()
+    for spec in specs:
+        endpoint = Endpoint[spec.endpoint.upper()]
+        tree = trees.setdefault(endpoint, {"lastUpdate": None} if endpoint is Endpoint.USAGE else {})
+        steps = [i for i in spec.rows.split(".") if i]
+        _add_field(tree, steps, whole=False)
+        # path of each frame item: enclosing rows then the row
+        anchors = [steps[:i + 1] for i, step in enumerate(steps) if step == "*"]
+        if not steps or steps[-1] != "*":
+            anchors.append(steps)
+        for path in (*spec.labels.values(), spec.value, spec.when):
+            if not path or path.startswith("="):
+                continue
+            depth = len(path) - len(path.lstrip("^"))
+            keys = [*anchors[-1 - depth], *("*" if isinstance(i, int) else i for i in _keys(path[depth:]))]
+            if not keys:
+                whole.add(endpoint)
+            _add_field(tree, keys)
+    return {endpoint: None if endpoint in whole else tree for endpoint, tree in trees.items()}
+
+
+def label_keys(specs: typing.Iterable[MetricSpec]) -> frozenset[str]:
+    """Payload keys of the label values read by specs (see ovh_client.intern_strings)."""
+    keys = set()
+    for spec in specs:
+        for path in spec.labels.values():
+            if path.startswith("="):
+                continue
+            last = _keys(path.lstrip("^"))[-1:]
+            if last and isinstance(last[0], str):
+                keys.add(last[0])
+    return frozenset(keys)
+
+
+def compile_specs(specs: typing.Iterable[MetricSpec]) -> list[Table]:
+    """Compile specs into tables, in order of first use."""
+    tables: dict[tuple, Table] = {}
+    for spec in specs:
+        endpoint = Endpoint[spec.endpoint.upper()]
+        key = (endpoint, spec.rows, tuple(spec.labels.items()))
+        if key not in tables:
+            tables[key] = Table(endpoint, spec.rows, spec.labels)
+        tables[key].add(spec)
+    return list(tables.values())
+
@@ -1,15 +1,69 @@
 """OVH API client."""
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+import hashlib
+import json
+import keyword
+import re
+import sys
+import threading
+import time
+import typing
+import urllib.parse
+from enum import Enum
+
 import ovh
+import requests.adapters
 
+from ovh_exporter import streaming
+from ovh_exporter.breaker import CircuitBreaker, CircuitBreakers
 from ovh_exporter.config import OvhAccount
-from ovh_exporter.logger import log
+from ovh_exporter.logger import log, log_payload
+from ovh_exporter.ratelimit import Backoff, TokenBucket, retry_delay
+from ovh_exporter.telemetry import (
+    API_REQUEST_DURATION,
+    API_RESPONSE_SIZE,
+    API_RETRIES,
+    CACHE_LOOKUPS,
+)
+
+
+class Endpoint(Enum):
+    """API Enpoints."""
+
+    PROJECT = "/cloud/project/{service_id}"
+    QUOTA = "/cloud/project/{service_id}/quota"
+    INSTANCE = "/cloud/project/{service_id}/instance"
+    STORAGE = "/cloud/project/{service_id}/storage"
+    USAGE = "/cloud/project/{service_id}/usage/current"
+    VOLUME = "/cloud/project/{service_id}/volume"
+
+    def __init__(self, url):
+        self.url = url
+        self.pattern = re.compile("^" + re.escape(url).replace(r"\{service_id\}", "[^/]+") + "$")
+
+    @staticmethod
+    def label(path: str) -> str:
+        """Metric label of an API path (`other` if not an endpoint)."""
+        path = path.split("?", 1)[0]
+        for endpoint in Endpoint:
+            if endpoint.pattern.match(path):
+                return endpoint.name.lower()
+        return "other"
 
 
 class OvhApiResponse:
-    """API fetch result."""
+    """API fetch result.
+
+    Fields of endpoints that were not fetched are None."""
 
     # pylint: disable=too-many-arguments
-    def __init__(self, projects, instances, storages, volumes, quotas, usage):
+    def __init__(self, projects=None, instances=None, storages=None,
+                 volumes=None, quotas=None, usage=None):
         self.projects = projects
         self.instances = instances
         self.storages = storages
@@ -17,40 +71,661 @@ class OvhApiResponse:
         self.quotas = quotas
         self.usage = usage
 
+    def merge(self, previous: OvhApiResponse) -> OvhApiResponse:
+        """Fill missing fields with `previous` ones."""
+        return OvhApiResponse(
+            projects=self.projects if self.projects is not None else previous.projects,
+            instances=self.instances if self.instances is not None else previous.instances,
+            storages=self.storages if self.storages is not None else previous.storages,
+            volumes=self.volumes if self.volumes is not None else previous.volumes,
+            quotas=self.quotas if self.quotas is not None else previous.quotas,
+            usage=self.usage if self.usage is not None else previous.usage,
+        )
+
+
+# OvhApiResponse field by endpoint
+RESPONSE_FIELDS = {
+    Endpoint.PROJECT: "projects",
+    Endpoint.QUOTA: "quotas",
+    Endpoint.INSTANCE: "instances",
+    Endpoint.STORAGE: "storages",
+    Endpoint.USAGE: "usage",
+    Endpoint.VOLUME: "volumes",
+}
+
+
+def digest(payload) -> bytes:
+    """Content hash of a payload."""
+    encoded = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=16).digest()
+
+
+# Default cache time-to-live in seconds by endpoint.
+DEFAULT_TTLS = {
+    Endpoint.PROJECT: 3600,
+    Endpoint.QUOTA: 3600,
+    Endpoint.INSTANCE: 300,
+    Endpoint.STORAGE: 300,
+    Endpoint.USAGE: 1800,
+    Endpoint.VOLUME: 300,
+}
+
+
+# pylint: disable=too-few-public-methods
+class CacheEntry:
+    """Cached endpoint payload, with its content hash."""
+
+    def __init__(self, payload, fetched_at: float, payload_digest: bytes|None = None):
+        self.payload = payload
+        self.fetched_at = fetched_at
+        self.digest = payload_digest
+        self.refreshing = False
+
+
+class EndpointCache:
+    """Payload cache keyed by (account, endpoint, service_id).
+
+    Expired entries are still served while they are refreshed in background
+    (stale-while-revalidate). `on_update` is called when a background
+    refresh stores a new payload."""
+
+    def __init__(
+            self,
+            ttls: typing.Mapping[Endpoint, float]|None = None,
+            on_update: typing.Callable[[], None]|None = None):
+        self._ttls: dict[Endpoint, float] = dict(DEFAULT_TTLS)
+        self._ttls.update(ttls or {})
+        self._entries: dict[tuple[str, Endpoint, str], CacheEntry] = {}
+        self._lock = threading.Lock()
+        self.on_update = on_update
+
+    def entry(self, account: str, endpoint: Endpoint, service_id: str) -> CacheEntry|None:
+        """Cached entry, fresh or not; None if missing."""
+        with self._lock:
+            return self._entries.get((account, endpoint, service_id), None)
+
+    def age(self, account: str, endpoint: Endpoint, service_id: str) -> float|None:
+        """Seconds since last successful fetch; None if never fetched."""
+        entry = self.entry(account, endpoint, service_id)
+        return None if entry is None else time.monotonic() - entry.fetched_at
+
+    def is_stale(self, endpoint: Endpoint, entry: CacheEntry) -> bool:
+        """Check if entry is older than endpoint time-to-live."""
+        return time.monotonic() - entry.fetched_at >= self._ttls[endpoint]
+
+    def store(self, account: str, endpoint: Endpoint, service_id: str, payload):
+        """Store a freshly fetched payload."""
+        entry = CacheEntry(payload, time.monotonic(), digest(payload))
+        with self._lock:
+            self._entries[(account, endpoint, service_id)] = entry
+
+    def store_late(
+            self,
+            account: str,
+            endpoint: Endpoint,
+            service_id: str,
+            future: concurrent.futures.Future|asyncio.Future):
+        """Store the result of a call completed after its deadline."""
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            log.warning("Late fetch failed for service %s (%s)", service_id, endpoint.url)
+            return
+        self.store(account, endpoint, service_id, future.result())
+        if self.on_update is not None:
+            self.on_update()
+
+    def retain(self, account: str, service_ids: typing.Collection[str]):
+        """Drop entries of services no longer configured for account."""
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == account and key[2] not in service_ids:
+                    del self._entries[key]
+
+    def claim(self, account: str, endpoint: Endpoint, service_id: str) -> CacheEntry|None:
+        """Flag an entry as being refreshed; None if missing or already flagged."""
+        with self._lock:
+            entry = self._entries.get((account, endpoint, service_id), None)
+            if entry is None or entry.refreshing:
+                return None
+            entry.refreshing = True
+            return entry
+
+    # pylint: disable=too-many-arguments
+    def revalidate(
+            self,
+            account: str,
+            endpoint: Endpoint,
+            service_id: str,
+            load: typing.Callable[[], object],
+            executor: concurrent.futures.Executor):
+        """Refresh an entry in background unless a refresh is already running."""
+        entry = self.claim(account, endpoint, service_id)
+        if entry is None:
+            return
+
+        def _revalidate():
+            try:
+                payload = load()
+            except Exception: # noqa: BLE001
+                log.exception("Background refresh failed for service %s (%s)", service_id, endpoint.url)
+                entry.refreshing = False
+                return
+            self.store(account, endpoint, service_id, payload)
+            if self.on_update is not None:
+                self.on_update()
+
+        executor.submit(_revalidate)
+
+
+class InstrumentedClient(ovh.Client):
+    """OVH client recording request duration and payload size.
+
+    Calls are rate limited by `limiter` if provided, and throttled (429),
+    server error (5xx) or network failures are retried following `backoff`.
+    The limiter is deferred when API asks to retry later, so that calls
+    sharing it slow down too.
+
+    Payload keys and values of `label_keys` are interned (see intern_strings)."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+            self,
+            *args,
+            limiter: TokenBucket|None = None,
+            backoff: Backoff|None = None,
+            label_keys: typing.AbstractSet[str] = frozenset(),
+            **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+        self.backoff = backoff
+        self.label_keys = label_keys
+
+    def call(self, method, path, *args, **kwargs):
+        """Rate-limited ovh.Client.call, with retries."""
+        call = functools.partial(super().call, method, path, *args, **kwargs)
+        return self._retrying(method, path, lambda: intern_strings(call(), self.label_keys))
+
+    def get_fields(self, path: str, fields: streaming.Fields):
+        """Rate-limited GET call, with retries, whose response body is decoded
+        while downloaded, keeping only `fields` (requires ijson)."""
+        return self._retrying("GET", path, functools.partial(self._stream, path, fields))
+
+    def _retrying(self, method: str, path: str, call: typing.Callable[[], typing.Any]):
+        """Rate-limited `call`, retried following `backoff`."""
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                return call()
+            except ovh.exceptions.APIError as error:
+                retry = self._retry(error, attempt)
+                if retry is None:
+                    raise
+                reason, delay = retry
+                API_RETRIES.labels(Endpoint.label(path), reason).inc()
+                log.info("Retrying %s %s in %.2fs (%s)", method, path, delay, reason)
+                time.sleep(delay)
+                attempt += 1
+
+    def _stream(self, path: str, fields: streaming.Fields):
+        """GET call with a streamed response body (see ovh.Client.call)."""
+        # clients are not shared between threads (see ClientPool)
+        self._session.stream = True
+        try:
+            response = self.raw_call("GET", path)
+        except requests.RequestException as error:
+            raise ovh.exceptions.HTTPError("Low HTTP request failed error", error) from error
+        finally:
+            self._session.stream = False
+        with response:
+            if not 200 <= response.status_code < 300: # noqa: PLR2004
+                try:
+                    message = response.json().get("message", None)
+                except (AttributeError, ValueError):
+                    message = None
+                raise ovh.exceptions.APIError(message or f"HTTP {response.status_code}", response=response)
+            response.raw.decode_content = True
+            body = _CountingReader(response.raw)
+            try:
+                payload = streaming.load(body, fields, self.label_keys)
+            except (ValueError, requests.RequestException) as error:
+                raise ovh.exceptions.InvalidResponse("Failed to decode API response", error) from error
+            finally:
+                API_RESPONSE_SIZE.labels(Endpoint.label(path)).observe(body.size)
+        return payload
+
+    def _retry(self, error: ovh.exceptions.APIError, attempt: int) -> tuple[str, float]|None:
+        """Retry reason and delay, None if error must not be retried."""
+        if isinstance(error, (ovh.exceptions.HTTPError, ovh.exceptions.NetworkError)):
+            return retry_delay(self.backoff, self.limiter, attempt, None)
+        if error.response is None:
+            return None
+        return retry_delay(self.backoff, self.limiter, attempt, error.response.status_code,
+                           error.response.headers.get("Retry-After", None))
+
+    def raw_call(self, method, path, *args, **kwargs):
+        """Instrumented ovh.Client.raw_call."""
+        endpoint = Endpoint.label(path)
+        started = time.monotonic()
+        try:
+            response = super().raw_call(method, path, *args, **kwargs)
+        except Exception:
+            API_REQUEST_DURATION.labels(endpoint, "error").observe(time.monotonic() - started)
+            raise
+        API_REQUEST_DURATION.labels(endpoint, str(response.status_code)).observe(
+            time.monotonic() - started)
+        if not self._session.stream:
+            # streamed bodies are measured while read
+            API_RESPONSE_SIZE.labels(endpoint).observe(len(response.content))
+        return response
+
+
+class _CountingReader:
+    """File-like body counting bytes read."""
+
+    def __init__(self, raw: typing.BinaryIO):
+        self._raw = raw
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        """Read at most `size` bytes."""
+        data = self._raw.read(size)
+        self.size += len(data)
+        return data
+
+
+_LIMITERS: dict[tuple[str, str, str|None], TokenBucket] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def with_query(path: str, kwargs: typing.Mapping[str, object]) -> str:
+    """API path with keyword arguments as query string, built like ovh.Client.get."""
+    arguments = {}
+    for key, value in kwargs.items():
+        if key[0] == "_" and key[1:] in keyword.kwlist:
+            key = key[1:] # noqa: PLW2901
+        if isinstance(value, bool):
+            value = str(value).lower() # noqa: PLW2901
+        elif value is None:
+            value = "null" # noqa: PLW2901
+        arguments[key] = value
+    query_string = urllib.parse.urlencode(arguments)
+    if not query_string:
+        return path
+    return f"{path}{'&' if '?' in path else '?'}{query_string}"
+
+
+def intern_strings(value, label_keys: typing.AbstractSet[str] = frozenset(), _label: bool = False):
+    """Decoded JSON with keys, and string values of `label_keys`, interned.
 
-def build_client(config: OvhAccount):
-    """Build a client from a Configuration."""
-    return ovh.Client(
+    Label values repeated across rows and fetches (regions, flavors, types...)
+    are then shared by the refresher payloads and cache. Other values (ids,
+    names, dates...) are not: interned strings are never freed, and these
+    keep changing over the process lifetime. Pickle writes a shared object
+    once, so strings are still shared within a snapshot loaded by a worker,
+    but not across snapshots or with collector label values."""
+    if isinstance(value, str):
+        return sys.intern(value) if _label else value
+    if isinstance(value, list):
+        return [intern_strings(i, label_keys, _label) for i in value]
+    if isinstance(value, dict):
+        return {sys.intern(k): intern_strings(v, label_keys, k in label_keys) for k, v in value.items()}
+    return value
+
+
+def limiter_for(config: OvhAccount) -> TokenBucket:
+    """Rate limiter of an account, shared by all its clients."""
+    key = (config.endpoint_url or config.endpoint, config.application_key, config.consumer_key)
+    with _LIMITERS_LOCK:
+        if key not in _LIMITERS:
+            _LIMITERS[key] = TokenBucket(config.rate_limit.rate, config.rate_limit.burst, config.name)
+        return _LIMITERS[key]
+
+
+def build_client(config: OvhAccount, label_keys: typing.AbstractSet[str] = frozenset()):
+    """Build a client from a Configuration, interning values of `label_keys`."""
+    rate_limit = config.rate_limit
+    client = InstrumentedClient(
         config.endpoint,
         config.application_key,
         config.application_secret,
         config.consumer_key,
+        limiter=limiter_for(config),
+        backoff=Backoff(rate_limit.max_retries, rate_limit.backoff, rate_limit.max_backoff),
+        label_keys=label_keys,
     )
+    if config.endpoint_url:
+        # ovh.Client only knows predefined endpoints
+        client._endpoint = config.endpoint_url # noqa: SLF001 # pylint: disable=protected-access
+    return client
+
+
+class ClientPool:
+    """At most `size` clients, built by `factory` on first use.
+
+    requests.Session is not guaranteed to be thread-safe; a client is only
+    used by one caller at a time, other callers wait for a free client. Each
+    client has its own keep-alive connection to the API, so that any number
+    of threads reuse at most `size` connections. The `/auth/time` delta is
+    fetched once and shared by all clients.
+
+    Payloads of endpoints in `fields` only keep these fields; their response
+    bodies are streamed if ijson is installed (see ovh_exporter.streaming)."""
+
+    def __init__(
+            self,
+            factory: typing.Callable[[], ovh.Client],
+            size: int = 1,
+            fields: typing.Mapping[Endpoint, streaming.Fields]|None = None):
+        self._factory = factory
+        self._fields = {endpoint.name.lower(): tree for endpoint, tree in (fields or {}).items()}
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle: list[ovh.Client] = []
+        self._time_delta: int|None = None
+
+    def _build(self) -> ovh.Client:
+        client = self._factory()
+        # a single keep-alive connection per client
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        client._session.mount("https://", adapter) # noqa: SLF001 # pylint: disable=protected-access
+        client._session.mount("http://", adapter) # noqa: SLF001 # pylint: disable=protected-access
+        with self._lock:
+            if self._time_delta is None:
+                self._time_delta = client.time_delta
+            else:
+                client._time_delta = self._time_delta # noqa: SLF001 # pylint: disable=protected-access
+        return client
+
+    @contextlib.contextmanager
+    def client(self) -> typing.Iterator[ovh.Client]:
+        """Borrow a client, waiting for one if `size` clients are in use."""
+        with self._slots:
+            with self._lock:
+                client = self._idle.pop() if self._idle else None
+            if client is None:
+                # all clients are in use by other callers
+                client = self._build()
+            try:
+                yield client
+            finally:
+                with self._lock:
+                    self._idle.append(client)
+
+    def get(self, path: str, **kwargs):
+        """GET call with a borrowed client; keyword arguments are sent as
+        query string, so that payloads with query parameters are streamed too."""
+        endpoint = Endpoint.label(path)
+        path = with_query(path, kwargs)
+        with self.client() as client:
+            if endpoint not in self._fields:
+                return client.get(path)
+            if streaming.AVAILABLE:
+                return client.get_fields(path, self._fields[endpoint])
+            return streaming.prune(client.get(path), self._fields[endpoint])
+
+
+def build_pool(
+        config: OvhAccount,
+        size: int,
+        fields: typing.Mapping[Endpoint, streaming.Fields]|None = None,
+        label_keys: typing.AbstractSet[str] = frozenset()) -> ClientPool:
+    """Build a pool of at most `size` clients, one per concurrent caller."""
+    return ClientPool(functools.partial(build_client, config, label_keys), size, fields)
+
+
+class _Flight:
+    """In-flight call shared by concurrent callers."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException|None = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key.
+
+    While a call is in flight, other callers with the same key wait for it
+    and get its result (or exception) instead of issuing their own call."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: dict[typing.Hashable, _Flight] = {}
+
+    def do(self, key: typing.Hashable, func: typing.Callable[[], typing.Any]):
+        """Call `func`, or wait for the in-flight call with the same key."""
+        with self._lock:
+            current = self._flights.get(key, None)
+            if current is None:
+                flight = self._flights[key] = _Flight()
+        if current is not None:
+            current.done.wait()
+            if current.error is not None:
+                raise current.error
+            return current.result
+        try:
+            flight.result = func()
+            return flight.result
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+_FLIGHTS = SingleFlight()
+
+
+def fetch(
+        client: ovh.Client,
+        service_id: str,
+        endpoints: typing.Collection[Endpoint]|None = None) -> OvhApiResponse:
+    """Fetch endpoints of a service, one after another.
+
+    All endpoints are fetched if `endpoints` is None. Concurrent fetches of
+    the same service and endpoints share a single set of API calls."""
+    key = (client, service_id, frozenset(endpoints) if endpoints is not None else None)
+    response: OvhApiResponse = _FLIGHTS.do(key, functools.partial(_fetch, client, service_id, endpoints))
+    return response
 
 
-def fetch(client: ovh.Client, service_id: str) -> OvhApiResponse:
-    """Test OVH API calls."""
-    projects = _project(client, service_id)
-    instances = _instances(client, service_id)
-    volumes = _volumes(client, service_id)
-    storages = _storages(client, service_id)
-    quotas = _quota(client, service_id)
-    usage = _usage(client, service_id)
+def _fetch(
+        client: ovh.Client,
+        service_id: str,
+        endpoints: typing.Collection[Endpoint]|None) -> OvhApiResponse:
+    """Fetch endpoints of a service (uncoalesced)."""
+    payloads = {
+        endpoint: fetcher(client, service_id)
+        for endpoint, fetcher in _fetchers(endpoints)
+    }
+    return build_response(payloads)
+
+
+# pylint: disable=too-many-arguments
+def fetch_all(
+        client: ovh.Client,
+        service_ids: list[str],
+        executor: concurrent.futures.Executor,
+        endpoints: typing.Collection[Endpoint]|None = None,
+        cache: EndpointCache|None = None,
+        account: str = "default",
+        timeout: float|None = None,
+        breakers: CircuitBreakers|None = None) -> tuple[dict[str, OvhApiResponse], set[str]]:
+    """Fetch endpoints of all services; concurrency is bounded by `executor`.
+
+    All endpoints are fetched if `endpoints` is None. If a `cache` is
+    provided, cached payloads are used and stale ones are refreshed in
+    background. If `breakers` are provided, calls of an open breaker are
+    skipped (cached payload, if any, is still used).
+
+    Calls not completed within `timeout` seconds are not waited for (their
+    result is stored in cache when they complete). Return a partial response
+    for each service and the set of services with a failed or unfinished
+    call."""
+    def revalidate(endpoint: Endpoint, service_id: str, breaker: CircuitBreaker|None):
+        if cache is None:
+            return
+        load = functools.partial(_fetch_endpoint, client, account, endpoint, service_id)
+        cache.revalidate(account, endpoint, service_id, _guarded(breaker, load), executor)
+
+    payloads, incomplete, calls = lookup(
+        service_ids, [i for i, _ in _fetchers(endpoints)], cache, account, breakers, revalidate)
+    futures = {
+        executor.submit(_fetch_endpoint, client, account, endpoint, service_id): (service_id, endpoint, breaker)
+        for service_id, endpoint, breaker in calls
+    }
+    done, not_done = concurrent.futures.wait(futures, timeout=timeout)
+    record_results(futures, done, not_done, payloads, incomplete, cache, account)
+    responses = {
+        service_id: build_response(service_payloads)
+        for service_id, service_payloads in payloads.items()
+    }
+    return responses, incomplete
+
+
+def _fetch_endpoint(client: ovh.Client, account: str, endpoint: Endpoint, service_id: str):
+    """Fetch an endpoint of a service.
+
+    Concurrent calls for the same account, endpoint and service, ex. a call
+    still running after the refresh timeout and the call of the next
+    refresh, share a single API call."""
+    return _FLIGHTS.do(
+        (account, endpoint, service_id), functools.partial(_FETCHERS[endpoint], client, service_id))
+
+
+_Call = typing.Tuple[str, Endpoint, typing.Optional[CircuitBreaker]]
+
+
+# pylint: disable=too-many-arguments
+def lookup(
+        service_ids: list[str],
+        endpoints: typing.Iterable[Endpoint],
+        cache: EndpointCache|None,
+        account: str,
+        breakers: CircuitBreakers|None,
+        revalidate: typing.Callable[[Endpoint, str, CircuitBreaker|None], None],
+) -> tuple[dict[str, dict[Endpoint, object]], set[str], list[_Call]]:
+    """Plan a fetch of all services.
+
+    Return cached payloads, services skipped by an open breaker, and the
+    (service_id, endpoint, breaker) calls to perform; `revalidate` is called
+    for stale cached payloads."""
+    endpoints = list(endpoints)
+    payloads: dict[str, dict[Endpoint, object]] = {i: {} for i in service_ids}
+    incomplete = set()
+    calls = []
+    if cache is not None:
+        cache.retain(account, service_ids)
+    for service_id in service_ids:
+        for endpoint in endpoints:
+            breaker = None
+            if breakers is not None:
+                breaker = breakers.get(account, service_id, endpoint.name.lower())
+            if cache is not None:
+                entry = cache.entry(account, endpoint, service_id)
+                if entry is None:
+                    CACHE_LOOKUPS.labels(endpoint.name.lower(), "miss").inc()
+                else:
+                    payloads[service_id][endpoint] = entry.payload
+                    if cache.is_stale(endpoint, entry):
+                        CACHE_LOOKUPS.labels(endpoint.name.lower(), "stale").inc()
+                        if breaker is not None and not breaker.allow():
+                            incomplete.add(service_id)
+                            continue
+                        revalidate(endpoint, service_id, breaker)
+                    else:
+                        CACHE_LOOKUPS.labels(endpoint.name.lower(), "hit").inc()
+                    continue
+            if breaker is not None and not breaker.allow():
+                incomplete.add(service_id)
+                continue
+            calls.append((service_id, endpoint, breaker))
+    return payloads, incomplete, calls
+
+
+# pylint: disable=too-many-arguments
+def record_results(
+        futures: typing.Mapping[typing.Any, _Call],
+        done: typing.Iterable,
+        not_done: typing.Iterable,
+        payloads: dict[str, dict[Endpoint, object]],
+        incomplete: set[str],
+        cache: EndpointCache|None,
+        account: str):
+    """Record completed calls in payloads, cache and breakers; flag failed
+    and unfinished ones. Futures are concurrent or asyncio ones."""
+    for future in done:
+        service_id, endpoint, breaker = futures[future]
+        try:
+            payloads[service_id][endpoint] = future.result()
+        except Exception: # noqa: BLE001
+            if service_id not in incomplete:
+                log.exception("Fetch failed for service %s (%s)", service_id, endpoint.url)
+            incomplete.add(service_id)
+            if breaker is not None:
+                breaker.failure()
+            continue
+        if breaker is not None:
+            breaker.success()
+        if cache is not None:
+            cache.store(account, endpoint, service_id, payloads[service_id][endpoint])
+    for future in not_done:
+        service_id, endpoint, breaker = futures[future]
+        log.warning("Fetch not finished in time for service %s (%s)", service_id, endpoint.url)
+        incomplete.add(service_id)
+        if breaker is not None:
+            breaker.failure()
+        if cache is not None:
+            future.add_done_callback(
+                functools.partial(cache.store_late, account, endpoint, service_id))
+
+
+def _guarded(breaker: CircuitBreaker|None, load: typing.Callable[[], object]) -> typing.Callable[[], object]:
+    """Record outcome of `load` in `breaker`."""
+    if breaker is None:
+        return load
+
+    def _load():
+        try:
+            payload = load()
+        except Exception:
+            breaker.failure()
+            raise
+        breaker.success()
+        return payload
+    return _load
+
+
+def build_response(payloads: typing.Mapping[Endpoint, object]) -> OvhApiResponse:
+    """Build an OvhApiResponse from endpoint payloads."""
     return OvhApiResponse(
-        projects=projects,
-        instances=instances,
-        quotas=quotas,
-        storages=storages,
-        volumes=volumes,
-        usage=usage,
+        projects=payloads.get(Endpoint.PROJECT, None),
+        instances=payloads.get(Endpoint.INSTANCE, None),
+        quotas=payloads.get(Endpoint.QUOTA, None),
+        storages=payloads.get(Endpoint.STORAGE, None),
+        volumes=payloads.get(Endpoint.VOLUME, None),
+        usage=payloads.get(Endpoint.USAGE, None),
     )
 
 
+def _fetchers(endpoints: typing.Collection[Endpoint]|None):
+    """Fetch functions for selected endpoints."""
+    return [
+        (endpoint, fetcher)
+        for endpoint, fetcher in _FETCHERS.items()
+        if endpoints is None or endpoint in endpoints
+    ]
+
+
 def _project(client: ovh.Client, service_id: str):
     """Fetch project information."""
     proj = client.get(f"/cloud/project/{service_id}")
-    # pylint: disable=W1203:logging-fstring-interpolation
-    log.debug(f"/cloud/project/{service_id}: {proj}")
+    log_payload("project", service_id, proj)
     return proj
 
 
@@ -87,8 +762,7 @@ def _quota(client: ovh.Client, service_id: str):
     keymanager.usedSecrets
     """
     quota = client.get(f"/cloud/project/{service_id}/quota")
-    # pylint: disable=W1203:logging-fstring-interpolation
-    log.debug(f"/cloud/project/{service_id}/quota: {quota}")
+    log_payload("quota", service_id, quota)
     return quota
 
 
@@ -104,8 +778,7 @@ def _storages(client: ovh.Client, service_id: str):
     storedObjects
     """
     storages = client.get(f"/cloud/project/{service_id}/storage", includeType=True)
-    # pylint: disable=W1203:logging-fstring-interpolation
-    log.debug(f"/cloud/project/{service_id}/storage: {storages}")
+    log_payload("storage", service_id, storages)
     return storages
 
 
@@ -158,8 +831,7 @@ def _usage(client: ovh.Client, service_id: str):
     lastUpdate
     """
     usage = client.get(f"/cloud/project/{service_id}/usage/current")
-    # pylint: disable=W1203:logging-fstring-interpolation
-    log.debug(f"/cloud/project/{service_id}/usage/current: {usage}")
+    log_payload("usage", service_id, usage)
     return usage
 
 
@@ -178,32 +850,22 @@ def _volumes(client: ovh.Client, service_id: str):
     [].type: classic, high-speed-gen2
     """
     volumes = client.get(f"/cloud/project/{service_id}/volume")
-    # pylint: disable=W1203:logging-fstring-interpolation
-    log.debug(f"/cloud/project/{service_id}/volume: {volumes}")
+    log_payload("volume", service_id, volumes)
     return volumes
 
 
 def _instances(client: ovh.Client, service_id: str):
     """Fetch instances information."""
     instances = client.get(f"/cloud/project/{service_id}/instance")
-    # pylint: disable=W1203:logging-fstring-interpolation
-    log.debug(f"/cloud/project/{service_id}/instance: {instances}")
-    log.info("instances: %s", [_instance(i) for i in instances])
+    log_payload("instance", service_id, instances)
     return instances
 
 
-def _instance(instance):
-    """Map instance information."""
-    # ex: s1-2.monthly.postpaid
-    plan = instance["planCode"].split(".")
-    flavor = plan[0]  # s1.2
-    billing = plan[1]  # monthly / hourly / consumption
-    if billing not in ("monthly", "hourly", "consumption"):
-        log.warning("Unexpected value for billing: %s / %s", billing, instance)
-    return {
-        "id": instance["id"],
-        "name": instance["name"],
-        "flavor": flavor,
-        "billing": billing,
-        "region": instance["region"],
-    }
+_FETCHERS = {
+    Endpoint.PROJECT: _project,
+    Endpoint.INSTANCE: _instances,
+    Endpoint.VOLUME: _volumes,
+    Endpoint.STORAGE: _storages,
+    Endpoint.QUOTA: _quota,
+    Endpoint.USAGE: _usage,
+}
@@ -0,0 +1,122 @@
+"""API call rate limiting and retry backoff."""
+from __future__ import annotations
+
+import email.utils
+import random
+import threading
+import time
+import typing
+
+from ovh_exporter.telemetry import API_RATE_LIMIT, API_RATE_LIMIT_WAIT
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    Each call reserves a token, possibly in the future, then sleeps until it
+    is available, so that waiting callers are served in order. `defer` stops
+    token refill for a while, ex. when API asks to retry later."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, rate: float, burst: int, name: str = "default",
+                 clock: typing.Callable[[], float] = time.monotonic,
+                 sleep: typing.Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.name = name
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+        API_RATE_LIMIT.labels(name).set(rate)
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def reserve(self) -> float:
+        """Take a token; return delay in seconds before using it."""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._tokens -= 1
+            wait = max(0.0, self._updated - now) + max(0.0, -self._tokens) / self.rate
+        if wait > 0:
+            API_RATE_LIMIT_WAIT.labels(self.name).inc(wait)
+        return wait
+
+    def acquire(self) -> float:
+        """Take a token, sleeping until available; return time waited in seconds."""
+        wait = self.reserve()
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def defer(self, delay: float):
+        """Do not hand out tokens for `delay` seconds."""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            self._updated = max(self._updated, now + delay)
+
+
+# pylint: disable=too-few-public-methods
+class Backoff:
+    """Jittered exponential backoff ("full jitter")."""
+
+    def __init__(self, max_retries: int, base: float, cap: float, rng: random.Random|None = None):
+        self.max_retries = max_retries
+        self.base = base
+        self.cap = cap
+        self._rng = rng or random.Random() # noqa: S311
+
+    def delay(self, attempt: int) -> float:
+        """Delay before retry number `attempt` (starting at 0)."""
+        return self._rng.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+def retry_delay(
+        backoff: Backoff|None,
+        limiter: TokenBucket|None,
+        attempt: int,
+        status: int|None,
+        retry_after_header: str|None = None) -> tuple[str, float]|None:
+    """Reason and delay before retrying a failed call; None if it must not be retried.
+
+    `status` is None for network failures. Throttled calls defer `limiter`."""
+    if backoff is None or attempt >= backoff.max_retries:
+        return None
+    if status is None:
+        return "network", backoff.delay(attempt)
+    if status == 429: # noqa: PLR2004
+        delay = retry_after(retry_after_header)
+        if delay is None:
+            delay = backoff.delay(attempt)
+        elif delay > backoff.cap:
+            return None
+        else:
+            delay += backoff.delay(0)
+        if limiter is not None:
+            limiter.defer(delay)
+        return "throttled", delay
+    if status >= 500: # noqa: PLR2004
+        return "server_error", backoff.delay(attempt)
+    return None
+
+
+def retry_after(value: str|None) -> float|None:
+    """Parse a Retry-After header (delay in seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
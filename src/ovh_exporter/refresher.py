@@ -0,0 +1,308 @@
+"""Background refresh of OVH API data."""
+from __future__ import annotations
+
+import concurrent.futures
+import os
+import threading
+import time
+import typing
+
+from ovh_exporter import ovh_client
+from ovh_exporter.logger import log
+from ovh_exporter.telemetry import API_REGISTRY
+
+if typing.TYPE_CHECKING:
+    import ovh
+    from prometheus_client import Metric
+
+    from ovh_exporter.breaker import CircuitBreakers
+    from ovh_exporter.config import Service
+    from ovh_exporter.discovery import ProjectDiscovery
+    from ovh_exporter.ovh_client import Endpoint, OvhApiResponse
+
+
+# pylint: disable=too-few-public-methods
+class Snapshot:
+    """Immutable view of the last fetched API responses.
+
+    `generation` is incremented each time a new snapshot is published.
+    `stale` holds services whose last refresh failed or did not finish in
+    time; their responses are (partly) the previous ones. `ages` holds, by
+    service and endpoint label, the age in seconds of the data at publication
+    time, and `digests` the content hash of its payload (see
+    ovh_client.digest). `telemetry` holds the refresher self-metrics at
+    publication time. `services` holds the services of the snapshot when they
+    are discovered (None: configured services)."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+            self,
+            generation: int,
+            timestamp: float,
+            responses: typing.Mapping[str, OvhApiResponse],
+            stale: frozenset[str] = frozenset(),
+            telemetry: typing.Sequence[Metric] = (),
+            ages: typing.Mapping[str, typing.Mapping[str, float]]|None = None,
+            services: list[Service]|None = None,
+            digests: typing.Mapping[str, typing.Mapping[str, bytes]]|None = None):
+        self.generation = generation
+        self.timestamp = timestamp
+        self.responses = responses
+        self.stale = stale
+        self.telemetry = telemetry
+        self.ages = ages or {}
+        self.services = services
+        self.digests = digests or {}
+
+
+EMPTY_SNAPSHOT = Snapshot(0, 0.0, {})
+
+
+class SnapshotStore(typing.Protocol):
+    """Destination of published snapshots."""
+
+    def publish(self, snapshot: Snapshot):
+        """Publish snapshot."""
+
+
+class SnapshotAggregator:
+    """Merge snapshots of several refreshers (one by account) into one snapshot.
+
+    Each refresher publishes to its own `store(name)`; a merged snapshot is
+    then published to `store` with services of all accounts. A service found
+    in several accounts is only kept in the first one. Ages are shifted to
+    the merged snapshot timestamp, so that the last success of an account is
+    unchanged when another account publishes."""
+
+    def __init__(
+            self,
+            services: typing.Mapping[str, list[Service]],
+            store: SnapshotStore|None = None):
+        self._services = services
+        self._store = store
+        self._lock = threading.Lock()
+        self._snapshots: dict[str, Snapshot] = {}
+        self._snapshot: Snapshot = EMPTY_SNAPSHOT
+
+    def store(self, name: str) -> SnapshotStore:
+        """Destination of snapshots of account `name`."""
+        return _AccountStore(self, name)
+
+    def snapshot(self) -> Snapshot:
+        """Return the latest merged snapshot."""
+        return self._snapshot
+
+    def publish(self, name: str, snapshot: Snapshot):
+        """Merge a new snapshot of account `name` and publish the result."""
+        with self._lock:
+            self._snapshots[name] = snapshot
+            now = time.time()
+            responses: dict[str, OvhApiResponse] = {}
+            stale: set[str] = set()
+            ages: dict[str, typing.Mapping[str, float]] = {}
+            digests: dict[str, typing.Mapping[str, bytes]] = {}
+            services: list[Service] = []
+            seen: set[str] = set()
+            for account, account_snapshot in self._snapshots.items():
+                # time elapsed since the account snapshot was published
+                elapsed = now - account_snapshot.timestamp
+                account_services = account_snapshot.services
+                if account_services is None:
+                    account_services = self._services.get(account, [])
+                for service in account_services:
+                    if service.id in seen:
+                        log.warning("Service %s found in several accounts, ignored in %s",
+                                    service.id, account)
+                        continue
+                    if service.id in account_snapshot.responses:
+                        responses[service.id] = account_snapshot.responses[service.id]
+                    if service.id in account_snapshot.stale:
+                        stale.add(service.id)
+                    if service.id in account_snapshot.ages:
+                        ages[service.id] = {
+                            endpoint: age + elapsed
+                            for endpoint, age in account_snapshot.ages[service.id].items()}
+                    if service.id in account_snapshot.digests:
+                        digests[service.id] = account_snapshot.digests[service.id]
+                    seen.add(service.id)
+                    services.append(service)
+            self._snapshot = Snapshot(
+                self._snapshot.generation + 1, now, responses, frozenset(stale),
+                list(API_REGISTRY.collect()), ages, services, digests)
+            if self._store is not None:
+                self._store.publish(self._snapshot)
+
+
+class _AccountStore:
+    """Snapshot store of one account of an aggregator."""
+
+    def __init__(self, aggregator: SnapshotAggregator, name: str):
+        self._aggregator = aggregator
+        self._name = name
+
+    def publish(self, snapshot: Snapshot):
+        """Publish snapshot of the account."""
+        self._aggregator.publish(self._name, snapshot)
+
+
+class Refresher:
+    """Poll OVH API in a background thread and keep the latest snapshot.
+
+    Payloads are read through an EndpointCache: each tick only calls the
+    endpoints whose time-to-live is expired, and a new snapshot is published
+    as soon as a background revalidation completes.
+
+    The thread is started lazily on first access so that it runs in the
+    process that serves metrics (gunicorn forks workers after configuration
+    loading)."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+            self,
+            client: ovh.Client,
+            services: list[Service],
+            interval: float,
+            max_in_flight: int = 1,
+            endpoints: typing.Collection[Endpoint]|None = None,
+            ttls: typing.Mapping[Endpoint, float]|None = None,
+            account: str = "default",
+            store: SnapshotStore|None = None,
+            timeout: float|None = None,
+            breakers: CircuitBreakers|None = None,
+            discovery: ProjectDiscovery|None = None):
+        if discovery is not None and endpoints is not None:
+            # discovered projects are labelled from project details
+            endpoints = frozenset(endpoints) | {ovh_client.Endpoint.PROJECT}
+        self._client = client
+        self._services = services
+        self._interval = interval
+        self._max_in_flight = max_in_flight
+        self._endpoints = endpoints
+        self._account = account
+        self._store = store
+        self._timeout = timeout
+        self._breakers = breakers
+        self._discovery = discovery
+        self._snapshot: Snapshot = EMPTY_SNAPSHOT
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._cache = ovh_client.EndpointCache(ttls, on_update=self._wake.set)
+        self._thread: threading.Thread|None = None
+        self._executor: concurrent.futures.ThreadPoolExecutor|None = None
+        self._thread_pid: int|None = None
+        self._executor_pid: int|None = None
+
+    def start(self):
+        """Start background thread if not already running in this process."""
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(name="ovh-refresher", target=self.run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Ask background thread to stop."""
+        self._stop.set()
+        self._wake.set()
+
+    def _pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        """API calls executor of current process."""
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor_pid = os.getpid()
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self._max_in_flight,
+                    thread_name_prefix="ovh-fetch")
+            return self._executor
+
+    def snapshot(self) -> Snapshot:
+        """Return the latest snapshot (empty until first refresh ends)."""
+        self.start()
+        return self._snapshot
+
+    def refresh(self):
+        """Fetch all services and publish a new snapshot.
+
+        Endpoints that fail, do not complete before the refresh timeout or
+        whose circuit breaker is open keep their previous payload and the
+        service is flagged as stale."""
+        previous = self._snapshot
+        if self._discovery is not None:
+            service_ids = self._discovery.service_ids(self._list_projects)
+        else:
+            service_ids = [service.id for service in self._services]
+        responses, incomplete = self._fetch_all(service_ids)
+        for service_id in incomplete:
+            if service_id in previous.responses:
+                log.warning("Refresh incomplete for service %s, previous data kept", service_id)
+                responses[service_id] = responses[service_id].merge(previous.responses[service_id])
+        self._snapshot = Snapshot(
+            previous.generation + 1, time.time(), responses, frozenset(incomplete),
+            list(API_REGISTRY.collect()), self._ages(responses),
+            self._discovery.services(responses) if self._discovery is not None else None,
+            self._digests(responses))
+        if self._store is not None:
+            self._store.publish(self._snapshot)
+        log.info("Snapshot %d published", self._snapshot.generation)
+
+    def _list_projects(self) -> list[str]:
+        """List project ids of the account."""
+        projects: list[str] = self._client.get("/cloud/project")
+        return projects
+
+    def _fetch_all(self, service_ids: list[str]) -> tuple[dict[str, OvhApiResponse], set[str]]:
+        """Fetch all services through cache and breakers."""
+        return ovh_client.fetch_all(
+            self._client,
+            service_ids,
+            self._pool(),
+            self._endpoints,
+            self._cache,
+            self._account,
+            self._timeout,
+            self._breakers)
+
+    def _ages(self, service_ids: typing.Iterable[str]) -> dict[str, dict[str, float]]:
+        """Age of last good payload by service and endpoint label."""
+        ages: dict[str, dict[str, float]] = {}
+        for service_id in service_ids:
+            ages[service_id] = {}
+            for endpoint in self._endpoints or ovh_client.Endpoint:
+                age = self._cache.age(self._account, endpoint, service_id)
+                if age is not None:
+                    ages[service_id][endpoint.name.lower()] = age
+        return ages
+
+    def _digests(self, responses: typing.Mapping[str, OvhApiResponse]) -> dict[str, dict[str, bytes]]:
+        """Content hash of payloads by service and endpoint label.
+
+        Only payloads still in cache are hashed, ex. not previous ones kept
+        for an incomplete refresh whose late result has been cached since."""
+        digests: dict[str, dict[str, bytes]] = {}
+        for service_id, response in responses.items():
+            digests[service_id] = {}
+            for endpoint in self._endpoints or ovh_client.Endpoint:
+                entry = self._cache.entry(self._account, endpoint, service_id)
+                payload = getattr(response, ovh_client.RESPONSE_FIELDS[endpoint])
+                if entry is not None and entry.digest is not None and entry.payload is payload:
+                    digests[service_id][endpoint.name.lower()] = entry.digest
+        return digests
+
+    def run(self):
+        """Refresh loop, until stopped.
+
+        A failed refresh (ex. snapshot file not writable) is logged and
+        retried on next tick."""
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.refresh()
+            except Exception: # noqa: BLE001
+                log.exception("Refresh failed")
+            elapsed = time.monotonic() - started
+            self._wake.wait(max(0.0, self._interval - elapsed))
+            self._wake.clear()
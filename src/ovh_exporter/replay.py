@@ -0,0 +1,89 @@
+"""Record and replay OVH API responses.
+
+Endpoint payloads of all services are recorded to a gzip-compressed JSON
+archive; an `Archive` then answers the same calls as ovh.Client and serves a
+fixed snapshot, so that production-shaped data can be exposed or profiled
+without any API call."""
+from __future__ import annotations
+
+import gzip
+import json
+import threading
+import time
+
+import ovh
+
+from ovh_exporter.logger import log
+from ovh_exporter.ovh_client import Endpoint, fetch
+from ovh_exporter.refresher import Snapshot
+
+ARCHIVE_FORMAT = 1
+
+
+def _service_id(path: str) -> str:
+    return path.split("?", 1)[0].split("/")[3]
+
+
+class RecordingClient:
+    """ovh.Client wrapper keeping endpoint payloads by service."""
+
+    def __init__(self, client: ovh.Client):
+        self._client = client
+        self._lock = threading.Lock()
+        self.payloads: dict[str, dict[str, object]] = {}
+
+    def get(self, path: str, **kwargs):
+        """GET call, recorded if path is an endpoint."""
+        payload = self._client.get(path, **kwargs)
+        label = Endpoint.label(path)
+        if label != "other":
+            with self._lock:
+                self.payloads.setdefault(_service_id(path), {})[label] = payload
+        return payload
+
+    def save(self, path: str):
+        """Write recorded payloads to an archive."""
+        with self._lock:
+            archive = {
+                "format": ARCHIVE_FORMAT,
+                "recorded_at": time.time(),
+                "services": self.payloads,
+            }
+            with gzip.open(path, "wt", encoding="utf-8") as fstream:
+                json.dump(archive, fstream, separators=(",", ":"))
+        log.info("%d services recorded to %s", len(self.payloads), path)
+
+
+class Archive:
+    """Recorded payloads; stands for both an ovh.Client and a snapshot source."""
+
+    def __init__(self, payloads: dict[str, dict[str, object]], recorded_at: float):
+        self.payloads = payloads
+        self.recorded_at = recorded_at
+        self._snapshot: Snapshot|None = None
+
+    @staticmethod
+    def load(path: str) -> Archive:
+        """Read an archive written by `RecordingClient.save`."""
+        with gzip.open(path, "rt", encoding="utf-8") as fstream:
+            archive = json.load(fstream)
+        if archive.get("format", None) != ARCHIVE_FORMAT:
+            raise ValueError(f"{path}: unsupported archive format {archive.get('format', None)}")
+        return Archive(archive["services"], archive["recorded_at"])
+
+    def get(self, path: str, **_kwargs):
+        """Recorded payload of an endpoint."""
+        try:
+            return self.payloads[_service_id(path)][Endpoint.label(path)]
+        except (IndexError, KeyError):
+            raise ovh.exceptions.ResourceNotFoundError(f"{path} not recorded") from None
+
+    def snapshot(self) -> Snapshot:
+        """Snapshot of all recorded services (built once)."""
+        if self._snapshot is None:
+            responses = {
+                service_id: fetch(self, service_id, [Endpoint[i.upper()] for i in endpoints])
+                for service_id, endpoints in self.payloads.items()
+            }
+            self._snapshot = Snapshot(1, self.recorded_at, responses)
+        return self._snapshot
@@ -0,0 +1,81 @@
+"""Cross-process snapshot store.
+
+The refresher process publishes each snapshot to a file, preferably on a
+memory-backed filesystem (/dev/shm), and gunicorn workers map it in memory
+when it changes. OVH API is then called once per host, not once per worker."""
+from __future__ import annotations
+
+import mmap
+import os
+import pickle
+import tempfile
+import threading
+
+from ovh_exporter.logger import log
+from ovh_exporter.refresher import EMPTY_SNAPSHOT, Snapshot
+
+SHM_DIR = "/dev/shm" # noqa: S108
+
+
+def default_path() -> str:
+    """Default snapshot file path, on shared memory if available."""
+    directory = SHM_DIR if os.path.isdir(SHM_DIR) else tempfile.gettempdir()
+    return os.path.join(directory, f"ovh_exporter-{os.getpid()}.snapshot")
+
+
+class FileSnapshotStore:
+    """Snapshot published to / read from a file.
+
+    Writes are atomic (temporary file then rename); readers reload the file
+    only when its inode or modification time changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._owner_pid = os.getpid()
+        self._lock = threading.Lock()
+        self._stat_key: tuple[int, int]|None = None
+        self._snapshot: Snapshot = EMPTY_SNAPSHOT
+
+    def publish(self, snapshot: Snapshot):
+        """Write snapshot; readers see either previous or new file."""
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".ovh_exporter-")
+        try:
+            with os.fdopen(fd, "wb") as fstream:
+                pickle.dump(snapshot, fstream, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def snapshot(self) -> Snapshot:
+        """Return latest published snapshot (empty if none)."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._snapshot
+        stat_key = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            if stat_key != self._stat_key:
+                self._snapshot = self._load()
+                self._stat_key = stat_key
+            return self._snapshot
+
+    def _load(self) -> Snapshot:
+        with open(self.path, "rb") as fstream, \
+                mmap.mmap(fstream.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            snapshot: Snapshot = pickle.loads(data) # noqa: S301
+        log.debug("Snapshot %d loaded from %s", snapshot.generation, self.path)
+        return snapshot
+
+    def remove(self):
+        """Remove snapshot file.
+
+        Ignored outside of the process that created the store, so that forked
+        workers exiting do not remove it."""
+        if os.getpid() != self._owner_pid:
+            return
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
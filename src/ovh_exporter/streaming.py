@@ -0,0 +1,128 @@
+"""Incremental decoding of large API payloads.
+
+Only some fields of a payload are used by metrics. They are described by a
+field tree: a dict of needed keys, `*` standing for list items, each key
+mapped to the tree of its value, or to None when the whole value is kept
+(see mapping.fields).
+
+With ijson (ovh_exporter[streaming]), a response body is decoded while it is
+downloaded and unused values are skipped, so that memory use only depends on
+the kept fields; otherwise the decoded payload is pruned afterwards."""
+from __future__ import annotations
+
+import sys
+import typing
+
+try:
+    import ijson
+except ImportError: # pragma: no cover
+    ijson = None
+
+AVAILABLE = ijson is not None
+
+Fields = typing.Optional[typing.Dict[str, typing.Any]]
+
+
+class Readable(typing.Protocol):
+    """Binary file-like object."""
+
+    def read(self, size: int = -1) -> bytes:
+        """Read at most `size` bytes."""
+
+# value of a field that is not needed
+_SKIP = object()
+_STARTS = ("start_map", "start_array")
+_ENDS = ("end_map", "end_array")
+
+
+def _items(fields: Fields):
+    """Tree of the items of a list (_SKIP if they are not needed)."""
+    return None if fields is None else fields.get("*", _SKIP)
+
+
+def prune(value, fields: Fields):
+    """Copy of a decoded payload with only `fields`."""
+    if fields is None:
+        return value
+    if isinstance(value, dict):
+        return {k: prune(v, fields[k]) for k, v in value.items() if k in fields}
+    if isinstance(value, list):
+        items = _items(fields)
+        return [] if items is _SKIP else [prune(i, items) for i in value]
+    return value
+
+
+class Builder:
+    """Build a payload with only `fields` from ijson parse events.
+
+    Keys, and string values of `label_keys`, are interned, as
+    ovh_client.intern_strings does."""
+
+    def __init__(self, fields: Fields, label_keys: typing.AbstractSet[str] = frozenset()):
+        self._root: list = []
+        # containers being built, with the tree of their children and
+        # whether their strings are label values
+        self._stack: list[tuple[typing.Any, Fields, bool]] = [(self._root, fields, False)]
+        self._label_keys = label_keys
+        self._key: str|None = None
+        self._fields: Fields = fields
+        self._skipped = 0
+
+    @property
+    def value(self):
+        """Built payload (None until parsing is done)."""
+        return self._root[0] if self._root else None
+
+    def event(self, event: str, value):
+        """Handle a parse event."""
+        if self._skipped:
+            if event in _STARTS:
+                self._skipped += 1
+            elif event in _ENDS:
+                self._skipped -= 1
+            return
+        container, fields, label = self._stack[-1]
+        if event == "map_key":
+            self._key = sys.intern(value)
+            self._fields = fields if fields is None else fields.get(value, _SKIP)
+            return
+        if event in _ENDS:
+            self._stack.pop()
+            return
+        if isinstance(container, list):
+            # list item, or the payload itself
+            self._fields = fields if container is self._root else _items(fields)
+        else:
+            label = self._key in self._label_keys
+        if self._fields is _SKIP:
+            if event in _STARTS:
+                self._skipped = 1
+            return
+        if event == "start_map":
+            value = {}
+            self._stack.append((value, self._fields, label))
+        elif event == "start_array":
+            value = []
+            self._stack.append((value, self._fields, label))
+        elif event == "string" and label:
+            value = sys.intern(value)
+        if isinstance(container, list):
+            container.append(value)
+        else:
+            container[self._key] = value
+
+
+def load(file: Readable, fields: Fields, label_keys: typing.AbstractSet[str] = frozenset()):
+    """Decode a JSON document from `file` while reading it, keeping only `fields`
+    and interning string values of `label_keys`.
+
+    Raise ValueError if the document is invalid."""
+    if not AVAILABLE:
+        raise RuntimeError("streaming requires ijson (pip install 'ovh_exporter[streaming]')")
+    builder = Builder(fields, label_keys)
+    try:
+        for _, event, value in ijson.parse(file, use_float=True):
+            builder.event(event, value)
+    except ijson.JSONError as error:
+        raise ValueError(str(error)) from error
+    return builder.value
@@ -0,0 +1,98 @@
+"""Refresher process supervision.
+
+The refresher process is started by the gunicorn arbiter once it is ready,
+and restarted whenever it exits. Its exit is detected through the process
+sentinel, as the arbiter reaps all its children (gunicorn `reap_workers`),
+so that the exit status is not available to multiprocessing."""
+from __future__ import annotations
+
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.process
+import signal
+import threading
+import typing
+
+from ovh_exporter.logger import log
+
+
+def forget_children():
+    """Forget multiprocessing children inherited from the parent process.
+
+    Called in forked gunicorn workers: otherwise multiprocessing terminates
+    the (daemonic) refresher process when a worker exits."""
+    multiprocessing.process._children.clear() # noqa: SLF001 # pylint: disable=protected-access
+
+
+# signals handled by gunicorn arbiter
+_SIGNALS = ("SIGHUP", "SIGQUIT", "SIGINT", "SIGTERM", "SIGTTIN", "SIGTTOU",
+            "SIGUSR1", "SIGUSR2", "SIGWINCH", "SIGCHLD")
+
+
+def _run(target: typing.Callable, args: tuple):
+    """Process entry-point: restore default handlers of arbiter signals, so
+    that the process can be terminated."""
+    for name in _SIGNALS:
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), signal.SIG_DFL)
+    target(*args)
+
+
+class ProcessSupervisor:
+    """Run `target` in a daemonic process, restarted `restart_delay` seconds
+    after it exits."""
+
+    def __init__(self, name: str, target: typing.Callable, args: tuple = (), restart_delay: float = 5.0):
+        self.name = name
+        self._target = target
+        self._args = args
+        self.restart_delay = restart_delay
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._process: multiprocessing.Process|None = None
+        self._thread: threading.Thread|None = None
+        self.restarts = 0
+
+    def _spawn(self) -> multiprocessing.Process:
+        process = multiprocessing.Process(
+            name=self.name, target=_run, args=(self._target, self._args), daemon=True)
+        process.start()
+        self._process = process
+        return process
+
+    def start(self):
+        """Start the process and its watcher thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        process = self._spawn()
+        self._thread = threading.Thread(name=f"{self.name}-supervisor", target=self._watch, args=(process,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _watch(self, process: multiprocessing.Process):
+        """Restart the process each time it exits, until stopped."""
+        while True:
+            multiprocessing.connection.wait([process.sentinel])
+            if self._stop.is_set():
+                return
+            log.error("%s process %d exited, restarting in %.0fs", self.name, process.pid, self.restart_delay)
+            if self._stop.wait(self.restart_delay):
+                return
+            with self._lock:
+                if self._stop.is_set():
+                    return
+                self.restarts += 1
+                process = self._spawn()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the process; it is no longer restarted."""
+        with self._lock:
+            self._stop.set()
+            process = self._process
+        if process is not None and process.pid is not None:
+            process.terminate()
+            process.join(timeout)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
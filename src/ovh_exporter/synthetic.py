@@ -0,0 +1,276 @@
+"""Synthetic OVH API payloads.
+
+Deterministic payloads shaped like real `/cloud/project/{service_id}/...`
+responses, sized by number of instances, volumes and storage buckets. Used
+by benchmarks, tests and the fake OVH API server."""
+from __future__ import annotations
+
+import random
+import typing
+import uuid
+
+from ovh_exporter.ovh_client import Endpoint
+
+if typing.TYPE_CHECKING:
+    from ovh_exporter.refresher import Snapshot
+
+REGIONS = ("GRA11", "SBG5", "BHS5", "DE1", "UK1", "WAW1")
+FLAVORS = ("d2-2", "d2-4", "b2-7", "b2-15", "c2-30", "r2-60")
+VOLUME_TYPES = ("classic", "high-speed", "high-speed-gen2")
+STORAGE_TYPES = ("storage-standard", "storage-high-perf", "pcs")
+LAST_UPDATE = "2024-01-01T12:00:00Z"
+
+
+def _quantity(rng: random.Random, unit: str, maximum: float):
+    return {"unit": unit, "value": round(rng.uniform(0, maximum), 2)}
+
+
+def _price(rng: random.Random):
+    return round(rng.uniform(0, 100), 2)
+
+
+def _bandwidth(rng: random.Random):
+    return {"quantity": _quantity(rng, "GiB", 1000), "totalPrice": _price(rng)}
+
+
+class SyntheticProject:
+    """Payloads of one synthetic project."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+            self,
+            service_id: str,
+            instances: int = 10,
+            volumes: int = 10,
+            buckets: int = 10,
+            regions: int = 3,
+            seed: int = 0):
+        self.service_id = service_id
+        self.rng = random.Random(f"{seed}-{service_id}") # noqa: S311
+        self.regions = REGIONS[:max(1, min(regions, len(REGIONS)))]
+        self.instance_ids = [self._uuid() for _ in range(instances)]
+        self.volume_ids = [self._uuid() for _ in range(volumes)]
+        self.bucket_names = [f"bucket-{i}" for i in range(buckets)]
+
+    def _uuid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128)))
+
+    def _region(self, index: int) -> str:
+        return self.regions[index % len(self.regions)]
+
+    def payload(self, endpoint: Endpoint):
+        """Payload of an endpoint."""
+        return {
+            Endpoint.PROJECT: self.project,
+            Endpoint.QUOTA: self.quota,
+            Endpoint.INSTANCE: self.instances,
+            Endpoint.STORAGE: self.storages,
+            Endpoint.USAGE: self.usage,
+            Endpoint.VOLUME: self.volumes,
+        }[endpoint]()
+
+    def project(self):
+        """/cloud/project/{service_id}"""
+        return {
+            "project_id": self.service_id,
+            "projectName": f"project-{self.service_id[:8]}",
+            "description": f"Synthetic project {self.service_id[:8]}",
+            "status": "ok",
+        }
+
+    def quota(self):
+        """/cloud/project/{service_id}/quota"""
+        rng = self.rng
+        return [
+            {
+                "region": region,
+                "instance": {
+                    "maxCores": 512, "maxInstances": 64, "maxRam": 1048576,
+                    "usedCores": rng.randint(0, 512), "usedInstances": rng.randint(0, 64),
+                    "usedRAM": rng.randint(0, 1048576),
+                },
+                "keypair": {"maxCount": 100},
+                "volume": {
+                    "maxGigabytes": 200000, "usedGigabytes": rng.randint(0, 200000),
+                    "volumeCount": rng.randint(0, 1000), "maxVolumeCount": 1000,
+                    "maxBackupGigabytes": 200000, "usedBackupGigabytes": rng.randint(0, 200000),
+                    "volumeBackupCount": rng.randint(0, 100), "maxVolumeBackupCount": 100,
+                },
+                "network": {
+                    "maxNetworks": 100, "usedNetworks": rng.randint(0, 100),
+                    "maxSubnets": 100, "usedSubnets": rng.randint(0, 100),
+                    "maxFloatingIPs": 100, "usedFloatingIPs": rng.randint(0, 100),
+                    "maxGateways": 100, "usedGateways": rng.randint(0, 100),
+                },
+                "loadBalancer": {"maxLoadBalancers": 10, "usedLoadBalancers": rng.randint(0, 10)},
+                "keymanager": {"maxSecrets": 100, "usedSecrets": rng.randint(0, 100)},
+            }
+            for region in self.regions
+        ]
+
+    def instances(self):
+        """/cloud/project/{service_id}/instance"""
+        return [
+            {
+                "id": instance_id,
+                "name": f"instance-{index}",
+                "planCode": f"{FLAVORS[index % len(FLAVORS)]}.{'monthly' if index % 4 == 0 else 'consumption'}",
+                "region": self._region(index),
+                "status": "ACTIVE",
+            }
+            for index, instance_id in enumerate(self.instance_ids)
+        ]
+
+    def storages(self):
+        """/cloud/project/{service_id}/storage"""
+        rng = self.rng
+        return [
+            {
+                "id": f"{bucket_name}-id",
+                "name": bucket_name,
+                "archive": False,
+                "containerType": "private" if index % 2 else "public",
+                "region": self._region(index),
+                "storedBytes": rng.randint(0, 10**12),
+                "storedObjects": rng.randint(0, 10**6),
+            }
+            for index, bucket_name in enumerate(self.bucket_names)
+        ]
+
+    def volumes(self):
+        """/cloud/project/{service_id}/volume"""
+        rng = self.rng
+        return [
+            {
+                "id": volume_id,
+                "attachedTo": [],
+                "creationDate": "2023-01-01T00:00:00Z",
+                "name": f"volume-{index}",
+                "description": "",
+                "size": rng.randint(10, 4000),
+                "status": "in-use",
+                "region": self._region(index),
+                "bootable": False,
+                "planCode": f"volume.{VOLUME_TYPES[index % len(VOLUME_TYPES)]}.consumption",
+                "type": VOLUME_TYPES[index % len(VOLUME_TYPES)],
+            }
+            for index, volume_id in enumerate(self.volume_ids)
+        ]
+
+    def usage(self):
+        """/cloud/project/{service_id}/usage/current"""
+        rng = self.rng
+        hourly_instances: dict[tuple[str, str], list] = {}
+        monthly_instances: dict[tuple[str, str], list] = {}
+        for index, instance_id in enumerate(self.instance_ids):
+            key = (FLAVORS[index % len(FLAVORS)], self._region(index))
+            if index % 4 == 0:
+                monthly_instances.setdefault(key, []).append({
+                    "instanceId": instance_id,
+                    "activation": "2023-01-01T00:00:00Z",
+                    "totalPrice": _price(rng),
+                })
+            else:
+                hourly_instances.setdefault(key, []).append({
+                    "instanceId": instance_id,
+                    "quantity": _quantity(rng, "Hour", 720),
+                    "totalPrice": _price(rng),
+                })
+        volumes: dict[tuple[str, str], list] = {}
+        for index, volume_id in enumerate(self.volume_ids):
+            key = (VOLUME_TYPES[index % len(VOLUME_TYPES)], self._region(index))
+            volumes.setdefault(key, []).append({
+                "volumeId": volume_id,
+                "quantity": _quantity(rng, "GiBh", 100000),
+                "totalPrice": _price(rng),
+            })
+        storages = [
+            {
+                "region": self._region(index),
+                "type": STORAGE_TYPES[index % len(STORAGE_TYPES)],
+                "bucketName": bucket_name,
+                "totalPrice": _price(rng),
+                "stored": {"quantity": _quantity(rng, "GiBh", 100000), "totalPrice": _price(rng)},
+                "outgoingBandwidth": _bandwidth(rng),
+                "outgoingInternalBandwidth": _bandwidth(rng) if index % 2 else None,
+                "incomingBandwidth": _bandwidth(rng),
+                "incomingInternalBandwidth": None,
+            }
+            for index, bucket_name in enumerate(self.bucket_names)
+        ]
+        return {
+            "hourlyUsage": {
+                "instance": [
+                    {
+                        "reference": flavor, "region": region,
+                        "quantity": _quantity(rng, "Hour", 720 * len(details)),
+                        "totalPrice": _price(rng),
+                        "details": details,
+                    }
+                    for (flavor, region), details in hourly_instances.items()
+                ],
+                "instanceOption": [],
+                "storage": storages,
+                "volume": [
+                    {
+                        "type": volume_type, "region": region,
+                        "quantity": _quantity(rng, "GiBh", 100000 * len(details)),
+                        "totalPrice": _price(rng),
+                        "details": details,
+                    }
+                    for (volume_type, region), details in volumes.items()
+                ],
+            },
+            "monthlyUsage": {
+                "instance": [
+                    {
+                        "reference": flavor, "region": region,
+                        "totalPrice": _price(rng),
+                        "details": details,
+                    }
+                    for (flavor, region), details in monthly_instances.items()
+                ],
+                "instanceOption": [],
+                "certification": [],
+            },
+            "resourcesUsage": [],
+            "period": {"from": "2024-01-01T00:00:00Z", "to": "2024-02-01T00:00:00Z"},
+            "lastUpdate": LAST_UPDATE,
+        }
+
+
+class SyntheticClient:
+    """ovh.Client stand-in serving synthetic projects.
+
+    Projects are built on first access and payloads are memoized so that
+    repeated fetches return the same objects."""
+
+    def __init__(self, **project_options):
+        self._options = project_options
+        self._payloads: dict[tuple[str, Endpoint], object] = {}
+        self.calls = 0
+
+    def get(self, path: str, **_kwargs):
+        """Fake GET call on an endpoint."""
+        self.calls += 1
+        parts = path.split("?", 1)[0].split("/")
+        service_id = parts[3]
+        endpoint = Endpoint[Endpoint.label(path).upper()]
+        key = (service_id, endpoint)
+        if key not in self._payloads:
+            project = SyntheticProject(service_id, **self._options)
+            for i in Endpoint:
+                self._payloads[(service_id, i)] = project.payload(i)
+        return self._payloads[key]
+
+
+# pylint: disable=too-few-public-methods
+class StaticSource:
+    """Snapshot source with a fixed snapshot, replaced by setting `value`."""
+
+    def __init__(self, snapshot: Snapshot):
+        self.value = snapshot
+
+    def snapshot(self) -> Snapshot:
+        """Return snapshot."""
+        return self.value
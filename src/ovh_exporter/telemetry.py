@@ -0,0 +1,101 @@
+"""Exporter self-instrumentation.
+
+API-side metrics are observed in the refresher process and shipped with
+each snapshot; collection-side metrics are observed in the HTTP workers.
+Each side has its own registry so that a metric is never exposed twice."""
+from __future__ import annotations
+
+import typing
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+if typing.TYPE_CHECKING:
+    from ovh_exporter.collector import SnapshotSource
+
+# Refresher side
+API_REGISTRY = CollectorRegistry(auto_describe=True)
+
+API_REQUEST_DURATION = Histogram(
+    "ovh_exporter_api_request_duration_seconds",
+    "OVH API request duration",
+    ["endpoint", "status"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+    registry=API_REGISTRY,
+)
+API_RESPONSE_SIZE = Histogram(
+    "ovh_exporter_api_response_size_bytes",
+    "OVH API response payload size",
+    ["endpoint"],
+    buckets=(1e3, 1e4, 1e5, 1e6, 1e7, 1e8),
+    registry=API_REGISTRY,
+)
+API_RETRIES = Counter(
+    "ovh_exporter_api_retries",
+    "OVH API calls retried, by reason (throttled, server_error, network)",
+    ["endpoint", "reason"],
+    registry=API_REGISTRY,
+)
+API_RATE_LIMIT = Gauge(
+    "ovh_exporter_api_rate_limit",
+    "Configured OVH API call rate limit (calls per second)",
+    ["account"],
+    registry=API_REGISTRY,
+)
+API_RATE_LIMIT_WAIT = Counter(
+    "ovh_exporter_api_rate_limit_wait_seconds",
+    "Time spent waiting for the OVH API rate limiter",
+    ["account"],
+    registry=API_REGISTRY,
+)
+CIRCUIT_BREAKER_STATE = Gauge(
+    "ovh_exporter_circuit_breaker_state",
+    "Circuit breaker state by account, service and endpoint (0: closed, 1: open, 2: half-open)",
+    ["account", "service_id", "endpoint"],
+    registry=API_REGISTRY,
+)
+CIRCUIT_BREAKER_REJECTED = Counter(
+    "ovh_exporter_circuit_breaker_rejected",
+    "OVH API calls skipped by an open circuit breaker",
+    ["endpoint"],
+    registry=API_REGISTRY,
+)
+CACHE_LOOKUPS = Counter(
+    "ovh_exporter_cache_lookups",
+    "Endpoint cache lookups by result (hit, stale, miss)",
+    ["endpoint", "result"],
+    registry=API_REGISTRY,
+)
+
+# HTTP worker side
+COLLECT_REGISTRY = CollectorRegistry(auto_describe=True)
+
+COLLECT_DURATION = Histogram(
+    "ovh_exporter_collect_duration_seconds",
+    "Time spent collecting metrics of an endpoint payload",
+    ["endpoint"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+    registry=COLLECT_REGISTRY,
+)
+COLLECT_SAMPLES = Gauge(
+    "ovh_exporter_collect_samples",
+    "Samples emitted by metric family at last rendering",
+    ["family"],
+    registry=COLLECT_REGISTRY,
+)
+SNAPSHOT_TIMESTAMP = Gauge(
+    "ovh_exporter_snapshot_timestamp_seconds",
+    "Publication time of the last rendered snapshot",
+    registry=COLLECT_REGISTRY,
+)
+
+
+# pylint: disable=too-few-public-methods
+class SnapshotTelemetryCollector:
+    """Expose API-side metrics shipped with the latest snapshot."""
+
+    def __init__(self, source: SnapshotSource):
+        self._source = source
+
+    def collect(self):
+        """Collect snapshot telemetry."""
+        yield from self._source.snapshot().telemetry
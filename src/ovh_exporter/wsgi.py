@@ -1,18 +1,26 @@
 """WSGI utilities."""
 import base64
 import binascii
+import urllib.parse
 
 import gunicorn.app.base
 
+from ovh_exporter.exposition import Format, render_live
 from ovh_exporter.logger import log
 
+# seconds kept to render and send the response before scrape timeout
+SCRAPE_TIMEOUT_MARGIN = 0.5
+
 
 class StandaloneApplication(gunicorn.app.base.BaseApplication):
     # 'init' and 'load' methods are implemented by WSGIApplication.
     # pylint: disable=abstract-method
     """Gunicorn wrapper."""
+    # pylint: disable=too-many-arguments
     def __init__(self, app, bind_addr="127.0.0.1", bind_port=9100,
-                 cert_file=None, key_file=None):
+                 cert_file=None, key_file=None, timeout=180, hooks=None):
+        self.timeout = timeout
+        self.hooks = hooks or {}
         self.cert_file = cert_file
         self.key_file = key_file
         self.bind_addr = bind_addr
@@ -28,7 +36,9 @@ class StandaloneApplication(gunicorn.app.base.BaseApplication):
         config["bind"] = f"{self.bind_addr}:{self.bind_port}"
         config["workers"] = 3
         config["worker_class"] = "gthread"
-        config["timeout"] = 180
+        config["timeout"] = self.timeout
+        # server hooks (when_ready, post_fork, on_exit...)
+        config.update(self.hooks)
         for key, value in config.items():
             self.cfg.set(key.lower(), value)
 
@@ -36,6 +46,109 @@ class StandaloneApplication(gunicorn.app.base.BaseApplication):
         return self.application
 
 
+class MetricsApplication:
+    """Metrics WSGI application.
+
+    Replace prometheus_client `make_wsgi_app`: OVH metrics are served from
+    the pre-rendered exposition cache, `registry` metrics are rendered on
+    each request. Text and OpenMetrics formats and gzip encoding are
+    negotiated.
+
+    `/probe?target=<service_id>` serves a single service (blackbox-style),
+    without live metrics. As its body only depends on the snapshot, it has
+    an ETag and `If-None-Match` is answered with 304 while the snapshot is
+    unchanged; `/metrics` bodies include live metrics and have no ETag.
+
+    Until the first snapshot is available, a request waits for it at most
+    until its Prometheus scrape timeout (minus a safety margin)."""
+    def __init__(self, cache, registry, compression=True): # noqa: FBT002
+        self.cache = cache
+        self.registry = registry
+        self.compression = compression
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO", "") == "/favicon.ico":
+            start_response("200 OK", [])
+            return [b""]
+        target = None
+        if environ.get("PATH_INFO", "") == "/probe":
+            params = urllib.parse.parse_qs(environ.get("QUERY_STRING", ""))
+            target = params.get("target", [None])[0]
+            if not target or not self.cache.collector.has_service(target):
+                start_response("400 Bad Request", [("Content-Type", "text/plain; charset=utf-8")])
+                return [f"Unknown or missing target parameter: {target}".encode()]
+        fmt = Format.negotiate(environ.get("HTTP_ACCEPT", None))
+        rendered = self.cache.get(fmt, target, _scrape_timeout(environ))
+        headers = [("Vary", "Accept, Accept-Encoding")]
+        if target is None:
+            # changes on each request, so the body cannot be validated
+            live = render_live(self.registry, fmt)
+        else:
+            headers.append(("ETag", rendered.etag))
+            if _etag_matches(environ.get("HTTP_IF_NONE_MATCH", None), rendered.etag):
+                start_response("304 Not Modified", headers)
+                return []
+            live = fmt.eof
+        headers.append(("Content-Type", fmt.content_type))
+        if self.compression and _accepts_gzip(environ.get("HTTP_ACCEPT_ENCODING", None)):
+            output = rendered.gzip(live)
+            headers.append(("Content-Encoding", "gzip"))
+        else:
+            output = rendered.text(live)
+        headers.append(("Content-Length", str(len(output))))
+        start_response("200 OK", headers)
+        return [output]
+
+
+def _scrape_timeout(environ):
+    """Prometheus scrape timeout minus a margin, if provided."""
+    header = environ.get("HTTP_X_PROMETHEUS_SCRAPE_TIMEOUT_SECONDS", None)
+    if not header:
+        return None
+    try:
+        timeout = float(header)
+    except ValueError:
+        log.debug("Invalid scrape timeout header %s", header)
+        return None
+    return max(0.0, timeout - SCRAPE_TIMEOUT_MARGIN)
+
+
+def _accepts_gzip(accept_encoding):
+    """Check if Accept-Encoding header allows gzip (q-value above 0, `*` if
+    gzip is not listed)."""
+    if not accept_encoding:
+        return False
+    qvalues = {}
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.partition(";")
+        qvalue = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        qvalues[name.strip().lower()] = qvalue
+    return qvalues.get("gzip", qvalues.get("x-gzip", qvalues.get("*", 0.0))) > 0
+
+
+def _etag_matches(if_none_match, etag):
+    """Weak comparison of If-None-Match header with etag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip() # noqa: PLW2901
+        if candidate.startswith("W/"):
+            candidate = candidate[2:] # noqa: PLW2901
+        if candidate == opaque:
+            return True
+    return False
+
+
 class BasicAuthMiddleware:
     """Basic Auth WSGI middleware"""
     def __init__(self, app, login, password, realm="ovh_exporter"):
@@ -79,8 +192,9 @@ class BasicAuthMiddleware:
             log.debug("Authorization is not a basic authentication.")
             return False
 
+# pylint: disable=too-many-arguments
 def run_server(app, bind_addr="127.0.0.1", bind_port=9100,
-               cert_file=None, key_file=None):
-    """Start a WSGI server"""
+               cert_file=None, key_file=None, timeout=180, hooks=None):
+    """Start a WSGI server; `hooks` are gunicorn server hooks by name."""
     StandaloneApplication(app, bind_addr, bind_port,
-                          cert_file, key_file).run()
+                          cert_file, key_file, timeout, hooks).run()
@@ -0,0 +1,119 @@
+"""asyncio backend tests (HTTP session replaced by an in-memory one)."""
+import asyncio
+import json
+import time
+
+import ovh
+
+from ovh_exporter.async_client import AsyncOvhClient, AsyncRefresher, fetch_all
+from ovh_exporter.collector import OvhCollector
+from ovh_exporter.config import OvhAccount, Service
+from ovh_exporter.ovh_client import Endpoint
+from ovh_exporter.synthetic import SyntheticClient
+
+SERVICE_ID = "c" * 32
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.status = 200
+        self.headers = {}
+        self._body = body
+
+    async def read(self):
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_args):
+        return False
+
+
+class FakeSession:
+    """aiohttp.ClientSession stand-in serving synthetic payloads."""
+
+    def __init__(self):
+        self.synthetic = SyntheticClient(instances=2, volumes=3, buckets=1)
+        self.requests = []
+
+    def request(self, method, url, headers):
+        self.requests.append((method, url, headers))
+        path = url.split("/1.0", 1)[1]
+        if path == "/auth/time":
+            return FakeResponse(str(int(time.time())).encode())
+        return FakeResponse(json.dumps(self.synthetic.get(path)).encode())
+
+    async def close(self):
+        pass
+
+
+def _account():
+    return OvhAccount("ovh-eu", "ak", "as", "ck")
+
+
+def test_signature_matches_ovh_client(monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 1700000000)
+    sent = {}
+
+    class RequestsSession:
+        def request(self, method, target, headers, **_kwargs):
+            sent.update(headers)
+
+    client = ovh.Client("ovh-eu", "ak", "as", "ck")
+    client._time_delta = 0 # noqa: SLF001
+    client._session = RequestsSession() # noqa: SLF001
+    target = f"{ovh.client.ENDPOINTS['ovh-eu']}/cloud/project/{SERVICE_ID}/storage?includeType=true"
+    client.raw_call("GET", f"/cloud/project/{SERVICE_ID}/storage?includeType=true")
+    signed = AsyncOvhClient(_account(), session=FakeSession()).sign("GET", target, "", "1700000000")
+    assert signed["X-Ovh-Signature"] == sent["X-Ovh-Signature"]
+
+
+def test_async_refresher_snapshot():
+    session = FakeSession()
+    services = [Service(SERVICE_ID, {})]
+    refresher = AsyncRefresher(AsyncOvhClient(_account(), 8, session=session), services, 300, 8)
+    refresher.refresh()
+    refresher.stop()
+    refresher.start = lambda: None
+    sizes = [
+        sample.value
+        for metric in OvhCollector(refresher, services).collect()
+        if metric.name == "ovh_volume_size_gb"
+        for sample in metric.samples
+    ]
+    assert len(sizes) == 3
+    assert any("includeType=true" in url for _, url, _ in session.requests)
+    assert all("X-Ovh-Signature" in headers for _, url, headers in session.requests if "/auth/time" not in url)
+
+
+def test_fetch_all_coalesces_late_calls():
+    """A call still running after the refresh timeout is joined by the next refresh."""
+    class SlowSession(FakeSession):
+        def __init__(self):
+            super().__init__()
+            self.release = asyncio.Event()
+
+        def request(self, method, url, headers):
+            response = super().request(method, url, headers)
+            read = response.read
+
+            async def slow_read():
+                await self.release.wait()
+                return await read()
+            if "/auth/time" not in url:
+                response.read = slow_read
+            return response
+
+    async def refresh_twice():
+        session = SlowSession()
+        client = AsyncOvhClient(_account(), session=session)
+        for _ in range(2):
+            _responses, incomplete = await fetch_all(client, [SERVICE_ID], [Endpoint.VOLUME], timeout=0.05)
+            assert incomplete == {SERVICE_ID}
+        session.release.set()
+        await asyncio.gather(*(asyncio.all_tasks() - {asyncio.current_task()}))
+        return session
+
+    session = asyncio.run(refresh_twice())
+    assert len([url for _, url, _ in session.requests if "/auth/time" not in url]) == 1
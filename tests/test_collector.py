@@ -0,0 +1,33 @@
+"""Collector tests."""
+from ovh_exporter.collector import Endpoint, MetricFamily, OvhCollector, endpoints_for
+from ovh_exporter.config import Service
+from ovh_exporter.ovh_client import OvhApiResponse
+from ovh_exporter.refresher import Snapshot
+from ovh_exporter.synthetic import StaticSource
+from ovh_exporter.telemetry import COLLECT_REGISTRY
+
+
+def test_endpoints_for_quota_families():
+    """Quota families only need quota endpoint."""
+    families = MetricFamily.load(["quota_volume", "quota_lb"])
+    assert endpoints_for(families) == {Endpoint.QUOTA}
+
+
+def test_endpoints_for_all_families():
+    """Project and instance endpoints are never needed."""
+    endpoints = endpoints_for(MetricFamily.load(None))
+    assert Endpoint.PROJECT not in endpoints
+    assert Endpoint.INSTANCE not in endpoints
+    assert len(endpoints) == 4
+
+
+def test_probe_keeps_sample_counts():
+    """Collecting a single service does not change samples by family."""
+    quotas = [{"region": "GRA", "keymanager": {"usedSecrets": 1, "maxSecrets": 10}}]
+    snapshot = Snapshot(1, 0.0, {i: OvhApiResponse(quotas=quotas) for i in ("a", "b")})
+    collector = OvhCollector(StaticSource(snapshot), [Service("a", {}), Service("b", {})])
+    list(collector.collect_snapshot(snapshot))
+    count = COLLECT_REGISTRY.get_sample_value("ovh_exporter_collect_samples", {"family": "quota_keymanager"})
+    list(collector.collect_snapshot(snapshot, {"a"}))
+    assert COLLECT_REGISTRY.get_sample_value(
+        "ovh_exporter_collect_samples", {"family": "quota_keymanager"}) == count == 4
@@ -0,0 +1,49 @@
+"""Project discovery tests."""
+from ovh_exporter.collector import OvhCollector
+from ovh_exporter.config import Service
+from ovh_exporter.discovery import ProjectDiscovery
+from ovh_exporter.refresher import Refresher
+from ovh_exporter.synthetic import SyntheticClient
+
+CONFIGURED = "0" * 32
+DISCOVERED = "1" * 32
+
+
+class DiscoveryClient(SyntheticClient):
+    """Synthetic client also listing projects."""
+
+    def __init__(self, projects):
+        super().__init__(instances=1, volumes=1, buckets=1)
+        self.projects = projects
+        self.listings = 0
+
+    def get(self, path, **kwargs):
+        if path == "/cloud/project":
+            self.listings += 1
+            return self.projects
+        return super().get(path, **kwargs)
+
+
+def test_discovered_projects_collected():
+    """Discovered projects are labelled from templates and listed once per interval."""
+    services = [Service(CONFIGURED, {"env": "prod", "project": "configured"})]
+    client = DiscoveryClient([CONFIGURED])
+    discovery = ProjectDiscovery(3600, {"env": "test", "project": "{projectName}"}, services)
+    refresher = Refresher(client, services, 300, discovery=discovery)
+    collector = OvhCollector(refresher, services, labelnames=["env", "project"])
+    refresher.start = lambda: None
+    refresher.refresh()
+    client.projects = [CONFIGURED, DISCOVERED]
+    refresher.refresh()
+    assert not collector.has_service(DISCOVERED)
+    discovery.interval = 0
+    refresher.refresh()
+    assert client.listings == 2
+    assert collector.has_service(DISCOVERED)
+    labels = {
+        sample.labels["service_id"]: (sample.labels["env"], sample.labels["project"])
+        for metric in collector.collect()
+        if metric.name == "ovh_volume_size_gb"
+        for sample in metric.samples
+    }
+    assert labels == {CONFIGURED: ("prod", "configured"), DISCOVERED: ("test", f"project-{DISCOVERED[:8]}")}
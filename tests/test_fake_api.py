@@ -0,0 +1,47 @@
+import ovh
+import pytest
+
+from ovh_exporter import fake_api
+from ovh_exporter.collector import METRIC_SPECS
+from ovh_exporter.config import OvhAccount, RateLimit
+from ovh_exporter.mapping import fields
+from ovh_exporter.ovh_client import ClientPool, Endpoint, build_client, fetch
+from ovh_exporter.streaming import prune
+
+
+@pytest.fixture()
+def server():
+    server = fake_api.start(("127.0.0.1", 0), fake_api.FakeApiOptions(instances=3, volumes=2, buckets=1))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(server):
+    return build_client(OvhAccount("ovh-eu", "ak", "as", "ck", server.url, RateLimit(max_retries=0)))
+
+
+def test_fetch_from_fake_api(server):
+    response = fetch(_client(server), "0" * 32)
+    assert len(response.instances) == 3
+    assert len(response.volumes) == 2
+    assert response.usage["lastUpdate"]
+
+
+def test_fake_api_throttling(server):
+    server.options.throttle_rate = 1.0
+    with pytest.raises(ovh.exceptions.APIError) as error:
+        _client(server).get("/cloud/project")
+    assert error.value.response.status_code == 429
+
+
+def test_streamed_usage(server):
+    """Streamed usage only keeps fields read by metrics."""
+    pytest.importorskip("ijson")
+    trees = fields(METRIC_SPECS)
+    full = _client(server).get(Endpoint.USAGE.url.format(service_id="0" * 32))
+    pool = ClientPool(lambda: _client(server), fields={Endpoint.USAGE: trees[Endpoint.USAGE]})
+    streamed = fetch(pool, "0" * 32, [Endpoint.USAGE]).usage
+    assert streamed == prune(full, trees[Endpoint.USAGE])
+    assert streamed["lastUpdate"] == full["lastUpdate"]
+    assert "period" not in streamed
@@ -0,0 +1,71 @@
+"""Declarative metric mapping tests."""
+from ovh_exporter.collector import (
+    METRIC_SPECS,
+    MetricFamily,
+    OvhCollector,
+    endpoints_for,
+)
+from ovh_exporter.config import MetricSpec, Service
+from ovh_exporter.mapping import fields, getter, label_keys, rows
+from ovh_exporter.ovh_client import RESPONSE_FIELDS, Endpoint, OvhApiResponse, fetch
+from ovh_exporter.refresher import Snapshot
+from ovh_exporter.streaming import prune
+from ovh_exporter.synthetic import StaticSource, SyntheticClient
+
+SERVICE_ID = "c" * 32
+
+
+def test_nested_rows_and_paths():
+    """Rows frames hold enclosing rows, read with `^` paths."""
+    payload = {"groups": [{"region": "GRA", "details": [{"id": "a"}, {"id": "b"}]}, {"region": "SBG"}]}
+    frames = list(rows("groups.*.details.*")(payload))
+    assert [getter("^region")(i) for i in frames] == ["GRA", "GRA"]
+    assert [getter("id")(i) for i in frames] == ["a", "b"]
+    assert getter("=720")(frames[0]) == 720
+    assert list(rows("missing.*")(payload)) == []
+    assert getter("")(next(iter(rows("")(payload)))) is payload
+
+
+def test_extra_metrics():
+    """Extra metrics are collected and their endpoint fetched."""
+    extra = [MetricSpec.load({
+        "name": "ovh_instance_info",
+        "endpoint": "instance",
+        "labels": {"instance_id": "id", "status": "status"},
+        "value": "=1",
+    })]
+    assert Endpoint.INSTANCE in endpoints_for([MetricFamily.VOLUME], extra)
+    client = SyntheticClient(instances=3, volumes=1, buckets=1)
+    response = fetch(client, SERVICE_ID, [Endpoint.INSTANCE])
+    collector = OvhCollector(StaticSource(Snapshot(1, 0.0, {SERVICE_ID: response})),
+                             [Service(SERVICE_ID, {"project": "test"})], extra=extra)
+    metrics = {m.name: m for m in collector.collect()}
+    samples = metrics["ovh_instance_info"].samples
+    assert len(samples) == 3
+    assert samples[0].labels["project"] == "test"
+    assert samples[0].labels["status"] == "ACTIVE"
+    assert samples[0].value == 1
+
+
+def test_pruned_payloads_give_same_samples():
+    """Payloads pruned to the fields read by specs give the same samples."""
+    response = fetch(SyntheticClient(instances=5, volumes=3, buckets=2), SERVICE_ID)
+    trees = fields(METRIC_SPECS)
+    assert trees[Endpoint.USAGE]["hourlyUsage"]["instance"]["*"]["details"]["*"]["instanceId"] is None
+    pruned = OvhApiResponse(**{
+        RESPONSE_FIELDS[endpoint]: prune(getattr(response, RESPONSE_FIELDS[endpoint]), tree)
+        for endpoint, tree in trees.items()})
+    assert "period" not in pruned.usage
+
+    def samples(value):
+        collector = OvhCollector(StaticSource(Snapshot(1, 0.0, {SERVICE_ID: value})),
+                                 [Service(SERVICE_ID, {"project": "test"})])
+        return [(m.name, m.samples) for m in collector.collect() if not m.name.startswith("ovh_exporter")]
+    assert samples(pruned) == samples(response)
+
+
+def test_label_keys():
+    """Label keys are the last keys of label paths, without constants."""
+    keys = label_keys(METRIC_SPECS)
+    assert {"region", "instanceId", "reference", "type"} <= keys
+    assert not any(i.startswith(("=", "^")) for i in keys)
@@ -0,0 +1,133 @@
+"""OVH client tests."""
+import concurrent.futures
+import json
+import logging
+import threading
+import time
+
+import requests
+
+from ovh_exporter.logger import PayloadFileHandler, log_payload, payload_log
+from ovh_exporter.ovh_client import (
+    ClientPool,
+    Endpoint,
+    SingleFlight,
+    fetch_all,
+    intern_strings,
+)
+
+
+def test_single_flight_shares_result():
+    """Concurrent callers share one call."""
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("key", slow)))
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=lambda: results.append(flights.do("key", slow)))
+    follower.start()
+    # let follower join the in-flight call
+    time.sleep(0.1)
+    release.set()
+    leader.join()
+    follower.join()
+    assert results == ["result", "result"]
+    assert len(calls) == 1
+
+
+def test_client_pool_bounded():
+    """At most `size` clients are built and used at once; time delta is fetched once."""
+    built = []
+    lock = threading.Lock()
+    in_use = []
+    peak = []
+
+    class Client:
+        _session = requests.Session()
+
+        def __init__(self):
+            self._time_delta = None
+            built.append(self)
+
+        @property
+        def time_delta(self):
+            self._time_delta = 42
+            return 42
+
+        def get(self, _path):
+            with lock:
+                in_use.append(self)
+                peak.append(len(in_use))
+            time.sleep(0.01)
+            with lock:
+                in_use.remove(self)
+            return []
+
+    pool = ClientPool(Client, 2)
+    threads = [threading.Thread(target=pool.get, args=("/cloud/project",)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 2 # noqa: PLR2004
+    assert max(peak) == 2 # noqa: PLR2004
+    assert [i._time_delta for i in built] == [42] * 2 # noqa: SLF001
+    with pool.client() as client:
+        assert client in built
+
+
+def test_intern_strings_shares_label_values():
+    """Equal keys and label values of decoded payloads are the same object,
+    other values are not interned."""
+    body = '[{"region": "GRA11", "name": "backup volume"}, {"region": "GRA11", "name": "backup volume"}]'
+    payload = intern_strings(json.loads(body), frozenset({"region"}))
+    assert payload[0]["region"] is payload[1]["region"]
+    assert next(iter(payload[0])) is next(iter(payload[1]))
+    assert payload[0]["name"] == payload[1]["name"]
+    assert payload[0]["name"] is not payload[1]["name"]
+
+
+def test_log_payload_capped_and_dumped(caplog, tmp_path):
+    """Logged payloads are size-capped; dumped ones are complete."""
+    payload = [{"id": str(i), "name": "x" * 1000} for i in range(10000)]
+    caplog.set_level(logging.DEBUG, logger="ovh_exporter")
+    handler = PayloadFileHandler(str(tmp_path))
+    payload_log.addHandler(handler)
+    payload_log.setLevel(logging.DEBUG)
+    try:
+        log_payload("volume", "abc", payload)
+    finally:
+        payload_log.removeHandler(handler)
+        payload_log.setLevel(logging.CRITICAL)
+    assert len(caplog.records[0].getMessage()) < 1000 # noqa: PLR2004
+    assert json.loads((tmp_path / "abc-volume.json").read_text()) == payload
+
+
+def test_fetch_all_coalesces_late_calls():
+    """A call still running after the refresh timeout is joined by the next refresh."""
+    calls = []
+    release = threading.Event()
+
+    class SlowClient:
+        def get(self, path, **_kwargs):
+            calls.append(path)
+            release.wait()
+            return []
+
+    client = SlowClient()
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        for _ in range(2):
+            _responses, incomplete = fetch_all(client, ["s1"], executor, [Endpoint.VOLUME], timeout=0.05)
+            assert incomplete == {"s1"}
+        release.set()
+    assert len(calls) == 1
@@ -0,0 +1,45 @@
+import ovh
+import pytest
+
+from ovh_exporter import fake_api
+from ovh_exporter.config import OvhAccount, RateLimit
+from ovh_exporter.ovh_client import build_client
+from ovh_exporter.ratelimit import TokenBucket, retry_after
+from ovh_exporter.telemetry import API_REGISTRY
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(2, 2, "test", clock=clock, sleep=clock.sleep)
+    assert [bucket.acquire() for _ in range(4)] == [0, 0, 0.5, 0.5]
+    bucket.defer(3)
+    assert bucket.acquire() == 3.5
+    assert retry_after("2") == 2
+    assert retry_after("soon") is None
+
+
+def test_throttled_calls_retried():
+    server = fake_api.start(("127.0.0.1", 0), fake_api.FakeApiOptions(throttle_rate=1.0, retry_after=0))
+    try:
+        client = build_client(OvhAccount("ovh-eu", "ak", "as", "ck", server.url,
+                                         RateLimit(max_retries=2, backoff=0.01)))
+        retries = API_REGISTRY.get_sample_value(
+            "ovh_exporter_api_retries_total", {"endpoint": "other", "reason": "throttled"}) or 0
+        with pytest.raises(ovh.exceptions.APIError):
+            client.get("/cloud/project")
+        assert API_REGISTRY.get_sample_value(
+            "ovh_exporter_api_retries_total", {"endpoint": "other", "reason": "throttled"}) == retries + 2
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,170 @@
+"""Background refresh tests."""
+import time
+
+import pytest
+
+from ovh_exporter.breaker import CircuitBreakers
+from ovh_exporter.collector import OvhCollector
+from ovh_exporter.config import Config, Service
+from ovh_exporter.ovh_client import Endpoint
+from ovh_exporter.refresher import Refresher, Snapshot, SnapshotAggregator
+from ovh_exporter.telemetry import API_REGISTRY
+
+SERVICE_ID = "a" * 32
+
+
+class StubClient:
+    """ovh.Client replacement returning empty payloads."""
+
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    def get(self, path, **_kwargs):
+        """Fake GET call."""
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError(path)
+        if path.endswith("/usage/current"):
+            return {}
+        if path.endswith(SERVICE_ID):
+            return {}
+        if path.endswith("/quota"):
+            return [{"region": "GRA", "keymanager": {"usedSecrets": 1, "maxSecrets": 10}}]
+        return []
+
+
+def test_collect_reads_snapshot():
+    """Collection uses snapshot and does not call API."""
+    client = StubClient()
+    services = [Service(SERVICE_ID, {"project": "test"})]
+    refresher = Refresher(client, services, 300)
+    refresher.refresh()
+    calls = client.calls
+    collector = OvhCollector(refresher, services)
+    # prevent background thread from running
+    refresher.start = lambda: None
+    metrics = {m.name: m for m in collector.collect()}
+    assert client.calls == calls
+    samples = metrics["ovh_quota_keymanager_secret_count"].samples
+    assert samples[0].value == 1
+    assert samples[0].labels["project"] == "test"
+
+
+def test_refresh_uses_cache():
+    """Fresh cached endpoints are not fetched again."""
+    client = StubClient()
+    services = [Service(SERVICE_ID, {})]
+    refresher = Refresher(client, services, 300)
+    refresher.refresh()
+    calls = client.calls
+    refresher.refresh()
+    assert client.calls == calls
+    names = {m.name for m in refresher._snapshot.telemetry} # noqa: SLF001
+    assert "ovh_exporter_cache_lookups" in names
+    # unchanged payloads keep their digest
+    assert len(refresher._snapshot.digests[SERVICE_ID]) == len(Endpoint) # noqa: SLF001
+
+
+def test_refresh_failure_keeps_previous():
+    """A failed refresh keeps last good response."""
+    client = StubClient()
+    services = [Service(SERVICE_ID, {})]
+    refresher = Refresher(client, services, 300, ttls={i: 0 for i in Endpoint})
+    refresher.refresh()
+    first = refresher._snapshot # noqa: SLF001
+    client.fail = True
+    refresher.refresh()
+    refresher._pool().shutdown(wait=True) # noqa: SLF001
+    second = refresher._snapshot # noqa: SLF001
+    assert second.generation == first.generation + 1
+    assert second.responses[SERVICE_ID].quotas == first.responses[SERVICE_ID].quotas
+
+
+def test_refresh_timeout_flags_stale():
+    """Calls not finished in time flag service as stale, late results are cached."""
+    client = StubClient()
+    services = [Service(SERVICE_ID, {})]
+    refresher = Refresher(client, services, 300, timeout=0.1)
+    refresher.refresh()
+    assert refresher._snapshot.stale == frozenset() # noqa: SLF001
+    slow = StubClient()
+    slow_get = slow.get
+    slow.get = lambda path, **kwargs: time.sleep(0.3) or slow_get(path, **kwargs)
+    refresher = Refresher(slow, services, 300, timeout=0.1)
+    refresher.refresh()
+    assert refresher._snapshot.stale == {SERVICE_ID} # noqa: SLF001
+    refresher._pool().shutdown(wait=True) # noqa: SLF001
+    refresher.refresh()
+    assert refresher._snapshot.stale == frozenset() # noqa: SLF001
+    assert refresher._snapshot.responses[SERVICE_ID].quotas # noqa: SLF001
+
+
+def test_open_breaker_serves_last_good():
+    """Failing endpoints are not called again until reset, last good data is kept."""
+    client = StubClient()
+    services = [Service(SERVICE_ID, {})]
+    refresher = Refresher(client, services, 300, ttls={i: 0 for i in Endpoint},
+                          breakers=CircuitBreakers(1, 300))
+    refresher.refresh()
+    client.fail = True
+    refresher.refresh()
+    refresher._pool().shutdown(wait=True) # noqa: SLF001
+    calls = client.calls
+    refresher.refresh()
+    assert client.calls == calls
+    snapshot = refresher._snapshot # noqa: SLF001
+    assert snapshot.stale == {SERVICE_ID}
+    assert snapshot.responses[SERVICE_ID].quotas
+    assert snapshot.ages[SERVICE_ID]["quota"] > 0
+    metrics = {m.name: m for m in OvhCollector(refresher, services).collect()}
+    last_success = metrics["ovh_exporter_service_last_success_timestamp_seconds"].samples
+    assert all(0 < i.value <= snapshot.timestamp for i in last_success)
+    state = API_REGISTRY.get_sample_value(
+        "ovh_exporter_circuit_breaker_state", {"account": "default", "service_id": SERVICE_ID, "endpoint": "quota"})
+    assert state == 1
+
+
+def test_accounts_merged_with_account_label():
+    """Accounts are refreshed separately and collected together with an account label."""
+    other_id = "b" * 32
+    config = Config.load({
+        "accounts": [
+            {"name": "eu", "endpoint": "ovh-eu", "application_key": "ak", "application_secret": "as",
+             "services": [{"id": SERVICE_ID, "labels": {"project": "test"}}]},
+            {"name": "ca", "endpoint": "ovh-ca", "application_key": "ak", "application_secret": "as",
+             "services": [{"id": other_id, "labels": {"project": "other"}}]},
+        ]
+    })
+    aggregator = SnapshotAggregator({i.name: i.services for i in config.accounts})
+    for account in config.accounts:
+        Refresher(StubClient(), account.services, 300, account=account.name,
+                  store=aggregator.store(account.name)).refresh()
+    assert aggregator.snapshot().generation == 2
+    collector = OvhCollector(aggregator, config.services, labelnames=config.labelnames())
+    metrics = {m.name: m for m in collector.collect()}
+    samples = metrics["ovh_quota_keymanager_secret_count"].samples
+    assert {(i.labels["account"], i.labels["project"]) for i in samples} == {("eu", "test"), ("ca", "other")}
+
+
+def test_merged_last_success_kept_by_other_accounts():
+    """Publishing an account does not move last success of other accounts."""
+    other_id = "b" * 32
+    services = {"eu": [Service(SERVICE_ID, {})], "ca": [Service(other_id, {})]}
+    aggregator = SnapshotAggregator(services)
+    collector = OvhCollector(aggregator, [*services["eu"], *services["ca"]])
+
+    def last_success():
+        metrics = {m.name: m for m in collector.collect()}
+        samples = metrics["ovh_exporter_service_last_success_timestamp_seconds"].samples
+        return {i.labels["service_id"]: i.value for i in samples}
+
+    now = time.time()
+    aggregator.publish("eu", Snapshot(1, now - 60, {}, ages={SERVICE_ID: {"quota": 30.0}}))
+    aggregator.publish("ca", Snapshot(1, now - 10, {}, ages={other_id: {"quota": 5.0}}))
+    before = last_success()
+    assert before[SERVICE_ID] == pytest.approx(now - 90, abs=1e-3)
+    aggregator.publish("ca", Snapshot(2, now, {}, ages={other_id: {"quota": 0.0}}))
+    after = last_success()
+    assert after[SERVICE_ID] == pytest.approx(before[SERVICE_ID], abs=1e-3)
+    assert after[other_id] == pytest.approx(now, abs=1e-3)
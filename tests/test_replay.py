@@ -0,0 +1,22 @@
+from ovh_exporter.collector import OvhCollector
+from ovh_exporter.config import Service
+from ovh_exporter.ovh_client import fetch
+from ovh_exporter.replay import Archive, RecordingClient
+from ovh_exporter.synthetic import SyntheticClient
+
+
+def test_record_replay(tmp_path):
+    services = [Service("0" * 32, {}), Service("1" * 32, {})]
+    recorder = RecordingClient(SyntheticClient(instances=2, volumes=2, buckets=2))
+    expected = {service.id: fetch(recorder, service.id) for service in services}
+    recorder.save(str(tmp_path / "record.json.gz"))
+
+    archive = Archive.load(str(tmp_path / "record.json.gz"))
+    assert archive.snapshot().responses["1" * 32].volumes == expected["1" * 32].volumes
+    sizes = {
+        sample.labels["volume_id"]: sample.value
+        for metric in OvhCollector(archive, services).collect()
+        if metric.name == "ovh_volume_size_gb"
+        for sample in metric.samples
+    }
+    assert sizes == {i["id"]: i["size"] for service in services for i in expected[service.id].volumes}
@@ -0,0 +1,15 @@
+"""Snapshot store tests."""
+from ovh_exporter.refresher import Snapshot
+from ovh_exporter.store import FileSnapshotStore
+
+
+def test_publish_and_read(tmp_path):
+    """Readers get the last published snapshot."""
+    path = str(tmp_path / "snapshot")
+    writer = FileSnapshotStore(path)
+    reader = FileSnapshotStore(path)
+    assert reader.snapshot().generation == 0
+    writer.publish(Snapshot(1, 0.0, {"a": 1}))
+    assert reader.snapshot().responses == {"a": 1}
+    writer.publish(Snapshot(2, 0.0, {"a": 2}))
+    assert reader.snapshot().generation == 2
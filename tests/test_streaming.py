@@ -0,0 +1,101 @@
+"""Streaming decoding tests."""
+import json
+import sys
+
+import requests
+
+from ovh_exporter import streaming
+from ovh_exporter.ovh_client import ClientPool, Endpoint
+from ovh_exporter.streaming import Builder, prune
+
+PAYLOAD = {
+    "lastUpdate": "2024-01-01T12:00:00Z",
+    "period": {"from": "2024-01-01", "to": "2024-02-01"},
+    "instance": [
+        {"region": "GRA", "details": [{"id": "a", "quantity": {"value": 1.5, "unit": "Hour"}}]},
+        {"region": "SBG", "details": []},
+    ],
+}
+FIELDS = {"lastUpdate": None, "instance": {"*": {"details": {"*": {"quantity": {"value": None}}}}}}
+# ijson.parse events of PAYLOAD
+EVENTS = [
+    ("start_map", None),
+    ("map_key", "lastUpdate"), ("string", "2024-01-01T12:00:00Z"),
+    ("map_key", "period"), ("start_map", None),
+    ("map_key", "from"), ("string", "2024-01-01"), ("map_key", "to"), ("string", "2024-02-01"),
+    ("end_map", None),
+    ("map_key", "instance"), ("start_array", None),
+    ("start_map", None),
+    ("map_key", "region"), ("string", "GRA"),
+    ("map_key", "details"), ("start_array", None),
+    ("start_map", None),
+    ("map_key", "id"), ("string", "a"),
+    ("map_key", "quantity"), ("start_map", None),
+    ("map_key", "value"), ("number", 1.5), ("map_key", "unit"), ("string", "Hour"),
+    ("end_map", None),
+    ("end_map", None),
+    ("end_array", None),
+    ("end_map", None),
+    ("start_map", None),
+    ("map_key", "region"), ("string", "SBG"),
+    ("map_key", "details"), ("start_array", None), ("end_array", None),
+    ("end_map", None),
+    ("end_array", None),
+    ("end_map", None),
+]
+
+
+def test_builder_keeps_fields():
+    """Built payload only holds needed fields, as a pruned one."""
+    builder = Builder(FIELDS)
+    for event, value in EVENTS:
+        builder.event(event, value)
+    assert builder.value == prune(PAYLOAD, FIELDS)
+    assert builder.value == {
+        "lastUpdate": "2024-01-01T12:00:00Z",
+        "instance": [{"details": [{"quantity": {"value": 1.5}}]}, {"details": []}],
+    }
+
+
+def test_builder_keeps_whole_payload():
+    """All values are kept without field tree."""
+    builder = Builder(None)
+    for event, value in EVENTS:
+        builder.event(event, value)
+    assert builder.value == PAYLOAD
+
+
+def test_builder_interns_label_values():
+    """Only string values of label keys are interned."""
+    # decoded strings are not interned
+    region, unit = json.loads('["GRA", "Hour"]')
+    builder = Builder(None, frozenset({"region"}))
+    for event, value in [("start_map", None), ("map_key", "region"), ("string", region),
+                         ("map_key", "unit"), ("string", unit), ("end_map", None)]:
+        builder.event(event, value)
+    assert builder.value["region"] is sys.intern("GRA")
+    assert builder.value["unit"] is unit
+
+
+def test_pool_keeps_fields_of_calls_with_query(monkeypatch):
+    """Payloads fetched with query parameters (storages) are streamed too."""
+    path = "/cloud/project/abc/storage"
+    calls = []
+
+    class Client:
+        _session = requests.Session()
+        time_delta = 0
+
+        def get(self, target):
+            calls.append(("get", target))
+            return [{"id": "a", "region": "GRA"}]
+
+        def get_fields(self, target, fields):
+            calls.append(("get_fields", target))
+            return prune([{"id": "a", "region": "GRA"}], fields)
+
+    pool = ClientPool(Client, fields={Endpoint.STORAGE: {"*": {"region": None}}})
+    for available in (True, False):
+        monkeypatch.setattr(streaming, "AVAILABLE", available)
+        assert pool.get(path, includeType=True) == [{"region": "GRA"}]
+    assert calls == [("get_fields", f"{path}?includeType=true"), ("get", f"{path}?includeType=true")]
@@ -0,0 +1,23 @@
+"""Process supervisor tests."""
+import os
+import time
+
+from ovh_exporter.supervisor import ProcessSupervisor
+
+
+def _write_pid(path):
+    with open(path, "a", encoding="utf-8") as fstream:
+        fstream.write(f"{os.getpid()}\n")
+
+
+def test_exited_process_is_restarted(tmp_path):
+    """A process that exits is started again until supervisor is stopped."""
+    path = tmp_path / "pids"
+    supervisor = ProcessSupervisor("test", _write_pid, (str(path),), restart_delay=0.05)
+    supervisor.start()
+    deadline = time.monotonic() + 10
+    while supervisor.restarts < 2 and time.monotonic() < deadline: # noqa: PLR2004
+        time.sleep(0.05)
+    supervisor.stop()
+    assert supervisor.restarts >= 2 # noqa: PLR2004
+    assert len(set(path.read_text().split())) >= 2 # noqa: PLR2004
@@ -0,0 +1,39 @@
+"""Synthetic payload tests."""
+from ovh_exporter.collector import OvhCollector
+from ovh_exporter.config import Service
+from ovh_exporter.ovh_client import fetch
+from ovh_exporter.refresher import Snapshot
+from ovh_exporter.synthetic import StaticSource, SyntheticClient
+
+SERVICE_ID = "b" * 32
+
+
+def test_synthetic_project_collection():
+    """Synthetic payloads produce one sample by resource."""
+    client = SyntheticClient(instances=8, volumes=5, buckets=4, regions=2)
+    services = [Service(SERVICE_ID, {"project": "synthetic"})]
+    response = fetch(client, SERVICE_ID)
+    collector = OvhCollector(StaticSource(Snapshot(1, 0.0, {SERVICE_ID: response})), services)
+    metrics = {m.name: m for m in collector.collect()}
+    assert len(metrics["ovh_usage_instance_hours"].samples) == 8
+    assert len(metrics["ovh_volume_size_gb"].samples) == 5
+    assert len(metrics["ovh_usage_volume_price"].samples) == 5
+    assert len(metrics["ovh_storage_size_bytes"].samples) == 4
+    assert len(metrics["ovh_usage_storage_price"].samples) == 4
+    assert len(metrics["ovh_quota_cpu_count"].samples) == 2
+
+
+def test_unchanged_payload_samples_reused():
+    """Samples are reused while payload digest is unchanged."""
+    client = SyntheticClient(instances=2, volumes=2, buckets=2, regions=1)
+    services = [Service(SERVICE_ID, {"project": "synthetic"})]
+    response = fetch(client, SERVICE_ID)
+    source = StaticSource(Snapshot(1, 0.0, {SERVICE_ID: response}, digests={SERVICE_ID: {"storage": b"1"}}))
+    collector = OvhCollector(source, services)
+    before = {m.name: m for m in collector.collect()}["ovh_storage_size_bytes"].samples
+    response.storages[0]["storedBytes"] = -1
+    source.value = Snapshot(2, 0.0, {SERVICE_ID: response}, digests={SERVICE_ID: {"storage": b"1"}})
+    assert {m.name: m for m in collector.collect()}["ovh_storage_size_bytes"].samples == before
+    source.value = Snapshot(3, 0.0, {SERVICE_ID: response}, digests={SERVICE_ID: {"storage": b"2"}})
+    samples = {m.name: m for m in collector.collect()}["ovh_storage_size_bytes"].samples
+    assert -1 in [i.value for i in samples]
@@ -0,0 +1,88 @@
+"""WSGI application tests."""
+import gzip
+
+from prometheus_client import CollectorRegistry, Gauge
+
+from ovh_exporter.collector import OvhCollector
+from ovh_exporter.config import Service
+from ovh_exporter.exposition import ExpositionCache
+from ovh_exporter.ovh_client import OvhApiResponse
+from ovh_exporter.refresher import Snapshot
+from ovh_exporter.synthetic import StaticSource
+from ovh_exporter.wsgi import MetricsApplication
+
+SERVICE_ID = "a" * 32
+
+
+def _app():
+    quotas = [{"region": "GRA", "keymanager": {"usedSecrets": 1, "maxSecrets": 10}}]
+    source = StaticSource(Snapshot(1, 0.0, {SERVICE_ID: OvhApiResponse(quotas=quotas)}))
+    collector = OvhCollector(source, [Service(SERVICE_ID, {})])
+    registry = CollectorRegistry()
+    Gauge("live_gauge", "Live gauge", registry=registry).set(3)
+    return source, MetricsApplication(ExpositionCache(collector), registry)
+
+
+def _call(app, **environ):
+    status = []
+    body = b"".join(app(environ, lambda s, h: status.append((s, dict(h)))))
+    return status[0][0], status[0][1], body
+
+
+def test_plain_and_gzip_bodies_match():
+    """Gzip body decompresses to plain body."""
+    _, app = _app()
+    _, _, plain = _call(app)
+    _, headers, compressed = _call(app, HTTP_ACCEPT_ENCODING="gzip")
+    assert headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed) == plain
+    for refused in ("gzip;q=0", "identity, gzip; q=0.0", "br"):
+        _, headers, body = _call(app, HTTP_ACCEPT_ENCODING=refused)
+        assert "Content-Encoding" not in headers
+        assert body == plain
+    assert b"ovh_quota_keymanager_secret_count" in plain
+    assert b"live_gauge 3.0" in plain
+
+
+def test_rendered_once_per_generation():
+    """Rendering is reused until snapshot generation changes."""
+    source, app = _app()
+    first = app.cache.get()
+    assert app.cache.get() is first
+    source.value = Snapshot(2, 0.0, source.value.responses)
+    assert app.cache.get() is not first
+
+
+def test_openmetrics_has_single_eof():
+    """OpenMetrics output ends with one EOF marker."""
+    _, app = _app()
+    _, headers, body = _call(app, HTTP_ACCEPT="application/openmetrics-text; version=1.0.0")
+    assert headers["Content-Type"].startswith("application/openmetrics-text")
+    assert body.count(b"# EOF") == 1
+    assert body.endswith(b"# EOF\n")
+
+
+def test_not_modified():
+    """Unchanged snapshot is answered with 304 on probes only."""
+    _, app = _app()
+    probe = {"PATH_INFO": "/probe", "QUERY_STRING": f"target={SERVICE_ID}"}
+    _, headers, _ = _call(app, **probe)
+    status, _, body = _call(app, HTTP_IF_NONE_MATCH=headers["ETag"], **probe)
+    assert status.startswith("304")
+    assert body == b""
+    # live metrics change on each request
+    status, headers, body = _call(app, HTTP_IF_NONE_MATCH="*")
+    assert status.startswith("200")
+    assert "ETag" not in headers
+    assert b"live_gauge" in body
+
+
+def test_probe_single_target():
+    """Probe serves one service without live metrics."""
+    _, app = _app()
+    status, _, body = _call(app, PATH_INFO="/probe", QUERY_STRING=f"target={SERVICE_ID}")
+    assert status.startswith("200")
+    assert b"ovh_exporter_probe_success 1.0" in body
+    assert b"live_gauge" not in body
+    status, _, _ = _call(app, PATH_INFO="/probe", QUERY_STRING="target=unknown")
+    assert status.startswith("400")